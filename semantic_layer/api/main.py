@@ -1,13 +1,39 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import Iterator, List, Optional, Dict, Any
+import json
+
+from semantic_layer.compiler.query import QueryRequest
+from semantic_layer.execution.executor import QueryExecutor, QueryResult
+from semantic_layer.execution.router import ExecutionRouter
+from semantic_layer.optimization.profiler import stage
 
 app = FastAPI(title="Semantic Layer API")
 
+executor: Optional[QueryExecutor] = None
+router: Optional[ExecutionRouter] = None
+
 class QueryPayload(BaseModel):
     metrics: List[str]
     dimensions: List[str] = []
     filters: Optional[Dict[str, Any]] = None
+    max_staleness: Optional[float] = None
+    max_error: Optional[float] = None
+
+def configure(query_executor: QueryExecutor, query_router: Optional[ExecutionRouter] = None):
+    """Attach the executor used to answer /query requests, optionally through a cost-based router."""
+    global executor, router
+    executor = query_executor
+    router = query_router
+
+def _stream_records(result: QueryResult) -> Iterator[str]:
+    # One JSON object per line, read batch by batch from the spill file
+    try:
+        for batch in result.iter_batches():
+            yield batch.to_pandas().to_json(orient="records", lines=True, date_format="iso")
+    finally:
+        result.spill.cleanup()
 
 @app.get("/")
 def health_check():
@@ -15,5 +41,27 @@ def health_check():
 
 @app.post("/query")
 def execute_query(payload: QueryPayload):
-    # TODO: Integrate with compiler
-    return {"sql": "SELECT 1", "data": []}
+    if executor is None:
+        raise HTTPException(status_code=503, detail="No semantic model configured")
+    request = QueryRequest(
+        metrics=payload.metrics, dimensions=payload.dimensions,
+        filters=payload.filters, max_staleness=payload.max_staleness,
+        max_error=payload.max_error
+    )
+    with executor.profile():
+        try:
+            result = router.execute(request) if router else executor.execute(request)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if result.spilled:
+            return StreamingResponse(
+                _stream_records(result),
+                media_type="application/x-ndjson",
+                headers={"X-Row-Count": str(result.row_count)}
+            )
+        with stage("serialize"):
+            data = json.loads(result.data.to_json(orient="records", date_format="iso"))
+        response = {"sql": result.sql, "data": data, "row_count": result.row_count}
+        if result.error_bound is not None:
+            response["error_bound"] = result.error_bound
+        return response
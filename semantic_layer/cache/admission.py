@@ -0,0 +1,37 @@
+from typing import Optional
+
+from .sketch import CountMinSketch
+
+
+class AdmissionFilter:
+    """TinyLFU admission weighted by recompute cost and result size.
+
+    Every lookup is counted in an aging count-min sketch. When a full
+    cache would have to evict to store a new entry, the candidate is only
+    admitted if its expected benefit per byte (frequency × execution cost
+    / size) beats the victim's, so a flood of one-off queries cannot push
+    out results that are read often or are expensive to recompute.
+    """
+
+    def __init__(self, sketch: Optional[CountMinSketch] = None, default_cost: float = 1.0):
+        self.sketch = sketch or CountMinSketch()
+        self.default_cost = default_cost
+        self.rejected = 0
+
+    def record_access(self, key: str):
+        self.sketch.increment(key)
+
+    def benefit(self, key: str, size: int, cost: Optional[float]) -> float:
+        cost = self.default_cost if cost is None else cost
+        return self.sketch.estimate(key) * cost / max(size, 1)
+
+    def reject(self):
+        """Count a write the filter turned away."""
+        self.rejected += 1
+
+    def should_admit(self, key: str, size: int, cost: Optional[float],
+                     victim: str, victim_size: int, victim_cost: Optional[float]) -> bool:
+        return self.benefit(key, size, cost) > self.benefit(victim, victim_size, victim_cost)
+
+    def get_stats(self):
+        return {"rejected": self.rejected, "sketch_resets": self.sketch.resets}
@@ -0,0 +1,263 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+import pyarrow as pa
+
+from .keys import _hash
+from .serialization import table_to_value, to_tagged_table
+
+_INDEX_FILE = "index.json"
+_LOG_FILE = "index.log"
+_MIN_LOG_RECORDS = 64
+
+
+class DiskCache:
+    """Persistent cache tier of Arrow IPC files.
+
+    Tabular values are written as Arrow IPC files and read back through a
+    memory map: an Arrow table hit references the mapped column buffers
+    without copying or decoding them, while DataFrames and QueryResults
+    still pay the one `to_pandas` conversion into writable pandas memory.
+    Other values are stored as JSON. A compact index (key, file, size,
+    soft/hard TTL, table dependencies, in LRU order) is kept in
+    `index.json`; mutations are appended to `index.log` and folded into
+    the snapshot once the log outgrows the index, so a write costs O(1)
+    amortized. Both are reloaded on start, so a restarted process serves
+    from disk immediately. With `max_bytes` set, the least recently used
+    files are deleted until the total fits.
+    """
+
+    def __init__(self, directory: str, max_bytes: Optional[int] = None, default_ttl: int = 3600,
+                 default_stale_ttl: int = 0, clock: Callable[[], float] = time.time):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.default_stale_ttl = default_stale_ttl
+        self.clock = clock
+        self.index: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # LRU order
+        self.dependencies: Dict[str, Set[str]] = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._dirty = False
+        self._log_records = 0
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load_index(self):
+        try:
+            with open(self._path(_INDEX_FILE)) as f:
+                entries = OrderedDict((key, entry) for key, entry in json.load(f)["entries"])
+        except (OSError, ValueError, KeyError):
+            entries = OrderedDict()
+        # Replaying a log that was already folded in is harmless: records overwrite, never accumulate
+        try:
+            with open(self._path(_LOG_FILE)) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # torn final line from a crash mid-append
+                    entries.pop(record[1], None)
+                    if record[0] == "set":
+                        entries[record[1]] = record[2]
+        except OSError:
+            pass
+        now = self.clock()
+        for key, entry in entries.items():
+            if now >= entry["expires_at"] or not os.path.exists(self._path(entry["file"])):
+                continue
+            self._add_entry(key, entry)
+        # Files not in the index were written by a process that died before recording them
+        known = {entry["file"] for entry in self.index.values()} | {_INDEX_FILE, _LOG_FILE}
+        for name in os.listdir(self.directory):
+            if name not in known and os.path.isfile(self._path(name)):
+                self._unlink(name)
+        self._write_index()
+
+    def _write_index(self):
+        tmp = self._path(_INDEX_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"entries": list(self.index.items())}, f, separators=(",", ":"))
+        os.replace(tmp, self._path(_INDEX_FILE))
+        self._unlink(_LOG_FILE)
+        self._log_records = 0
+        self._dirty = False
+
+    def _append(self, *records):
+        """Journal index mutations, compacting into the snapshot once the log outgrows it."""
+        with open(self._path(_LOG_FILE), "a") as f:
+            f.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records))
+        self._log_records += len(records)
+        if self._log_records > max(_MIN_LOG_RECORDS, len(self.index)):
+            self._write_index()
+
+    def flush(self):
+        """Persist the in-memory recency order and compact the log; mutations are persisted as they happen."""
+        with self._lock:
+            if self._dirty or self._log_records:
+                self._write_index()
+
+    def _unlink(self, name: str):
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+    def _add_entry(self, key: str, entry: Dict[str, Any]):
+        self.index[key] = entry
+        self.total_bytes += entry["size"]
+        for table in entry["dependencies"]:
+            self.dependencies.setdefault(table, set()).add(key)
+
+    def _remove(self, key: str):
+        entry = self.index.pop(key)
+        self.total_bytes -= entry["size"]
+        for table in entry["dependencies"]:
+            keys = self.dependencies.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.dependencies[table]
+        self._unlink(entry["file"])
+
+    def get(self, key: str) -> Optional[Any]:
+        value, stale = self.get_with_staleness(key, max_staleness=0)
+        return value
+
+    def get_with_staleness(self, key: str, max_staleness: Optional[float] = None) -> Tuple[Optional[Any], bool]:
+        """Return (value, is_stale); see SmartCache.get_with_staleness."""
+        with self._lock:
+            entry = self.lookup(key)
+            if entry is not None:
+                path, fresh_until, _ = entry
+                staleness = self.clock() - fresh_until
+                if staleness < 0 or max_staleness is None or staleness <= max_staleness:
+                    stale = staleness >= 0
+                    if stale:
+                        self.stale_hits += 1
+                    else:
+                        self.hits += 1
+                    self.index.move_to_end(key)
+                    self._dirty = True
+                    return self._read(path), stale
+            self.misses += 1
+        return None, False
+
+    def peek(self, key: str, max_staleness: Optional[float] = 0) -> Tuple[Optional[Any], bool]:
+        """Like get_with_staleness, touching neither statistics nor the LRU order."""
+        with self._lock:
+            entry = self.index.get(key)
+            if entry is None:
+                return None, False
+            now = self.clock()
+            staleness = now - entry["fresh_until"]
+            if now >= entry["expires_at"] or not (staleness < 0 or max_staleness is None
+                                                  or staleness <= max_staleness):
+                return None, False
+            return self._read(self._path(entry["file"])), staleness >= 0
+
+    def lookup(self, key: str) -> Optional[Tuple[str, float, float]]:
+        """(file path, fresh_until, expires_at) for a live key."""
+        with self._lock:
+            entry = self.index.get(key)
+            if entry is None:
+                return None
+            if self.clock() >= entry["expires_at"]:
+                self._remove(key)
+                self._append(["del", key])
+                return None
+            return self._path(entry["file"]), entry["fresh_until"], entry["expires_at"]
+
+    @staticmethod
+    def _read(path: str) -> Any:
+        if path.endswith(".json"):
+            with open(path) as f:
+                return json.load(f)
+        # Buffers reference the mapping directly; it stays valid after the file is unlinked
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        return table_to_value(table)
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None,
+            dependencies: Optional[Iterable[str]] = None, stale_ttl: Optional[int] = None):
+        table = to_tagged_table(value)
+        name = _hash(key.encode()) + (".arrow" if table is not None else ".json")
+        tmp = self._path(f"{name}.{threading.get_ident()}.tmp")
+        if table is not None:
+            with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        else:
+            try:
+                payload = json.dumps(value)
+            except TypeError as e:
+                raise TypeError(f"Cannot serialize {type(value).__name__} for the cache: {e}") from e
+            with open(tmp, "w") as f:
+                f.write(payload)
+        size = os.path.getsize(tmp)
+        if self.max_bytes is not None and size > self.max_bytes:
+            os.remove(tmp)
+            return False
+
+        with self._lock:
+            if key in self.index:
+                self._remove(key)
+            os.replace(tmp, self._path(name))
+            fresh_until = self.clock() + (ttl or self.default_ttl)
+            entry = {
+                "file": name,
+                "size": size,
+                "fresh_until": fresh_until,
+                "expires_at": fresh_until + (self.default_stale_ttl if stale_ttl is None else stale_ttl),
+                "dependencies": sorted(set(dependencies or ())),
+            }
+            self._add_entry(key, entry)
+            records = [["set", key, entry]]
+            if self.max_bytes is not None:
+                while self.total_bytes > self.max_bytes:
+                    victim = next(iter(self.index))
+                    self._remove(victim)
+                    records.append(["del", victim])
+                    self.evictions += 1
+            self._append(*records)
+            return key in self.index
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            if key not in self.index:
+                return False
+            self._remove(key)
+            self._append(["del", key])
+            return True
+
+    def invalidate_by_table(self, table_name: str) -> int:
+        with self._lock:
+            keys = list(self.dependencies.get(table_name, ()))
+            for key in keys:
+                self._remove(key)
+            if keys:
+                self._append(*(["del", key] for key in keys))
+            return len(keys)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "total_entries": len(self.index),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,245 @@
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterator, Optional, Union
+
+from .sketch import CountMinSketch
+
+
+class EvictionPolicy:
+    """Decides which key leaves a size-bounded cache.
+
+    The cache reports every insert, access and removal; when it is over
+    budget it asks for victims until it fits again. `peek_victims` lists
+    the keys `select_victim` would hand out, in order, without changing
+    any state, so admission can look ahead before committing to a write.
+    """
+
+    def bind(self, max_bytes: Optional[int]):
+        self.max_bytes = max_bytes
+
+    def record_insert(self, key: str, size: int):
+        raise NotImplementedError
+
+    def record_access(self, key: str):
+        raise NotImplementedError
+
+    def record_remove(self, key: str):
+        raise NotImplementedError
+
+    def select_victim(self) -> Optional[str]:
+        raise NotImplementedError
+
+    def peek_victims(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def peek_victim(self) -> Optional[str]:
+        return next(self.peek_victims(), None)
+
+
+class LRUPolicy(EvictionPolicy):
+    def __init__(self):
+        self.order: "OrderedDict[str, int]" = OrderedDict()
+
+    def record_insert(self, key: str, size: int):
+        self.order[key] = size
+        self.order.move_to_end(key)
+
+    def record_access(self, key: str):
+        if key in self.order:
+            self.order.move_to_end(key)
+
+    def record_remove(self, key: str):
+        self.order.pop(key, None)
+
+    def select_victim(self) -> Optional[str]:
+        return next(iter(self.order), None)
+
+    def peek_victims(self) -> Iterator[str]:
+        return iter(self.order)
+
+
+class LFUPolicy(EvictionPolicy):
+    """O(1) LFU: keys bucketed by access count, LRU order within a bucket."""
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self.buckets: Dict[int, "OrderedDict[str, None]"] = defaultdict(OrderedDict)
+        self.min_count = 0
+
+    def _move(self, key: str, old: int, new: int):
+        bucket = self.buckets[old]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[old]
+            if self.min_count == old:
+                self.min_count = new
+        self.buckets[new][key] = None
+        self.counts[key] = new
+
+    def record_insert(self, key: str, size: int):
+        if key in self.counts:
+            self.record_access(key)
+            return
+        self.counts[key] = 1
+        self.buckets[1][key] = None
+        self.min_count = 1
+
+    def record_access(self, key: str):
+        count = self.counts.get(key)
+        if count is not None:
+            self._move(key, count, count + 1)
+
+    def record_remove(self, key: str):
+        count = self.counts.pop(key, None)
+        if count is None:
+            return
+        bucket = self.buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[count]
+            if self.min_count == count:
+                self.min_count = min(self.buckets) if self.buckets else 0
+
+    def select_victim(self) -> Optional[str]:
+        if not self.counts:
+            return None
+        return next(iter(self.buckets[self.min_count]))
+
+    def peek_victims(self) -> Iterator[str]:
+        for count in sorted(self.buckets):
+            yield from self.buckets[count]
+
+
+class WTinyLFUPolicy(EvictionPolicy):
+    """Window TinyLFU.
+
+    New keys land in a small LRU window. When the cache must shrink, the
+    oldest window key competes with the main region's LRU victim and the
+    one with the lower sketched frequency is evicted. The main region is
+    a segmented LRU (probation/protected), so a single re-access does not
+    let a key displace proven-popular entries.
+    """
+
+    def __init__(self, window_ratio: float = 0.01, protected_ratio: float = 0.8,
+                 sketch: Optional[CountMinSketch] = None):
+        self.window_ratio = window_ratio
+        self.protected_ratio = protected_ratio
+        self.sketch = sketch or CountMinSketch()
+        self.window: "OrderedDict[str, int]" = OrderedDict()
+        self.probation: "OrderedDict[str, int]" = OrderedDict()
+        self.protected: "OrderedDict[str, int]" = OrderedDict()
+        self.window_bytes = 0
+        self.probation_bytes = 0
+        self.protected_bytes = 0
+        self.max_bytes = None
+
+    def _window_limit(self) -> float:
+        return (self.max_bytes or 0) * self.window_ratio
+
+    def _main_limit(self) -> float:
+        return (self.max_bytes or 0) - self._window_limit()
+
+    def _protected_limit(self) -> float:
+        return (self.max_bytes or 0) * (1 - self.window_ratio) * self.protected_ratio
+
+    def record_insert(self, key: str, size: int):
+        self.record_remove(key)
+        self.sketch.increment(key)
+        self.window[key] = size
+        self.window_bytes += size
+
+    def record_access(self, key: str):
+        self.sketch.increment(key)
+        if key in self.window:
+            self.window.move_to_end(key)
+        elif key in self.probation:
+            size = self.probation.pop(key)
+            self.probation_bytes -= size
+            self.protected[key] = size
+            self.protected_bytes += size
+            # Demote the coldest protected keys back to probation
+            while self.protected_bytes > self._protected_limit() and len(self.protected) > 1:
+                demoted, demoted_size = self.protected.popitem(last=False)
+                self.protected_bytes -= demoted_size
+                self.probation[demoted] = demoted_size
+                self.probation_bytes += demoted_size
+        elif key in self.protected:
+            self.protected.move_to_end(key)
+
+    def record_remove(self, key: str):
+        if key in self.window:
+            self.window_bytes -= self.window.pop(key)
+        elif key in self.probation:
+            self.probation_bytes -= self.probation.pop(key)
+        elif key in self.protected:
+            self.protected_bytes -= self.protected.pop(key)
+
+    def select_victim(self) -> Optional[str]:
+        # Move window overflow into main; once main is full, the overflow
+        # key duels main's LRU victim and the less frequent one is evicted
+        while self.window_bytes > self._window_limit() and len(self.window) > 1:
+            key, size = self.window.popitem(last=False)
+            self.window_bytes -= size
+            main = self.probation or self.protected
+            has_room = self.probation_bytes + self.protected_bytes + size <= self._main_limit()
+            self.probation[key] = size
+            self.probation_bytes += size
+            if has_room or not main:
+                continue
+            victim = next(iter(main))
+            return key if self.sketch.estimate(key) <= self.sketch.estimate(victim) else victim
+        for region in (self.probation, self.protected, self.window):
+            if region:
+                return next(iter(region))
+        return None
+
+    def peek_victims(self) -> Iterator[str]:
+        # Replays select_victim's window drain on local bookkeeping instead of the regions
+        promoted: "OrderedDict[str, int]" = OrderedDict()  # drained window keys, at probation's tail
+        evicted = set()
+        window_bytes, window_len = self.window_bytes, len(self.window)
+        main_bytes = self.probation_bytes + self.protected_bytes
+
+        def main_head():
+            for region in (self.probation, promoted, self.protected):
+                for key in region:
+                    if key not in evicted:
+                        return key
+            return None
+
+        for key, size in self.window.items():
+            if window_bytes <= self._window_limit() or window_len <= 1:
+                break
+            window_bytes -= size
+            window_len -= 1
+            victim = main_head()
+            has_room = main_bytes + size <= self._main_limit()
+            promoted[key] = size
+            main_bytes += size
+            if has_room or victim is None:
+                continue
+            loser = key if self.sketch.estimate(key) <= self.sketch.estimate(victim) else victim
+            evicted.add(loser)
+            region = next(r for r in (promoted, self.probation, self.protected) if loser in r)
+            main_bytes -= region[loser]
+            yield loser
+        for region in (self.probation, promoted, self.protected, self.window):
+            for key in region:
+                if key not in evicted and not (region is self.window and key in promoted):
+                    yield key
+
+
+POLICIES = {
+    "lru": LRUPolicy,
+    "lfu": LFUPolicy,
+    "tinylfu": WTinyLFUPolicy,
+    "w-tinylfu": WTinyLFUPolicy,
+}
+
+
+def make_policy(policy: Union[str, EvictionPolicy]) -> EvictionPolicy:
+    if isinstance(policy, EvictionPolicy):
+        return policy
+    try:
+        return POLICIES[policy.lower()]()
+    except KeyError:
+        raise ValueError(f"Unknown eviction policy: {policy}")
@@ -0,0 +1,122 @@
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+from semantic_layer.core.schema import SemanticModel
+from semantic_layer.compiler.query import QueryRequest
+from semantic_layer.core.time_grains import GRAIN_SEPARATOR, split_grain
+
+try:
+    import xxhash
+except ImportError:  # Optional: falls back to blake2b, which is slower but always available
+    xxhash = None
+
+# Fields that change how a result is delivered, not which rows it contains
+_EXCLUDED_FIELDS = {"max_staleness", "max_error"}
+
+
+def _hash(data: bytes) -> str:
+    if xxhash is not None:
+        return xxhash.xxh3_128_hexdigest(data)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class QueryCanonicalizer:
+    """Normalize equivalent QueryRequests to one form.
+    
+    Metric and dimension lists are deduplicated and sorted, names are
+    resolved case-insensitively (filter keys may also use a dimension's
+    SQL expression, and time grain suffixes are lower-cased), scalar
+    filters become one-element IN lists and IN lists are sorted. The
+    result is hashed into a cache key shared by every cache tier.
+    """
+    
+    def __init__(self, model: Optional[SemanticModel] = None):
+        self.model = model
+        self._aliases: Dict[str, str] = {}
+        if model:
+            for table in model.tables:
+                for field in list(table.dimensions) + list(table.metrics):
+                    self._aliases.setdefault(field.name.lower(), field.name)
+                for dim in table.dimensions:
+                    self._aliases.setdefault(dim.sql.lower(), dim.name)
+                    self._aliases.setdefault(f"{table.name}.{dim.name}".lower(), dim.name)
+    
+    def resolve(self, name: str) -> str:
+        name = name.strip()
+        resolved = self._aliases.get(name.lower())
+        if resolved is not None:
+            return resolved
+        base, grain = split_grain(name)
+        if grain is not None:
+            return f"{self._aliases.get(base.lower(), base)}{GRAIN_SEPARATOR}{grain.value}"
+        return name
+    
+    def normalize(self, request: QueryRequest) -> QueryRequest:
+        """Resolve aliases in place of the user's spelling, keeping field order.
+        
+        Filters that resolve to the same dimension are merged by
+        intersecting their values, as the cache key does; ValueError if
+        no value satisfies them all.
+        """
+        filters = None
+        if request.filters:
+            filters = {}
+            for key, value in request.filters.items():
+                name = self.resolve(key)
+                filters[name] = _intersect(name, filters[name], value) if name in filters else value
+        return request.model_copy(update={
+            "metrics": [self.resolve(m) for m in request.metrics],
+            "dimensions": [self.resolve(d) for d in request.dimensions],
+            "filters": filters,
+        })
+    
+    def canonicalize(self, request: QueryRequest) -> Dict[str, Any]:
+        canonical = {
+            "metrics": sorted({self.resolve(m) for m in request.metrics}),
+            "dimensions": sorted({self.resolve(d) for d in request.dimensions}),
+            "filters": self._canonical_filters(request.filters or {}),
+        }
+        for name, value in request.model_dump(exclude=_EXCLUDED_FIELDS).items():
+            if name not in canonical and value is not None:
+                canonical[name] = value
+        return canonical
+    
+    def _canonical_filters(self, filters: Dict[str, Any]) -> Dict[str, List[Any]]:
+        canonical = {}
+        for key, value in filters.items():
+            key = self.resolve(key)
+            # Two spellings of the same column are ANDed: keep the intersection
+            canonical[key] = (_intersect(key, canonical[key], value) if key in canonical
+                              else sorted(set(_as_list(value)), key=_value_order))
+        return dict(sorted(canonical.items()))
+    
+    def cache_key(self, request: QueryRequest) -> str:
+        encoded = json.dumps(self.canonicalize(request), sort_keys=True, separators=(",", ":"), default=str)
+        return _hash(encoded.encode())
+    
+    def fingerprint(self, request: QueryRequest) -> str:
+        """Hash of the query's shape: like `cache_key`, but ignoring filter values."""
+        canonical = self.canonicalize(request)
+        canonical["filters"] = sorted(canonical["filters"])
+        encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"), default=str)
+        return _hash(encoded.encode())
+
+
+def _as_list(value: Any) -> List[Any]:
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def _value_order(value: Any):
+    return type(value).__name__, value
+
+
+def _intersect(name: str, current: Any, value: Any) -> List[Any]:
+    merged = set(_as_list(current)) & set(_as_list(value))
+    if not merged:
+        raise ValueError(f"Filters on {name!r} conflict: no value satisfies them all")
+    return sorted(merged, key=_value_order)
+
+
+def canonical_cache_key(request: QueryRequest, model: Optional[SemanticModel] = None) -> str:
+    return QueryCanonicalizer(model).cache_key(request)
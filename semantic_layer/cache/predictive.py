@@ -1,33 +1,214 @@
-from typing import List, Dict
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-# from semantic_layer.ml.forecasting import TimeSeriesForecaster
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from semantic_layer.core.schema import SemanticModel
+from semantic_layer.compiler.query import QueryRequest
+from semantic_layer.compiler.sql_compiler import SqlCompiler
+from semantic_layer.optimization.cost_estimator import CostEstimator
+from .keys import QueryCanonicalizer
+
+
+@dataclass
+class WarmCandidate:
+    key: str
+    request: QueryRequest
+    window_start: datetime
+    probability: float
+    expected_hits: float
+    cost_seconds: float
+
+    @property
+    def score(self) -> float:
+        return self.expected_hits * self.cost_seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "request": self.request.model_dump(),
+            "window_start": self.window_start.isoformat(),
+            "probability": round(self.probability, 3),
+            "expected_hits": round(self.expected_hits, 3),
+            "cost_seconds": round(self.cost_seconds, 3),
+            "score": round(self.score, 3),
+        }
+
 
 class PredictiveCacheWarmer:
     """
-    AI-driven cache warming.
-    Predicts which queries will be run in the near future and pre-computes them.
+    Pre-compute queries the query log says are about to be run.
+
+    History entries are dicts with `request` (QueryRequest or its dict
+    form), `timestamp` and optionally `duration_ms`. Each canonical query
+    is bucketed by (day-of-week, time slot) and by time slot alone; the
+    share of observed days on which it ran in a slot is the probability it
+    runs there again. Candidates in the lookahead window are ranked by
+    expected hits × average warehouse cost and executed, most valuable
+    first, until `budget_seconds` of predicted cost is used.
+
+    Queries with no recorded duration are costed from the `estimator`'s
+    bytes scanned at `scan_bytes_per_second` when it can tell (it needs
+    the model and statistics), else at the conservative
+    `default_cost_seconds`, so they still count against the budget.
     """
-    
-    def __init__(self, query_history: List[Dict]):
-        self.history = query_history
-        # self.model = TimeSeriesForecaster()
-
-    def predict_upcoming_queries(self, lookahead_minutes: int = 60) -> List[Dict]:
-        """Identify queries likely to be run soon."""
-        # Mock logic: Look for recurring patterns (e.g., every Monday at 9am)
-        upcoming = []
-        now = datetime.now()
-        
-        # Simple heuristic: Queries run at this time on previous days
-        for query in self.history:
-            # Check if query matches current time window in past
-            pass
-            
-        return upcoming
-
-    def warm_cache(self, executor):
-        """Execute predicted queries to populate cache."""
-        queries = self.predict_upcoming_queries()
-        print(f"Pre-warming {len(queries)} queries...")
-        for q in queries:
-            executor.execute(q, cache_only=True)
+
+    def __init__(self, query_history: List[Dict], model: Optional[SemanticModel] = None,
+                 slot_minutes: int = 15, min_occurrences: int = 2, budget_seconds: float = 300.0,
+                 max_concurrency: int = 4, clock: Callable[[], datetime] = datetime.now,
+                 estimator: Optional[CostEstimator] = None, scan_bytes_per_second: float = 1e9,
+                 default_cost_seconds: float = 60.0):
+        self.history = []
+        self.canonicalizer = QueryCanonicalizer(model)
+        self.compiler = SqlCompiler(model) if model else None
+        self.estimator = estimator
+        self.scan_bytes_per_second = scan_bytes_per_second
+        self.default_cost_seconds = default_cost_seconds
+        self.slot_minutes = slot_minutes
+        self.min_occurrences = min_occurrences
+        self.budget_seconds = budget_seconds
+        self.max_concurrency = max_concurrency
+        self.clock = clock
+        self.warmed: Dict[str, datetime] = {}  # key -> end of the window it was warmed for
+        self.warmed_count = 0
+        self.warm_hits = 0
+        self.budget_spent_seconds = 0.0
+        self._lock = threading.Lock()
+        for entry in query_history:
+            self.record(entry["request"], entry["timestamp"], entry.get("duration_ms"))
+
+    def record(self, request: Union[QueryRequest, Dict], timestamp: Optional[datetime] = None,
+               duration_ms: Optional[float] = None) -> bool:
+        """Append a query to the log; returns True when it was served by a warm-up."""
+        if isinstance(request, dict):
+            request = QueryRequest(**request)
+        timestamp = timestamp or self.clock()
+        key = self.canonicalizer.cache_key(request)
+        with self._lock:
+            self.history.append({"key": key, "request": request, "timestamp": timestamp,
+                                 "duration_ms": duration_ms})
+            window_end = self.warmed.get(key)
+            if window_end is None:
+                return False
+            del self.warmed[key]
+            if timestamp > window_end:
+                return False
+            self.warm_hits += 1
+            return True
+
+    def _slot(self, timestamp: datetime) -> int:
+        return (timestamp.hour * 60 + timestamp.minute) // self.slot_minutes
+
+    def predict_upcoming_queries(self, lookahead_minutes: int = 60,
+                                 now: Optional[datetime] = None) -> List[WarmCandidate]:
+        """Rank queries likely to run within the next `lookahead_minutes`."""
+        now = now or self.clock()
+        with self._lock:
+            history = list(self.history)
+        if not history:
+            return []
+
+        first = min(e["timestamp"] for e in history).date()
+        days_observed = (now.date() - first).days or 1
+        weekday_days = defaultdict(int)
+        for offset in range(days_observed):
+            weekday_days[(first + timedelta(days=offset)).weekday()] += 1
+
+        # key -> (weekday, slot) -> days seen, and key -> slot -> days seen
+        weekly = defaultdict(lambda: defaultdict(set))
+        daily = defaultdict(lambda: defaultdict(set))
+        runs = defaultdict(int)
+        durations = defaultdict(list)
+        requests = {}
+        for entry in history:
+            key, ts = entry["key"], entry["timestamp"]
+            if ts >= now:
+                continue
+            weekly[key][(ts.weekday(), self._slot(ts))].add(ts.date())
+            daily[key][self._slot(ts)].add(ts.date())
+            runs[key] += 1
+            requests[key] = entry["request"]
+            if entry["duration_ms"] is not None:
+                durations[key].append(entry["duration_ms"] / 1000)
+
+        step = timedelta(minutes=self.slot_minutes)
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0) + self._slot(now) * step
+        windows = []
+        while start < now + timedelta(minutes=lookahead_minutes):
+            windows.append(start)
+            start += step
+
+        candidates = []
+        for key in requests:
+            best = None
+            for window in windows:
+                weekday, slot = window.weekday(), self._slot(window)
+                weekly_days = len(weekly[key].get((weekday, slot), ()))
+                daily_days = len(daily[key].get(slot, ()))
+                probability = 0.0
+                if weekly_days >= self.min_occurrences:
+                    probability = weekly_days / max(weekday_days[weekday], 1)
+                if daily_days >= self.min_occurrences:
+                    probability = max(probability, daily_days / days_observed)
+                if probability and (best is None or probability > best[1]):
+                    best = (window, min(probability, 1.0))
+            if best is None:
+                continue
+            active_days = len({d for days in daily[key].values() for d in days})
+            if durations[key]:
+                cost = sum(durations[key]) / len(durations[key])
+            else:
+                cost = self._estimated_cost(requests[key])
+            candidates.append(WarmCandidate(
+                key=key,
+                request=requests[key],
+                window_start=best[0],
+                probability=best[1],
+                expected_hits=best[1] * runs[key] / active_days,
+                cost_seconds=cost,
+            ))
+        return sorted(candidates, key=lambda c: c.score, reverse=True)
+
+    def _estimated_cost(self, request: QueryRequest) -> float:
+        if self.estimator is not None and self.compiler is not None:
+            scanned = self.estimator.estimate_cost(self.compiler.plan(request))["estimated_bytes_scanned"]
+            if scanned:
+                return scanned / self.scan_bytes_per_second
+        return self.default_cost_seconds
+
+    def warm_cache(self, executor, lookahead_minutes: int = 60,
+                   now: Optional[datetime] = None) -> List[WarmCandidate]:
+        """Execute the top predictions within the budget; returns what was warmed."""
+        selected = []
+        budget = self.budget_seconds
+        for candidate in self.predict_upcoming_queries(lookahead_minutes, now):
+            if candidate.cost_seconds > budget:
+                continue
+            budget -= candidate.cost_seconds
+            selected.append(candidate)
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="sl-warm") as pool:
+            futures = [(c, pool.submit(executor.execute, c.request)) for c in selected]
+
+        warmed = []
+        window = timedelta(minutes=lookahead_minutes + self.slot_minutes)
+        for candidate, future in futures:
+            if future.exception() is not None:
+                continue
+            with self._lock:
+                self.warmed[candidate.key] = candidate.window_start + window
+                self.warmed_count += 1
+                self.budget_spent_seconds += candidate.cost_seconds
+            warmed.append(candidate)
+        return warmed
+
+    def get_stats(self) -> Dict:
+        return {
+            "history_size": len(self.history),
+            "warmed": self.warmed_count,
+            "warm_hits": self.warm_hits,
+            "warm_hit_rate": self.warm_hits / self.warmed_count if self.warmed_count else 0.0,
+            "budget_spent_seconds": round(self.budget_spent_seconds, 3),
+        }
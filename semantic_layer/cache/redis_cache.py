@@ -1,16 +1,172 @@
-import hashlib
 import json
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from semantic_layer.core.schema import SemanticModel
+from semantic_layer.compiler.query import QueryRequest
+from .keys import QueryCanonicalizer, _hash
+from .resp import RespClient
+from .serialization import deserialize_value, serialize_value
 
 class RedisCache:
-    def __init__(self):
-        self.cache = {}  # Mock in-memory cache
+    """Shared cache tier speaking the Redis protocol.
+    
+    Values are stored as Arrow IPC payloads with a server-side TTL, and
+    each table an entry depends on gets a `deps:<table>` set so any
+    replica can invalidate the shared entries. A set expires with the
+    longest-lived entry added to it. A `fresh:<key>` companion holds the
+    soft-TTL deadline so replicas agree on when a value turns stale.
+    Other replicas' in-process (L1) copies are not notified; they expire
+    on their own TTLs. Without a host the cache keeps the same encoding
+    in a process-local dict (useful for tests).
+    """
+    
+    def __init__(self, host: Optional[str] = None, port: int = 6379, prefix: str = "sl:",
+                 compression: Optional[str] = None, client: Optional[RespClient] = None,
+                 model: Optional[SemanticModel] = None):
+        self.cache = {}  # Local fallback: key -> (payload, fresh_until, expires_at)
+        self.dependencies = {}  # Local fallback: table -> keys
+        self.key_tables = {}  # Local fallback: key -> tables, to prune dependencies on expiry
+        self.prefix = prefix
+        self.compression = compression
+        self.client = client or (RespClient(host, port) if host else None)
+        self.canonicalizer = QueryCanonicalizer(model)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+    
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+    
+    def _fresh_key(self, key: str) -> str:
+        return f"{self.prefix}fresh:{key}"
+    
+    def _deps_key(self, table: str) -> str:
+        return f"{self.prefix}deps:{table}"
     
     def get(self, key: str):
-        return self.cache.get(key)
+        value, stale = self.get_with_staleness(key, max_staleness=0)
+        return value
+    
+    def get_with_staleness(self, key: str, max_staleness: Optional[float] = None) -> Tuple[Optional[Any], bool]:
+        """Return (value, is_stale); see SmartCache.get_with_staleness."""
+        value, stale = self.peek(key, max_staleness)
+        if value is None:
+            self.misses += 1
+        elif stale:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        return value, stale
+    
+    def peek(self, key: str, max_staleness: Optional[float] = 0) -> Tuple[Optional[Any], bool]:
+        """Like get_with_staleness, without counting the lookup."""
+        entry = self.lookup(key)
+        if entry is not None:
+            payload, fresh_until, _ = entry
+            staleness = time.time() - fresh_until
+            if staleness < 0 or max_staleness is None or staleness <= max_staleness:
+                return deserialize_value(payload), staleness >= 0
+        return None, False
+    
+    def lookup(self, key: str) -> Optional[Tuple[bytes, float, float]]:
+        """Raw (payload, fresh_until, expires_at) for a live key."""
+        if self.client:
+            payload, fresh_until, remaining_ms = self.client.pipeline([
+                ("GET", self._key(key)),
+                ("GET", self._fresh_key(key)),
+                ("PTTL", self._key(key)),
+            ])
+            if payload is None or not isinstance(remaining_ms, int) or remaining_ms < 0:
+                return None
+            expires_at = time.time() + remaining_ms / 1000
+            fresh_until = float(fresh_until) if fresh_until is not None else expires_at
+            return payload, fresh_until, expires_at
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        if time.time() >= entry[2]:
+            del self.cache[key]
+            self._forget_dependencies(key)
+            return None
+        return entry
+    
+    def ttl(self, key: str) -> Optional[float]:
+        """Remaining lifetime in seconds, or None if the key is missing."""
+        entry = self.lookup(key)
+        return entry[2] - time.time() if entry else None
+    
+    def set(self, key: str, value, ttl: int = 3600, dependencies: Optional[Iterable[str]] = None,
+            stale_ttl: int = 0):
+        payload = serialize_value(value, compression=self.compression)
+        now = time.time()
+        fresh_until = now + ttl
+        if not self.client:
+            self.cache[key] = (payload, fresh_until, fresh_until + stale_ttl)
+            self._forget_dependencies(key)
+            self.key_tables[key] = set(dependencies or ())
+            for table in self.key_tables[key]:
+                self.dependencies.setdefault(table, set()).add(key)
+            return True
+        ttl_ms = max(1, int((ttl + stale_ttl) * 1000))
+        tables = list(dependencies or ())
+        commands = [
+            ("SET", self._key(key), payload, "PX", ttl_ms),
+            ("SET", self._fresh_key(key), repr(fresh_until), "PX", ttl_ms),
+        ]
+        for table in tables:
+            commands += [("SADD", self._deps_key(table), key), ("PTTL", self._deps_key(table))]
+        replies = self.client.pipeline(commands)
+        # A deps set lives as long as its longest-lived entry, so sets of expired entries go away
+        extend = [
+            ("PEXPIRE", self._deps_key(table), ttl_ms)
+            for table, remaining in zip(tables, replies[3::2]) if remaining < ttl_ms
+        ]
+        if extend:
+            self.client.pipeline(extend)
+        return True
+    
+    def delete(self, key: str) -> bool:
+        if self.client:
+            return self.client.execute("DEL", self._key(key), self._fresh_key(key)) > 0
+        self._forget_dependencies(key)
+        return self.cache.pop(key, None) is not None
+    
+    def _forget_dependencies(self, key: str):
+        for table in self.key_tables.pop(key, ()):
+            keys = self.dependencies.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.dependencies[table]
+    
+    def invalidate_by_table(self, table_name: str) -> int:
+        if not self.client:
+            keys = self.dependencies.pop(table_name, set())
+            for k in keys:
+                self._forget_dependencies(k)
+            return sum(self.cache.pop(k, None) is not None for k in keys)
+        keys = [k.decode() for k in self.client.execute("SMEMBERS", self._deps_key(table_name)) or []]
+        commands = [("DEL", self._key(k)) for k in keys]
+        commands += [("DEL", self._fresh_key(k)) for k in keys]
+        commands.append(("DEL", self._deps_key(table_name)))
+        replies = self.client.pipeline(commands)
+        return sum(r for r in replies[:len(keys)] if isinstance(r, int))
     
-    def set(self, key: str, value, ttl: int = 3600):
-        self.cache[key] = value
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+        }
     
     def generate_key(self, query_dict: dict) -> str:
-        query_str = json.dumps(query_dict, sort_keys=True)
-        return hashlib.md5(query_str.encode()).hexdigest()
+        """Canonical key for a query dict; dicts that are not QueryRequests hash as plain JSON."""
+        if set(query_dict) <= set(QueryRequest.model_fields):
+            try:
+                return self.canonicalizer.cache_key(QueryRequest(**query_dict))
+            except ValueError:
+                pass
+        return _hash(json.dumps(query_dict, sort_keys=True, default=str).encode())
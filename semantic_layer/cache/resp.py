@@ -0,0 +1,100 @@
+import socket
+import threading
+from typing import Any, List, Optional, Union
+
+
+class RespError(Exception):
+    """Error reply returned by a Redis-protocol server."""
+
+
+def encode_command(*args: Union[str, bytes, int, float]) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        else:
+            data = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+def read_reply(stream) -> Any:
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("Connection closed by server")
+    prefix, rest = line[:1], line[1:-2]
+    if prefix == b"+":
+        return rest.decode()
+    if prefix == b"-":
+        raise RespError(rest.decode())
+    if prefix == b":":
+        return int(rest)
+    if prefix == b"$":
+        length = int(rest)
+        if length == -1:
+            return None
+        data = stream.read(length + 2)
+        return data[:-2]
+    if prefix == b"*":
+        count = int(rest)
+        if count == -1:
+            return None
+        return [read_reply(stream) for _ in range(count)]
+    raise RespError(f"Unknown reply type: {line!r}")
+
+
+class RespClient:
+    """Minimal RESP2 client; enough for a cache tier (strings, sets, TTLs)."""
+
+    def __init__(self, host: str = "localhost", port: int = 6379, timeout: Optional[float] = 5.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._sock = None
+        self._stream = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._stream = self._sock.makefile("rb")
+
+    def execute(self, *args) -> Any:
+        with self._lock:
+            if self._sock is None:
+                self._connect()
+            try:
+                self._sock.sendall(encode_command(*args))
+                return read_reply(self._stream)
+            except (ConnectionError, OSError):
+                self._close()
+                raise
+
+    def pipeline(self, commands: List[tuple]) -> List[Any]:
+        """Send several commands in one round trip."""
+        with self._lock:
+            if self._sock is None:
+                self._connect()
+            try:
+                self._sock.sendall(b"".join(encode_command(*c) for c in commands))
+                replies = []
+                for _ in commands:
+                    try:
+                        replies.append(read_reply(self._stream))
+                    except RespError as e:
+                        replies.append(e)
+                return replies
+            except (ConnectionError, OSError):
+                self._close()
+                raise
+
+    def _close(self):
+        if self._sock is not None:
+            self._stream.close()
+            self._sock.close()
+        self._sock = None
+        self._stream = None
+
+    def close(self):
+        with self._lock:
+            self._close()
@@ -1,6 +1,6 @@
+from collections import OrderedDict
 from typing import List, Optional, Dict, Any
 import numpy as np
-# Assuming a vector store client is available
 from semantic_layer.ml.vector_store import VectorStore 
 
 class SemanticIntentCache:
@@ -8,34 +8,62 @@ class SemanticIntentCache:
     Cache query results based on semantic intent rather than exact SQL match.
     Uses vector embeddings to determine if a new natural language query 
     is semantically equivalent to a cached one.
+    
+    A lookup only hits when the nearest cached intent's cosine similarity
+    reaches `similarity_threshold`. At most `max_entries` intents are kept;
+    the least recently used one is evicted first.
     """
     
-    def __init__(self, vector_store: VectorStore, similarity_threshold: float = 0.95):
-        self.vector_store = vector_store
+    def __init__(self, vector_store: Optional[VectorStore] = None, similarity_threshold: float = 0.95,
+                 max_entries: int = 10000):
+        self.vector_store = vector_store if vector_store is not None else VectorStore()
         self.threshold = similarity_threshold
-        self.cache_storage = {} # Map hash(intent_vector) -> result
+        self.max_entries = max_entries
+        self.cache_storage = OrderedDict()  # key -> result, in LRU order
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
     def get(self, query_embedding: np.ndarray) -> Optional[Dict[str, Any]]:
         """Retrieve cached result if a semantically similar query exists."""
-        # Search vector store for nearest neighbor
-        matches = self.vector_store.search(query_embedding, top_k=1)
-        
-        if not matches:
-            return None
-            
-        best_match_key = matches[0]
-        # In a real impl, we'd get the score. Assuming search returns (key, score) or we check distance
-        # For this stub, we assume a hit implies similarity > threshold logic handled in store or here
-        
-        return self.cache_storage.get(best_match_key)
+        return self.get_many(np.atleast_2d(query_embedding))[0]
+
+    def get_many(self, query_embeddings: np.ndarray) -> List[Optional[Dict[str, Any]]]:
+        """Look up several questions with one similarity search."""
+        results = []
+        for matches in self.vector_store.search_batch(query_embeddings, top_k=1):
+            if matches and matches[0][1] >= self.threshold and matches[0][0] in self.cache_storage:
+                key = matches[0][0]
+                self.cache_storage.move_to_end(key)
+                self.hits += 1
+                results.append(self.cache_storage[key])
+            else:
+                self.misses += 1
+                results.append(None)
+        return results
 
     def set(self, query_embedding: np.ndarray, result: Dict[str, Any]):
         """Cache the result keyed by the query embedding."""
         # Generate a consistent key for this embedding (e.g., hash or ID)
-        key = str(hash(query_embedding.tobytes()))
+        key = str(hash(np.asarray(query_embedding, dtype=np.float32).tobytes()))
         
         # Store vector for future lookups
         self.vector_store.add(key, query_embedding)
         
         # Store actual result
         self.cache_storage[key] = result
+        self.cache_storage.move_to_end(key)
+        while len(self.cache_storage) > self.max_entries:
+            evicted, _ = self.cache_storage.popitem(last=False)
+            self.vector_store.remove(evicted)
+            self.evictions += 1
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "intents": len(self.cache_storage),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
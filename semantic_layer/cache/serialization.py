@@ -0,0 +1,81 @@
+import json
+from typing import Any, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+ARROW_TAG = b"A"
+JSON_TAG = b"J"
+_TYPE_KEY = b"semantic_layer.type"
+_SQL_KEY = b"semantic_layer.sql"
+
+
+def serialize_value(value: Any, compression: Optional[str] = None) -> bytes:
+    """Encode a cached value for an out-of-process tier.
+    
+    DataFrames, Arrow tables and QueryResults are written as Arrow IPC
+    streams (optionally lz4/zstd compressed inside the IPC buffers);
+    anything else falls back to JSON, and values JSON cannot represent
+    exactly (timestamps, decimals, ...) raise TypeError rather than
+    coming back as strings.
+    """
+    table = to_tagged_table(value)
+    if table is None:
+        try:
+            return JSON_TAG + json.dumps(value).encode()
+        except TypeError as e:
+            raise TypeError(f"Cannot serialize {type(value).__name__} for the cache: {e}") from e
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return ARROW_TAG + sink.getvalue().to_pybytes()
+
+
+def to_tagged_table(value: Any) -> Optional[pa.Table]:
+    """Arrow form of a value, tagged so `table_to_value` can rebuild it; None if not tabular."""
+    table, kind, sql = _as_arrow(value)
+    if table is None:
+        return None
+    metadata = dict(table.schema.metadata or {})
+    metadata[_TYPE_KEY] = kind.encode()
+    if sql is not None:
+        metadata[_SQL_KEY] = sql.encode()
+    return table.replace_schema_metadata(metadata)
+
+
+def deserialize_value(payload: bytes) -> Any:
+    """Decode a payload; a memoryview is read without copying the Arrow buffers."""
+    tag, body = payload[:1], payload[1:]
+    if tag == JSON_TAG:
+        return json.loads(bytes(body))
+    if tag != ARROW_TAG:
+        raise ValueError(f"Unknown cache payload tag: {tag!r}")
+    table = pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+    return table_to_value(table)
+
+
+def table_to_value(table: pa.Table) -> Any:
+    """Rebuild the original value type from a tagged Arrow table."""
+    metadata = table.schema.metadata or {}
+    kind = metadata.get(_TYPE_KEY, b"table").decode()
+    if kind == "table":
+        return table
+    df = table.to_pandas()
+    if kind == "query_result":
+        # Imported lazily: the executor itself depends on the cache package
+        from semantic_layer.execution.executor import QueryResult
+        return QueryResult(sql=metadata[_SQL_KEY].decode(), data=df)
+    return df
+
+
+def _as_arrow(value: Any):
+    if isinstance(value, pa.Table):
+        return value, "table", None
+    if isinstance(value, pd.DataFrame):
+        return pa.Table.from_pandas(value, preserve_index=False), "dataframe", None
+    data = getattr(value, "data", None)
+    sql = getattr(value, "sql", None)
+    if isinstance(data, pd.DataFrame) and isinstance(sql, str):
+        return pa.Table.from_pandas(data, preserve_index=False), "query_result", sql
+    return None, None, None
@@ -0,0 +1,402 @@
+import fcntl
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .keys import _hash
+from .serialization import deserialize_value, serialize_value
+
+_MAGIC = b"SLSHM001"
+_HEADER = struct.Struct("<8sQQQQ")  # magic, slots, arena size, head, tail
+_HEADER_SIZE = 64
+# seq, state, digest, offset, length, deps overflow, fresh_until, expires_at, written/released at, deps
+_SLOT = struct.Struct("<QQ16sQQQddd4Q")
+_SEQ = struct.Struct("<Q")
+_MAX_DEPS = 4
+_READ_TIMEOUT = 0.01  # seconds a reader waits on a slot mid-write before treating it as a miss
+
+_EMPTY, _LIVE, _TOMBSTONE = 0, 1, 2
+
+
+def _digest(key: str) -> bytes:
+    return bytes.fromhex(_hash(key.encode()))
+
+
+def _table_hash(table: str) -> int:
+    return int.from_bytes(_digest(f"table:{table}")[:8], "little") or 1
+
+
+def _open_segment(name: str, create: bool, size: int = 0) -> Tuple[shared_memory.SharedMemory, bool]:
+    """(segment, whether it had to be unregistered from the resource tracker by hand)."""
+    # Workers often share one resource tracker, which would unlink the segment when any
+    # of them exits; the owner unlinks it explicitly in close() instead
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False), False
+    segment = shared_memory.SharedMemory(name=name, create=create, size=size)
+    resource_tracker.unregister(_tracker_name(segment), "shared_memory")
+    return segment, True
+
+
+def _tracker_name(segment: shared_memory.SharedMemory) -> str:
+    # The tracker knows POSIX segments by their path, which is the public name with a leading slash
+    return "/" + segment.name
+
+
+class SharedMemoryCache:
+    """Cache tier shared by every worker process on a host.
+
+    One `multiprocessing.shared_memory` segment holds a header, a fixed
+    open-addressing index of slots and an arena of serialized (Arrow IPC)
+    values written as a circular log. Readers take no lock: each slot is
+    guarded by a sequence counter (a seqlock) and a read is retried if a
+    writer changed the slot meanwhile, or reported as a miss if a slot
+    stays mid-write (e.g. its writer died). A hit copies the payload out of
+    the segment once and decodes the Arrow buffers from that copy, so
+    returned values never alias memory a later write may reuse. Writers
+    serialize on a host-local file lock and append at the head of the log.
+
+    The process that creates the segment (`create=True`) owns eviction:
+    expired entries are dropped first, then the oldest ones, and freed
+    space is only reused `grace_seconds` after its entry left the index,
+    so a reader still copying the old payload is not overwritten mid-copy.
+    Other workers attach by name; their writes fail (and count as
+    rejections) when the arena is full until the owner frees space, for
+    which it can run `start_eviction_worker`.
+    """
+
+    def __init__(self, name: str = "semantic-layer-cache", size_bytes: int = 256 * 1024 * 1024,
+                 slots: int = 4096, create: bool = False, default_ttl: int = 3600,
+                 default_stale_ttl: int = 0, grace_seconds: float = 5.0, low_watermark: float = 0.2):
+        self.name = name
+        self.owner = create
+        self.default_ttl = default_ttl
+        self.default_stale_ttl = default_stale_ttl
+        self.grace_seconds = grace_seconds
+        self.low_watermark = low_watermark
+        if create:
+            self.shm, self._untracked = _open_segment(name, True, _HEADER_SIZE + slots * _SLOT.size + size_bytes)
+            self.shm.buf[:_HEADER_SIZE + slots * _SLOT.size] = bytes(_HEADER_SIZE + slots * _SLOT.size)
+            _HEADER.pack_into(self.shm.buf, 0, _MAGIC, slots, size_bytes, 0, 0)
+        else:
+            self.shm, self._untracked = _open_segment(name, False)
+        magic, self.slots, self.arena_size, _, _ = _HEADER.unpack_from(self.shm.buf, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"Shared memory segment {name!r} is not a semantic layer cache")
+        self._arena_start = _HEADER_SIZE + self.slots * _SLOT.size
+        self._lock_path = os.path.join(tempfile.gettempdir(), f"{name}.lock")
+        self._thread_lock = threading.Lock()
+        self._worker = None
+        self._stop = threading.Event()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.rejections = 0
+        self.evictions = 0
+
+    @contextmanager
+    def _write_lock(self):
+        with self._thread_lock, open(self._lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _slot_offset(self, index: int) -> int:
+        return _HEADER_SIZE + index * _SLOT.size
+
+    def _read_slot(self, index: int) -> Optional[Tuple]:
+        """Consistent snapshot of a slot (seqlock read); None if it stays mid-write."""
+        offset = self._slot_offset(index)
+        deadline = None
+        while True:
+            before = _SEQ.unpack_from(self.shm.buf, offset)[0]
+            if not before & 1:
+                fields = _SLOT.unpack_from(self.shm.buf, offset)
+                if _SEQ.unpack_from(self.shm.buf, offset)[0] == before:
+                    return fields
+            # A writer is in progress, or died holding the slot odd
+            if deadline is None:
+                deadline = time.monotonic() + _READ_TIMEOUT
+            elif time.monotonic() >= deadline:
+                return None
+            time.sleep(0)
+
+    def _write_slot(self, index: int, *fields):
+        offset = self._slot_offset(index)
+        seq = _SEQ.unpack_from(self.shm.buf, offset)[0]
+        _SEQ.pack_into(self.shm.buf, offset, seq + 1)
+        _SLOT.pack_into(self.shm.buf, offset, seq + 1, *fields)
+        _SEQ.pack_into(self.shm.buf, offset, seq + 2)
+
+    def _probe(self, digest: bytes):
+        start = int.from_bytes(digest[:8], "little") % self.slots
+        for i in range(self.slots):
+            yield (start + i) % self.slots
+
+    def _find(self, digest: bytes) -> Optional[Tuple[int, Tuple]]:
+        for index in self._probe(digest):
+            fields = self._read_slot(index)
+            if fields is None:
+                continue
+            state = fields[1]
+            if state == _EMPTY:
+                return None
+            if state == _LIVE and fields[2] == digest:
+                return index, fields
+        return None
+
+    def _head_tail(self) -> Tuple[int, int]:
+        _, _, _, head, tail = _HEADER.unpack_from(self.shm.buf, 0)
+        return head, tail
+
+    def _set_head_tail(self, head: int, tail: int):
+        _HEADER.pack_into(self.shm.buf, 0, _MAGIC, self.slots, self.arena_size, head, tail)
+
+    def get(self, key: str) -> Optional[Any]:
+        value, stale = self.get_with_staleness(key, max_staleness=0)
+        return value
+
+    def get_with_staleness(self, key: str, max_staleness: Optional[float] = None) -> Tuple[Optional[Any], bool]:
+        """Return (value, is_stale); see SmartCache.get_with_staleness."""
+        value, stale = self.peek(key, max_staleness)
+        if value is None:
+            self.misses += 1
+        elif stale:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        return value, stale
+
+    def peek(self, key: str, max_staleness: Optional[float] = 0) -> Tuple[Optional[Any], bool]:
+        """Like get_with_staleness, without counting the lookup."""
+        digest = _digest(key)
+        while True:
+            found = self._find(digest)
+            if found is None:
+                break
+            index, fields = found
+            seq, _, _, offset, length, _, fresh_until, expires_at = fields[:8]
+            now = time.time()
+            staleness = now - fresh_until
+            if now >= expires_at or not (staleness < 0 or max_staleness is None or staleness <= max_staleness):
+                break
+            start = self._arena_start + offset % self.arena_size
+            payload = bytes(self.shm.buf[start:start + length])
+            if _SEQ.unpack_from(self.shm.buf, self._slot_offset(index))[0] != seq:
+                continue  # Rewritten while copying; read again
+            return deserialize_value(payload), staleness >= 0
+        return None, False
+
+    def lookup(self, key: str) -> Optional[Tuple[int, float, float]]:
+        """(length, fresh_until, expires_at) for a live key."""
+        found = self._find(_digest(key))
+        if found is None or time.time() >= found[1][7]:
+            return None
+        return found[1][4], found[1][6], found[1][7]
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None,
+            dependencies: Optional[Iterable[str]] = None, stale_ttl: Optional[int] = None):
+        payload = serialize_value(value)
+        dependencies = sorted(set(dependencies or ()))
+        deps = [_table_hash(t) for t in dependencies[:_MAX_DEPS]]
+        deps += [0] * (_MAX_DEPS - len(deps))
+        overflow = int(len(dependencies) > _MAX_DEPS)
+        now = time.time()
+        fresh_until = now + (ttl or self.default_ttl)
+        expires_at = fresh_until + (self.default_stale_ttl if stale_ttl is None else stale_ttl)
+        digest = _digest(key)
+
+        with self._write_lock():
+            offset = self._allocate(len(payload))
+            if offset is None and self.owner:
+                self._evict(len(payload))
+                offset = self._allocate(len(payload))
+            if offset is None:
+                self.rejections += 1
+                return False
+            existing, index = self._claim_slot(digest, now)
+            if index is None:
+                self.rejections += 1
+                return False
+            start = self._arena_start + offset % self.arena_size
+            self.shm.buf[start:start + len(payload)] = payload
+            self._set_head_tail(offset + len(payload), self._head_tail()[1])
+            self._write_slot(index, _LIVE, digest, offset, len(payload), overflow,
+                             fresh_until, expires_at, now, *deps)
+            # The new slot is live before the old one goes, so readers never miss the key
+            if existing is not None:
+                self._retire(*existing)
+            return True
+
+    def _allocate(self, length: int) -> Optional[int]:
+        """Logical offset for `length` contiguous bytes at the head of the log."""
+        if length > self.arena_size:
+            return None
+        head, tail = self._head_tail()
+        physical = head % self.arena_size
+        if physical + length > self.arena_size:
+            head += self.arena_size - physical  # Values never wrap; skip to the arena start
+        if head + length - tail > self.arena_size:
+            return None
+        return head
+
+    def _claim_slot(self, digest: bytes, now: float) -> Tuple[Optional[Tuple[int, Tuple]], Optional[int]]:
+        """(existing live slot for the key, free slot to write into)."""
+        existing = free = None
+        for index in self._probe(digest):
+            fields = self._read_slot(index)
+            if fields is None:
+                continue  # Left mid-write by a dead writer; never reuse it
+            state = fields[1]
+            if state == _LIVE and fields[2] == digest:
+                existing = (index, fields)
+            # A tombstone pins its old value's space until the grace period ends
+            elif free is None and (state == _EMPTY or now - fields[8] >= self.grace_seconds):
+                free = index
+            if state == _EMPTY:
+                break
+        return existing, free
+
+    def _retire(self, index: int, fields: Tuple):
+        """Replace a live slot with a tombstone recording when its space was released."""
+        self._write_slot(index, _TOMBSTONE, b"\0" * 16, fields[3], fields[4], 0,
+                         0.0, 0.0, time.time(), 0, 0, 0, 0)
+
+    def _entries(self, state: int) -> List[Tuple[int, Tuple]]:
+        entries = []
+        for index in range(self.slots):
+            fields = self._read_slot(index)
+            if fields is not None and fields[1] == state:
+                entries.append((index, fields))
+        return entries
+
+    def _evict(self, needed: int = 0) -> int:
+        """Owner only: drop expired then oldest entries and advance the tail."""
+        now = time.time()
+        head, tail = self._head_tail()
+        target = max(needed, int(self.arena_size * self.low_watermark))
+        entries = sorted(self._entries(_LIVE), key=lambda e: e[1][3])
+        survivors = []
+        for index, fields in entries:
+            if now >= fields[7]:
+                self._retire(index, fields)
+            else:
+                survivors.append((index, fields))
+        oldest = 0
+        while oldest < len(survivors) and self.arena_size - (head - max(tail, survivors[oldest][1][3])) < target:
+            self._retire(*survivors[oldest])
+            oldest += 1
+        evicted = len(entries) - len(survivors) + oldest
+        self.evictions += evicted
+
+        # Released space becomes reusable once no reader can still be using it
+        now = time.time()
+        pinned = [fields[3] for _, fields in survivors[oldest:]]
+        pinned += [fields[3] for _, fields in self._entries(_TOMBSTONE) if now - fields[8] < self.grace_seconds]
+        self._set_head_tail(head, max(tail, min(pinned, default=head)))
+        self._clear_tombstones(now)
+        return evicted
+
+    def _clear_tombstones(self, now: float):
+        """Owner only: empty released tombstones that end a probe chain.
+
+        A probe stops at the first EMPTY slot, so a tombstone directly
+        before one cannot lie on the path to any live key. Walking the
+        ring backwards from an EMPTY slot collapses whole runs at once,
+        keeping misses and inserts short after heavy churn.
+        """
+        empty = [index for index, _ in self._entries(_EMPTY)]
+        if not empty:
+            return
+        following_empty = True
+        for step in range(1, self.slots):
+            index = (empty[0] - step) % self.slots
+            fields = self._read_slot(index)
+            if (following_empty and fields is not None and fields[1] == _TOMBSTONE
+                    and now - fields[8] >= self.grace_seconds):
+                self._write_slot(index, _EMPTY, b"\0" * 16, 0, 0, 0, 0.0, 0.0, 0.0, 0, 0, 0, 0)
+                continue
+            following_empty = fields is not None and fields[1] == _EMPTY
+
+    def evict(self) -> int:
+        if not self.owner:
+            raise RuntimeError("Only the process that created the shared cache evicts")
+        with self._write_lock():
+            return self._evict()
+
+    def start_eviction_worker(self, interval: float = 1.0):
+        """Owner only: keep `low_watermark` of the arena free from a daemon thread."""
+        if self._worker is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                self.evict()
+
+        self._worker = threading.Thread(target=run, name="shared-cache-eviction", daemon=True)
+        self._worker.start()
+
+    def stop_eviction_worker(self):
+        if self._worker is None:
+            return
+        self._stop.set()
+        self._worker.join()
+        self._worker = None
+
+    def delete(self, key: str) -> bool:
+        with self._write_lock():
+            found = self._find(_digest(key))
+            if found is None:
+                return False
+            self._retire(*found)
+            return True
+
+    def invalidate_by_table(self, table_name: str) -> int:
+        """Drop entries depending on a table; entries with over four dependencies always match."""
+        table = _table_hash(table_name)
+        with self._write_lock():
+            removed = 0
+            for index, fields in self._entries(_LIVE):
+                if fields[5] or table in fields[9:]:
+                    self._retire(index, fields)
+                    removed += 1
+            return removed
+
+    def get_stats(self) -> Dict:
+        head, tail = self._head_tail()
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "total_entries": len(self._entries(_LIVE)),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            "rejections": self.rejections,
+            "evictions": self.evictions,
+            "bytes": head - tail,
+            "max_bytes": self.arena_size,
+        }
+
+    def close(self):
+        self.stop_eviction_worker()
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # Views of the segment are still alive; the mapping is released when they go
+        if self.owner:
+            if self._untracked:
+                # unlink() unregisters the segment, so the tracker must know it again first
+                resource_tracker.register(_tracker_name(self.shm), "shared_memory")
+            self.shm.unlink()
+            try:
+                os.remove(self._lock_path)
+            except FileNotFoundError:
+                pass
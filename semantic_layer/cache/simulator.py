@@ -0,0 +1,150 @@
+import csv
+import itertools
+import json
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from .admission import AdmissionFilter
+from .smart_cache import SmartCache
+
+
+@dataclass(frozen=True)
+class LoggedQuery:
+    key: str
+    timestamp: float  # epoch seconds
+    size: int  # result bytes
+    cost: float  # warehouse seconds to compute
+
+
+@dataclass(frozen=True)
+class CacheConfig:
+    eviction_policy: str = "lru"
+    max_bytes: Optional[int] = None
+    ttl: int = 3600
+    stale_ttl: int = 0
+    admission: bool = False
+
+    @property
+    def label(self) -> str:
+        size = "unbounded" if self.max_bytes is None else f"{self.max_bytes / 1024 / 1024:g}MB"
+        label = f"{self.eviction_policy}/{size}/ttl={self.ttl}s"
+        if self.stale_ttl:
+            label += f"+{self.stale_ttl}s stale"
+        return label + ("/admission" if self.admission else "")
+
+
+@dataclass
+class SimulationReport:
+    config: CacheConfig
+    requests: int = 0
+    hits: int = 0
+    stale_hits: int = 0
+    bytes_saved: int = 0
+    warehouse_seconds: float = 0.0
+    warehouse_seconds_saved: float = 0.0
+    evictions: int = 0
+    rejections: int = 0
+    peak_bytes: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        return (self.hits + self.stale_hits) / self.requests if self.requests else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "config": self.config.label,
+            **asdict(self.config),
+            "requests": self.requests,
+            "hit_ratio": round(self.hit_ratio, 4),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "bytes_saved": self.bytes_saved,
+            "warehouse_seconds": round(self.warehouse_seconds, 3),
+            "warehouse_seconds_saved": round(self.warehouse_seconds_saved, 3),
+            "evictions": self.evictions,
+            "rejections": self.rejections,
+            "peak_bytes": self.peak_bytes,
+        }
+
+
+class _ReplayClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CacheSimulator:
+    """Replay a recorded query log against candidate cache configurations.
+
+    Each configuration gets a fresh `SmartCache` driven by a clock that
+    follows the log's timestamps, so TTLs, eviction policies, byte
+    budgets and admission behave exactly as in production. A fresh hit
+    saves the logged result size and warehouse seconds; a stale hit saves
+    the transfer but still pays for the refresh. A miss stores a
+    placeholder of the logged size.
+    """
+
+    def __init__(self, log: Iterable[LoggedQuery]):
+        self.log = sorted(log, key=lambda q: q.timestamp)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> "CacheSimulator":
+        """Build from dicts with key, timestamp (epoch or ISO string), size and cost."""
+        log = []
+        for record in records:
+            timestamp = record["timestamp"]
+            if isinstance(timestamp, str):
+                timestamp = datetime.fromisoformat(timestamp).timestamp()
+            elif isinstance(timestamp, datetime):
+                timestamp = timestamp.timestamp()
+            log.append(LoggedQuery(key=str(record["key"]), timestamp=float(timestamp),
+                                   size=int(record["size"]), cost=float(record["cost"])))
+        return cls(log)
+
+    @classmethod
+    def from_file(cls, path: str) -> "CacheSimulator":
+        """Load a JSON-lines or CSV query log."""
+        with open(path, newline="") as f:
+            if path.endswith(".csv"):
+                return cls.from_records(csv.DictReader(f))
+            return cls.from_records(json.loads(line) for line in f if line.strip())
+
+    def replay(self, config: CacheConfig) -> SimulationReport:
+        clock = _ReplayClock()
+        cache = SmartCache(default_ttl=config.ttl, default_stale_ttl=config.stale_ttl,
+                           max_bytes=config.max_bytes, eviction_policy=config.eviction_policy,
+                           clock=clock, admission=AdmissionFilter() if config.admission else None)
+        report = SimulationReport(config=config)
+        for query in self.log:
+            clock.now = query.timestamp
+            report.requests += 1
+            value, stale = cache.get_with_staleness(query.key)
+            if value is not None and not stale:
+                report.hits += 1
+                report.bytes_saved += query.size
+                report.warehouse_seconds_saved += query.cost
+                continue
+            if value is not None:
+                # Served from cache, but the background refresh still runs on the warehouse
+                report.stale_hits += 1
+                report.bytes_saved += query.size
+            report.warehouse_seconds += query.cost
+            cache.set(query.key, True, size=query.size, cost=query.cost)
+            report.peak_bytes = max(report.peak_bytes, cache.total_bytes)
+        report.evictions = cache.evictions
+        report.rejections = cache.rejections
+        return report
+
+    def run(self, configs: Iterable[CacheConfig]) -> List[SimulationReport]:
+        """Replay every configuration; best warehouse savings first."""
+        reports = [self.replay(config) for config in configs]
+        return sorted(reports, key=lambda r: r.warehouse_seconds_saved, reverse=True)
+
+    @staticmethod
+    def grid(policies: Iterable[str] = ("lru", "lfu", "w-tinylfu"), sizes: Iterable[Optional[int]] = (None,),
+             ttls: Iterable[int] = (3600,), stale_ttls: Iterable[int] = (0,),
+             admission: Iterable[bool] = (False,)) -> List[CacheConfig]:
+        return [CacheConfig(*combo) for combo in itertools.product(policies, sizes, ttls, stale_ttls, admission)]
@@ -0,0 +1,106 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while
+    it is in flight wait on the same future and receive the same result
+    or exception. Threads (`do`) and asyncio tasks (`do_async`) share one
+    map of in-flight calls, so a thread and a task asking for the same
+    key also coalesce.
+
+    A `recheck` callable, if given, runs before the leader executes: a
+    caller that missed the cache just before the previous leader stored
+    its result gets that result instead of recomputing it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self.executions = 0
+        self.coalesced = 0
+        self.rechecked = 0
+        self.errors = 0
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        """(future for key, whether this caller leads)."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is None:
+                future = self._calls[key] = Future()
+                return future, True
+            self.coalesced += 1
+            return future, False
+
+    def _recheck(self, recheck: Optional[Callable[[], Any]]) -> Any:
+        result = recheck() if recheck else None
+        with self._lock:
+            if result is None:
+                self.executions += 1
+            else:
+                self.rechecked += 1
+        return result
+
+    def _finish(self, key: str, future: Future, error: Optional[BaseException] = None, result: Any = None):
+        with self._lock:
+            del self._calls[key]
+            if error is not None:
+                self.errors += 1
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: str, fn: Callable[[], Any], recheck: Optional[Callable[[], Any]] = None) -> Any:
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = self._recheck(recheck)
+            if result is None:
+                result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]],
+                       recheck: Optional[Callable[[], Any]] = None) -> Any:
+        future, leader = self._join(key)
+        if not leader:
+            # shield: one waiter being cancelled must not cancel the shared call
+            return await asyncio.shield(asyncio.wrap_future(future))
+        try:
+            result = self._recheck(recheck)
+            if result is None:
+                result = await fn()
+        except asyncio.CancelledError:
+            with self._lock:
+                del self._calls[key]
+            future.cancel()
+            raise
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def get_stats(self) -> Dict:
+        calls = self.executions + self.coalesced + self.rechecked
+        return {
+            "executions": self.executions,
+            "coalesced_waits": self.coalesced,
+            "rechecked_hits": self.rechecked,
+            "errors": self.errors,
+            "coalesce_rate": self.coalesced / calls if calls else 0.0,
+            "in_flight": self.in_flight(),
+        }
@@ -0,0 +1,34 @@
+import sys
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+def estimate_nbytes(value: Any) -> int:
+    """Approximate the memory held by a cached value.
+    
+    Arrow and numpy report their buffer sizes directly; DataFrames are
+    measured with deep memory usage. Other objects fall back to a shallow
+    recursive walk of containers.
+    """
+    if isinstance(value, (pa.Table, pa.RecordBatch, pa.Array, pa.ChunkedArray)):
+        return int(value.nbytes)
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_nbytes(k) + estimate_nbytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(v) for v in value)
+    # Results wrapping a frame or spill file (e.g. QueryResult)
+    data = getattr(value, "data", None)
+    if isinstance(data, (pd.DataFrame, pa.Table)):
+        return estimate_nbytes(data)
+    return sys.getsizeof(value)
@@ -0,0 +1,42 @@
+from typing import Hashable, List
+
+
+class CountMinSketch:
+    """Approximate frequency counter with periodic aging.
+    
+    Counts are halved every `sample_size` increments so the sketch tracks
+    recent popularity rather than all-time totals.
+    """
+    
+    def __init__(self, width: int = 4096, depth: int = 4, sample_size: int = 0):
+        self.width = width
+        self.depth = depth
+        self.sample_size = sample_size or width * 10
+        self.table: List[List[int]] = [[0] * width for _ in range(depth)]
+        self.additions = 0
+        self.resets = 0
+    
+    def _indexes(self, key: Hashable):
+        # Double hashing: rows must be independent or collisions repeat in every row
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        for row in range(self.depth):
+            yield row, (h1 + row * h2) % self.width
+    
+    def increment(self, key: Hashable):
+        for row, col in self._indexes(key):
+            self.table[row][col] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self.age()
+    
+    def estimate(self, key: Hashable) -> int:
+        return min(self.table[row][col] for row, col in self._indexes(key))
+    
+    def age(self):
+        """Halve every counter."""
+        for row in self.table:
+            for i in range(len(row)):
+                row[i] >>= 1
+        self.additions //= 2
+        self.resets += 1
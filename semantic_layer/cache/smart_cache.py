@@ -1,51 +1,255 @@
-import hashlib
-import json
+import heapq
+import threading
 import time
-from typing import Optional, Dict, Any
+from typing import Callable, Iterable, Optional, Dict, Any, Set, Tuple, Union
+
+from .admission import AdmissionFilter
+from .eviction import EvictionPolicy, make_policy
+from .sizing import estimate_nbytes
 
 class SmartCache:
-    """Intelligent caching with TTL and dependency tracking."""
-    
-    def __init__(self, default_ttl: int = 3600):
+    """Intelligent caching with TTL and dependency tracking.
+
+    With `max_bytes` set the cache is memory-bounded: every entry is sized
+    when stored and the eviction policy ("lru", "lfu" or "w-tinylfu")
+    picks victims until the total fits. Expired entries are dropped from
+    an expiry heap on writes, or periodically by `start_expiry_worker`.
+
+    Each entry has a soft TTL (`ttl`) and a hard TTL (`ttl + stale_ttl`).
+    `get` only returns fresh values; `get_with_staleness` also returns
+    values between the two deadlines, flagged as stale, so callers can
+    serve them while refreshing in the background.
+
+    An optional `admission` filter sees every lookup; once the cache is
+    full, a new entry is stored only if the filter prefers it to the
+    eviction policy's victim.
+    """
+
+    def __init__(self, default_ttl: int = 3600, default_stale_ttl: int = 0,
+                 max_bytes: Optional[int] = None,
+                 eviction_policy: Union[str, EvictionPolicy] = "lru",
+                 clock: Callable[[], float] = time.time,
+                 admission: Optional[AdmissionFilter] = None):
         self.cache = {}
         self.default_ttl = default_ttl
-        self.dependencies = {}  # Track metric dependencies
-    
+        self.default_stale_ttl = default_stale_ttl
+        self.dependencies: Dict[str, Set[str]] = {}  # table -> keys of entries reading it
+        self.max_bytes = max_bytes
+        self.policy = make_policy(eviction_policy)
+        self.policy.bind(max_bytes)
+        self.clock = clock
+        self.admission = admission
+        self.total_bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejections = 0
+        self._expiry_heap = []  # (expires_at, key)
+        self._lock = threading.RLock()
+        self._worker = None
+        self._stop = threading.Event()
+
     def get(self, key: str) -> Optional[Any]:
-        if key in self.cache:
-            entry = self.cache[key]
-            if time.time() < entry["expires_at"]:
-                entry["hits"] += 1
-                return entry["value"]
-            else:
-                del self.cache[key]
-        return None
-    
-    def set(self, key: str, value: Any, ttl: Optional[int] = None):
-        expires_at = time.time() + (ttl or self.default_ttl)
-        self.cache[key] = {
-            "value": value,
-            "expires_at": expires_at,
-            "created_at": time.time(),
-            "hits": 0
-        }
-    
+        value, stale = self.get_with_staleness(key, max_staleness=0)
+        return value
+
+    def get_with_staleness(self, key: str, max_staleness: Optional[float] = None) -> Tuple[Optional[Any], bool]:
+        """Return (value, is_stale).
+
+        A stale value is returned if it is within its hard TTL and, when
+        `max_staleness` is given, no more than that many seconds past its
+        soft TTL.
+        """
+        return self._get(key, max_staleness, record=True)
+
+    def peek(self, key: str, max_staleness: Optional[float] = 0) -> Tuple[Optional[Any], bool]:
+        """Like get_with_staleness, but touching no statistics, recency or frequency."""
+        return self._get(key, max_staleness, record=False)
+
+    def _get(self, key: str, max_staleness: Optional[float], record: bool) -> Tuple[Optional[Any], bool]:
+        with self._lock:
+            if record and self.admission is not None:
+                self.admission.record_access(key)
+            entry = self.cache.get(key)
+            if entry is not None:
+                now = self.clock()
+                if now >= entry["expires_at"]:
+                    if record:
+                        self._remove(key)
+                        self.expirations += 1
+                else:
+                    staleness = now - entry["fresh_until"]
+                    if staleness < 0 or max_staleness is None or staleness <= max_staleness:
+                        stale = staleness >= 0
+                        if record:
+                            entry["hits"] += 1
+                            if stale:
+                                self.stale_hits += 1
+                            else:
+                                self.hits += 1
+                            self.policy.record_access(key)
+                        return entry["value"], stale
+            if record:
+                self.misses += 1
+        return None, False
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, size: Optional[int] = None,
+            dependencies: Optional[Iterable[str]] = None, stale_ttl: Optional[int] = None,
+            cost: Optional[float] = None, admitted: bool = False):
+        """Store a value; `cost` is the seconds it took to compute, used by admission.
+
+        `admitted` skips the admission check for a caller that already ran `admits`.
+        """
+        size = estimate_nbytes(value) if size is None else size
+        with self._lock:
+            now = self.clock()
+            self.purge_expired(now)
+            if self.max_bytes is not None and size > self.max_bytes:
+                self.rejections += 1
+                return False
+            if not admitted and not self.admits(key, size, cost):
+                self.rejections += 1
+                self.admission.reject()
+                return False
+            if key in self.cache:
+                self._remove(key)
+            fresh_until = now + (ttl or self.default_ttl)
+            expires_at = fresh_until + (self.default_stale_ttl if stale_ttl is None else stale_ttl)
+            self.cache[key] = {
+                "value": value,
+                "fresh_until": fresh_until,
+                "expires_at": expires_at,
+                "created_at": now,
+                "hits": 0,
+                "size": size,
+                "cost": cost,
+                "dependencies": frozenset(dependencies or ())
+            }
+            for table in self.cache[key]["dependencies"]:
+                self.dependencies.setdefault(table, set()).add(key)
+            self.total_bytes += size
+            self.policy.record_insert(key, size)
+            heapq.heappush(self._expiry_heap, (expires_at, key))
+            self._evict_to_fit()
+            return key in self.cache
+
+    def admits(self, key: str, size: int, cost: Optional[float] = None) -> bool:
+        """Whether the admission filter would let `key` displace every victim needed to fit it."""
+        with self._lock:
+            if self.admission is None or self.max_bytes is None or key in self.cache:
+                return True
+            needed = self.total_bytes + size - self.max_bytes
+            for victim in self.policy.peek_victims():
+                if needed <= 0:
+                    break
+                entry = self.cache.get(victim)
+                if entry is None:
+                    break
+                if not self.admission.should_admit(key, size, cost, victim, entry["size"], entry["cost"]):
+                    return False
+                needed -= entry["size"]
+            return True
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            if key not in self.cache:
+                return False
+            self._remove(key)
+            return True
+
+    def _remove(self, key: str):
+        entry = self.cache.pop(key)
+        self.total_bytes -= entry["size"]
+        for table in entry["dependencies"]:
+            keys = self.dependencies.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.dependencies[table]
+        self.policy.record_remove(key)
+
+    def _evict_to_fit(self):
+        if self.max_bytes is None:
+            return
+        while self.total_bytes > self.max_bytes and self.cache:
+            victim = self.policy.select_victim()
+            if victim is None or victim not in self.cache:
+                break
+            self._remove(victim)
+            self.evictions += 1
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """Drop every entry whose TTL has passed; O(expired * log n)."""
+        now = self.clock() if now is None else now
+        purged = 0
+        with self._lock:
+            heap = self._expiry_heap
+            while heap and heap[0][0] <= now:
+                expires_at, key = heapq.heappop(heap)
+                entry = self.cache.get(key)
+                # Skip heap records superseded by a later set() of the same key
+                if entry is not None and entry["expires_at"] == expires_at:
+                    self._remove(key)
+                    self.expirations += 1
+                    purged += 1
+            # Rebuild once stale records dominate so the heap stays proportional to the cache
+            if len(heap) > 2 * len(self.cache) + 64:
+                self._expiry_heap = [(e["expires_at"], k) for k, e in self.cache.items()]
+                heapq.heapify(self._expiry_heap)
+        return purged
+
+    def start_expiry_worker(self, interval: float = 1.0):
+        """Purge expired entries from a daemon thread every `interval` seconds."""
+        if self._worker is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                self.purge_expired()
+
+        self._worker = threading.Thread(target=run, name="smart-cache-expiry", daemon=True)
+        self._worker.start()
+
+    def stop_expiry_worker(self):
+        if self._worker is None:
+            return
+        self._stop.set()
+        self._worker.join()
+        self._worker = None
+
     def invalidate_by_table(self, table_name: str):
-        """Invalidate all cached queries that depend on a table."""
-        keys_to_delete = []
-        for key, entry in self.cache.items():
-            if table_name in entry.get("dependencies", []):
-                keys_to_delete.append(key)
-        
-        for key in keys_to_delete:
-            del self.cache[key]
-        
-        return len(keys_to_delete)
-    
+        """Invalidate all cached queries that depend on a table.
+
+        Uses the table -> keys index, so the cost is proportional to the
+        number of affected entries rather than the size of the cache.
+        """
+        with self._lock:
+            keys_to_delete = list(self.dependencies.get(table_name, ()))
+            for key in keys_to_delete:
+                self._remove(key)
+            return len(keys_to_delete)
+
     def get_stats(self) -> Dict:
-        total_hits = sum(e["hits"] for e in self.cache.values())
-        return {
-            "total_entries": len(self.cache),
-            "total_hits": total_hits,
-            "cache_size_mb": sum(len(str(e["value"])) for e in self.cache.values()) / 1024 / 1024
-        }
+        with self._lock:
+            total_hits = sum(e["hits"] for e in self.cache.values())
+            lookups = self.hits + self.stale_hits + self.misses
+            stats = {
+                "total_entries": len(self.cache),
+                "total_hits": total_hits,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "rejections": self.rejections,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "cache_size_mb": self.total_bytes / 1024 / 1024
+            }
+            if self.admission is not None:
+                stats["admission"] = self.admission.get_stats()
+            return stats
@@ -0,0 +1,178 @@
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from semantic_layer.core.schema import AggregationType, SemanticModel
+from semantic_layer.core.time_grains import TIME_TYPES, can_roll_up, native_grain, split_grain, truncate
+
+# How a cached aggregate re-aggregates to a coarser grain
+REAGGREGATIONS = {
+    AggregationType.SUM: "sum",
+    AggregationType.COUNT: "sum",
+    AggregationType.MIN: "min",
+    AggregationType.MAX: "max",
+}
+# AVG re-aggregates from the <metric>__sum and <metric>__count columns cached beside it
+AVG_COMPONENTS = ("__sum", "__count")
+
+
+@dataclass(frozen=True)
+class CachedAggregate:
+    key: str
+    tables: FrozenSet[str]
+    dimensions: FrozenSet[str]
+    metrics: FrozenSet[str]
+    filters: Tuple[Tuple[str, FrozenSet[Any]], ...]
+
+    def filter_map(self) -> Dict[str, FrozenSet[Any]]:
+        return dict(self.filters)
+
+
+class SubsumptionIndex:
+    """Find cached results whose grain and filters cover a narrower request.
+
+    Entries are grouped by (tables, dimension set). A cached result can
+    answer a request when it has every requested metric, its dimensions
+    include the requested ones plus any column the request filters on
+    more tightly, and its own filters are no narrower than the request's.
+    Dropping dimensions re-aggregates SUM/COUNT/MIN/MAX metrics, and AVG
+    from its cached SUM and COUNT components.
+
+    A time dimension at a coarser grain (`order_date__month`) is covered
+    by the same dimension at a finer grain or untruncated; its values are
+    re-bucketed before re-aggregating.
+    """
+
+    def __init__(self, model: SemanticModel):
+        self.model = model
+        self._aggregations = {
+            metric.name: metric.aggregation for table in model.tables for metric in table.metrics
+        }
+        self._time_dims = {
+            dim.name: native_grain(dim.type) for table in model.tables for dim in table.dimensions
+            if dim.type in TIME_TYPES
+        }
+        self._groups: Dict[Tuple[FrozenSet[str], FrozenSet[str]], Dict[str, CachedAggregate]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: str, canonical: Dict[str, Any], tables: Iterable[str]):
+        if canonical.get("limit") is not None:
+            return  # Truncated results cannot answer other queries
+        entry = CachedAggregate(
+            key=key,
+            tables=frozenset(tables),
+            dimensions=frozenset(canonical["dimensions"]),
+            metrics=frozenset(canonical["metrics"]),
+            filters=tuple((col, frozenset(values)) for col, values in canonical["filters"].items()),
+        )
+        with self._lock:
+            self._groups.setdefault((entry.tables, entry.dimensions), {})[key] = entry
+
+    def remove(self, key: str):
+        with self._lock:
+            for group_key, entries in list(self._groups.items()):
+                if entries.pop(key, None) is not None and not entries:
+                    del self._groups[group_key]
+
+    def candidates(self, canonical: Dict[str, Any], tables: Iterable[str]) -> List[CachedAggregate]:
+        """Covering entries, coarsest (cheapest to re-aggregate) first."""
+        tables = frozenset(tables)
+        dims = frozenset(canonical["dimensions"])
+        metrics = frozenset(canonical["metrics"])
+        filters = {col: frozenset(values) for col, values in canonical["filters"].items()}
+        matches = []
+        with self._lock:
+            groups = [(group_dims, list(entries.values()))
+                      for (group_tables, group_dims), entries in self._groups.items()
+                      if group_tables == tables]
+        for group_dims, entries in groups:
+            if not all(self.source_column(d, group_dims) for d in dims):
+                continue
+            if group_dims != dims and not self._reaggregatable(metrics):
+                continue
+            for entry in entries:
+                if metrics <= entry.metrics and self._filters_cover(entry, filters):
+                    matches.append(entry)
+        return sorted(matches, key=lambda e: len(e.dimensions))
+
+    def _reaggregatable(self, metrics: FrozenSet[str]) -> bool:
+        return all(self._aggregations.get(m) in REAGGREGATIONS or self._aggregations.get(m) == AggregationType.AVG
+                   for m in metrics)
+
+    def source_column(self, column: str, cached_dimensions: FrozenSet[str]) -> Optional[str]:
+        """The cached dimension `column` can be read or re-bucketed from, if any."""
+        if column in cached_dimensions:
+            return column
+        base, grain = split_grain(column)
+        if grain is None or base not in self._time_dims:
+            return None
+        # Prefer the coarsest cached grain that still rolls up: fewer rows to re-bucket
+        for source_grain in reversed([None] + list(type(grain))):
+            source = base if source_grain is None else f"{base}__{source_grain.value}"
+            if source not in cached_dimensions:
+                continue
+            native = self._time_dims[base] if source_grain is None else source_grain
+            if can_roll_up(native, grain):
+                return source
+        return None
+
+    def _filters_cover(self, entry: CachedAggregate, filters: Dict[str, FrozenSet[Any]]) -> bool:
+        cached = entry.filter_map()
+        for col, values in cached.items():
+            if col not in filters or not filters[col] <= values:
+                return False
+        for col, values in filters.items():
+            if cached.get(col) != values and self.source_column(col, entry.dimensions) is None:
+                return False
+        return True
+
+    def answer(self, entry: CachedAggregate, data: pd.DataFrame, canonical: Dict[str, Any],
+               dimensions: List[str], metrics: List[str]) -> Optional[pd.DataFrame]:
+        """Filter, re-bucket and re-aggregate a cached result down to the requested grain.
+
+        Returns None when the cached data lacks the AVG components a roll-up needs.
+        """
+        cached_filters = entry.filter_map()
+        filters = {col: values for col, values in canonical["filters"].items()
+                   if cached_filters.get(col) != frozenset(values)}
+        derived = {}
+        for col in list(dimensions) + list(filters):
+            source = self.source_column(col, entry.dimensions)
+            if source != col and col not in derived:
+                derived[col] = truncate(data[source], split_grain(col)[1])
+        if derived:
+            data = data.assign(**derived)
+
+        mask = None
+        for col, values in filters.items():
+            condition = data[col].isin(values)
+            mask = condition if mask is None else mask & condition
+        if mask is not None:
+            data = data[mask.to_numpy()]
+
+        averages = [m for m in metrics if self._aggregations.get(m) == AggregationType.AVG]
+        components = [m + suffix for m in averages for suffix in AVG_COMPONENTS]
+        if frozenset(dimensions) == entry.dimensions and not derived:
+            result = data[dimensions + metrics + [c for c in components if c in data.columns]]
+        else:
+            if not set(components) <= set(data.columns):
+                return None
+            aggregations = {m: REAGGREGATIONS[self._aggregations[m]] for m in metrics if m not in averages}
+            aggregations.update({c: "sum" for c in components})
+            if dimensions:
+                # dropna=False: the warehouse keeps the NULL group too
+                result = data.groupby(dimensions, observed=True, sort=False, as_index=False,
+                                      dropna=False).agg(aggregations)
+            else:
+                result = data[list(aggregations)].agg(aggregations).to_frame().T.infer_objects()
+            for m in averages:
+                result[m] = result[f"{m}__sum"] / result[f"{m}__count"]
+            result = result[dimensions + metrics + components]
+        if canonical.get("limit") is not None:
+            result = result.head(canonical["limit"])
+        return result.reset_index(drop=True)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._groups.values())
@@ -0,0 +1,108 @@
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from .admission import AdmissionFilter
+from .disk_cache import DiskCache
+from .redis_cache import RedisCache
+from .sizing import estimate_nbytes
+from .smart_cache import SmartCache
+
+
+class TieredCache:
+    """In-process L1 in front of a shared Redis-protocol L2.
+
+    Reads fall through L1 to L2; a fresh L2 hit is copied into L1 with
+    the remainder of its soft and hard TTLs. Writes go to both tiers with
+    the same TTLs and table dependencies.
+
+    An optional persistent L3 (`DiskCache`) sits behind L2, so results
+    survive a restart; its fresh hits are promoted into L1 and L2.
+
+    With an `admission` filter, L1's view of the workload decides whether
+    a new result is written at all; a rejected entry goes to no tier.
+    """
+
+    def __init__(self, l1: Optional[SmartCache] = None, l2: Optional[RedisCache] = None,
+                 default_ttl: int = 3600, default_stale_ttl: int = 0, l3: Optional[DiskCache] = None,
+                 admission: Optional[AdmissionFilter] = None):
+        self.l1 = l1 or SmartCache(default_ttl=default_ttl, max_bytes=256 * 1024 * 1024)
+        if admission is not None:
+            self.l1.admission = admission
+        self.l2 = l2 or RedisCache()
+        self.l3 = l3
+        self.default_ttl = default_ttl
+        self.default_stale_ttl = default_stale_ttl
+
+    @property
+    def tiers(self):
+        return [tier for tier in (self.l1, self.l2, self.l3) if tier is not None]
+
+    def get(self, key: str) -> Optional[Any]:
+        value, stale = self.get_with_staleness(key, max_staleness=0)
+        return value
+
+    def get_with_staleness(self, key: str, max_staleness: Optional[float] = None) -> Tuple[Optional[Any], bool]:
+        value, stale = self.l1.get_with_staleness(key, max_staleness)
+        if value is not None:
+            return value, stale
+        for depth, tier in enumerate(self.tiers[1:], start=1):
+            value, stale = tier.get_with_staleness(key, max_staleness)
+            if value is None:
+                continue
+            if not stale:
+                self._promote(key, value, tier, self.tiers[:depth])
+            return value, stale
+        return None, False
+
+    def peek(self, key: str, max_staleness: Optional[float] = 0) -> Tuple[Optional[Any], bool]:
+        """Like get_with_staleness, touching no tier's statistics and promoting nothing."""
+        for tier in self.tiers:
+            value, stale = tier.peek(key, max_staleness)
+            if value is not None:
+                return value, stale
+        return None, False
+
+    @staticmethod
+    def _promote(key: str, value: Any, source, targets):
+        entry = source.lookup(key)
+        if entry is None:
+            return
+        fresh_for = entry[1] - time.time()
+        if fresh_for > 0:
+            for target in targets:
+                target.set(key, value, ttl=fresh_for, stale_ttl=max(0.0, entry[2] - entry[1]))
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None,
+            dependencies: Optional[Iterable[str]] = None, stale_ttl: Optional[int] = None,
+            cost: Optional[float] = None):
+        ttl = ttl or self.default_ttl
+        stale_ttl = self.default_stale_ttl if stale_ttl is None else stale_ttl
+        dependencies = list(dependencies or ())
+        if not self.l1.admits(key, estimate_nbytes(value), cost):
+            self.l1.admission.reject()
+            return False
+        # A value too large for L1 alone still belongs in the shared tiers
+        stored = self.l1.set(key, value, ttl=ttl, dependencies=dependencies, stale_ttl=stale_ttl,
+                             cost=cost, admitted=True)
+        for tier in self.tiers[1:]:
+            stored = tier.set(key, value, ttl=ttl, dependencies=dependencies, stale_ttl=stale_ttl) or stored
+        return stored
+
+    def delete(self, key: str) -> bool:
+        removed = False
+        for tier in self.tiers:
+            removed = tier.delete(key) or removed
+        return removed
+
+    def invalidate_by_table(self, table_name: str) -> int:
+        return max(tier.invalidate_by_table(table_name) for tier in self.tiers)
+
+    def get_stats(self) -> Dict:
+        per_tier = [tier.get_stats() for tier in self.tiers]
+        stats = {f"l{depth}": s for depth, s in enumerate(per_tier, start=1)}
+        stats.update({
+            "hits": sum(s["hits"] for s in per_tier),
+            "stale_hits": sum(s["stale_hits"] for s in per_tier),
+            "misses": per_tier[-1]["misses"],
+        })
+        return stats
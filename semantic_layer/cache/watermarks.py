@@ -0,0 +1,166 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TableWatermarkTracker:
+    """Invalidate cached results when their source tables actually change.
+
+    Each poll asks the adapter for a cheap per-table watermark (row count
+    and max updated-at, file modification times, write counters...). When
+    a table's watermark moves, `cache.invalidate_by_table` drops exactly
+    the entries that read it; nothing else is touched.
+
+    A change is only seen against a baseline, so `observe` (called by the
+    executor before it runs a query it will cache) and `track` read the
+    watermark right away instead of leaving it to the next poll. Polls
+    cover tracked tables plus those the cache still holds entries for;
+    with a cache that does not expose its `dependencies` (e.g. a tiered
+    cache whose shared tier outlives local ones), every observed table is
+    polled. Adapters whose default watermark scans the table should
+    override `get_table_watermark` with a metadata lookup.
+
+    The gaps between observed changes feed an exponentially weighted
+    average per table, from which `ttl_for` suggests a TTL: tables that
+    change hourly get short TTLs, tables that change daily long ones.
+    """
+
+    def __init__(self, adapter, cache, tables: Optional[Dict[str, Optional[str]]] = None,
+                 min_ttl: int = 60, max_ttl: int = 24 * 3600, default_ttl: int = 3600,
+                 ttl_fraction: float = 0.5, smoothing: float = 0.3, clock: Callable[[], float] = time.time):
+        self.adapter = adapter
+        self.cache = cache
+        self.tables: Dict[str, Optional[str]] = dict(tables or {})  # table -> updated-at column
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.default_ttl = default_ttl
+        self.ttl_fraction = ttl_fraction
+        self.smoothing = smoothing
+        self.clock = clock
+        self.watermarks: Dict[str, Any] = {}
+        self.observed_at: Dict[str, float] = {}  # when each table's baseline was first read
+        self.last_change: Dict[str, float] = {}
+        self.change_interval: Dict[str, float] = {}  # EWMA seconds between changes
+        self.polls = 0
+        self.changes = 0
+        self.invalidations = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._worker = None
+        self._stop = threading.Event()
+
+    def track(self, table: str, updated_at_column: Optional[str] = None):
+        with self._lock:
+            self.tables[table] = updated_at_column
+        self.observe([table])
+
+    def observe(self, tables: Iterable[str]):
+        """Record a baseline watermark for each table that has none yet."""
+        for table in tables:
+            with self._lock:
+                if table in self.watermarks:
+                    continue
+                updated_at_column = self.tables.get(table)
+            watermark = self._read(table, updated_at_column)
+            if watermark is not None:
+                with self._lock:
+                    if table not in self.watermarks:
+                        self.watermarks[table] = watermark
+                        self.observed_at[table] = self.clock()
+
+    def _read(self, table: str, updated_at_column: Optional[str]) -> Any:
+        try:
+            return self.adapter.get_table_watermark(table, updated_at_column)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Could not read watermark for %s: %s", table, e)
+            return None
+
+    def _tables_to_poll(self) -> Dict[str, Optional[str]]:
+        tables = dict(self.tables)
+        # Tables cached entries depend on are polled even if never tracked explicitly
+        dependencies = getattr(self.cache, "dependencies", None)
+        cached = self.watermarks if dependencies is None else dependencies
+        for table in list(cached):
+            tables.setdefault(table, None)
+        return tables
+
+    def poll(self) -> List[str]:
+        """Check every table once; returns the tables that changed."""
+        changed = []
+        for table, updated_at_column in self._tables_to_poll().items():
+            watermark = self._read(table, updated_at_column)
+            if watermark is None:
+                continue
+            now = self.clock()
+            with self._lock:
+                previous = self.watermarks.get(table)
+                self.watermarks[table] = watermark
+                if previous is None:
+                    self.observed_at[table] = now
+                    continue
+                if watermark == previous:
+                    continue
+                self._record_change(table, now)
+            changed.append(table)
+            self.invalidations += self.cache.invalidate_by_table(table) or 0
+        self.polls += 1
+        return changed
+
+    def _record_change(self, table: str, now: float):
+        self.changes += 1
+        last = self.last_change.get(table)
+        self.last_change[table] = now
+        if last is None:
+            return
+        gap = now - last
+        average = self.change_interval.get(table)
+        self.change_interval[table] = gap if average is None else (
+            self.smoothing * gap + (1 - self.smoothing) * average
+        )
+
+    def ttl_for(self, tables: Iterable[str]) -> int:
+        """Suggested TTL for a result reading `tables`: bounded by the most volatile one."""
+        ttls = []
+        with self._lock:
+            for table in tables:
+                interval = self.change_interval.get(table)
+                if interval is not None:
+                    ttls.append(interval * self.ttl_fraction)
+        if not ttls:
+            return self.default_ttl
+        return int(min(max(min(ttls), self.min_ttl), self.max_ttl))
+
+    def start(self, interval: float = 30.0):
+        """Poll from a daemon thread every `interval` seconds."""
+        if self._worker is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                self.poll()
+
+        self._worker = threading.Thread(target=run, name="table-watermarks", daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        if self._worker is None:
+            return
+        self._stop.set()
+        self._worker.join()
+        self._worker = None
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "tables": len(self._tables_to_poll()),
+                "polls": self.polls,
+                "changes": self.changes,
+                "invalidations": self.invalidations,
+                "errors": self.errors,
+                "change_interval_seconds": {t: round(v, 1) for t, v in self.change_interval.items()},
+            }
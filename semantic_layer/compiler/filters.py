@@ -1,4 +1,4 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 
 class FilterBuilder:
     @staticmethod
@@ -17,3 +17,25 @@ class FilterBuilder:
                 conditions.append(f"{key} IN ({values})")
         
         return " AND ".join(conditions) if conditions else ""
+    
+    @staticmethod
+    def build_parameterized_where_clause(filters: Dict[str, Any], start_index: int = 1) -> Tuple[str, List[Any]]:
+        """Build a WHERE clause with $n placeholders so the SQL text stays a stable template."""
+        if not filters:
+            return "", []
+        
+        conditions = []
+        params = []
+        index = start_index
+        for key, value in filters.items():
+            if isinstance(value, (str, int, float)):
+                conditions.append(f"{key} = ${index}")
+                params.append(value)
+                index += 1
+            elif isinstance(value, list):
+                placeholders = ", ".join(f"${index + i}" for i in range(len(value)))
+                conditions.append(f"{key} IN ({placeholders})")
+                params.extend(value)
+                index += len(value)
+        
+        return " AND ".join(conditions) if conditions else "", params
@@ -0,0 +1,103 @@
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+# Equi-join conditions in Join.sql_on, e.g. "orders.customer_id = customers.id"
+_EQUI_JOIN = re.compile(r"([\w\"]+)\.([\w\"]+)\s*=\s*([\w\"]+)\.([\w\"]+)")
+
+
+@dataclass(frozen=True)
+class ColumnRef:
+    table: str  # Physical table (sql_table_name)
+    sql: str  # Column or expression as it appears in the SQL
+
+
+@dataclass(frozen=True)
+class PlanFilter:
+    column: ColumnRef
+    values: Tuple[Any, ...]
+
+    @property
+    def is_equality(self) -> bool:
+        return len(self.values) == 1
+
+
+@dataclass(frozen=True)
+class PlanJoin:
+    table: str
+    type: str
+    on: str
+    keys: Tuple[Tuple[ColumnRef, ColumnRef], ...] = ()
+
+
+@dataclass(frozen=True)
+class PlanAggregate:
+    metric: str
+    aggregation: str
+    column: ColumnRef
+
+
+@dataclass(frozen=True)
+class QueryPlan:
+    """What a compiled query reads and computes, as known to the compiler.
+
+    Plans are immutable and hashable, so consumers (cost estimation, plan
+    analysis, index advice) can key memoized work on them instead of
+    re-parsing SQL text.
+    """
+
+    tables: Tuple[str, ...]
+    columns: Tuple[ColumnRef, ...]
+    filters: Tuple[PlanFilter, ...] = ()
+    group_by: Tuple[ColumnRef, ...] = ()
+    aggregates: Tuple[PlanAggregate, ...] = ()
+    joins: Tuple[PlanJoin, ...] = ()
+    grains: Tuple[Tuple[str, str], ...] = ()  # (dimension, time grain)
+    limit: Optional[int] = None
+
+    @property
+    def base_table(self) -> str:
+        return self.tables[0]
+
+    def columns_of(self, table: str) -> List[str]:
+        return [c.sql for c in self.columns if c.table == table]
+
+    def filters_on(self, table: str) -> Dict[str, List[Any]]:
+        return {f.column.sql: list(f.values) for f in self.filters if f.column.table == table}
+
+    def to_dict(self) -> Dict:
+        return {
+            "tables": list(self.tables),
+            "columns": [{"table": c.table, "sql": c.sql} for c in self.columns],
+            "filters": [
+                {"table": f.column.table, "column": f.column.sql, "values": list(f.values)} for f in self.filters
+            ],
+            "group_by": [{"table": c.table, "sql": c.sql} for c in self.group_by],
+            "aggregates": [
+                {"metric": a.metric, "aggregation": a.aggregation, "table": a.column.table, "sql": a.column.sql}
+                for a in self.aggregates
+            ],
+            "joins": [
+                {"table": j.table, "type": j.type, "on": j.on,
+                 "keys": [[left.table, left.sql, right.table, right.sql] for left, right in j.keys]}
+                for j in self.joins
+            ],
+            "grains": dict(self.grains),
+            "limit": self.limit,
+        }
+
+
+@dataclass
+class CompiledQuery:
+    sql: str
+    params: List[Any] = field(default_factory=list)
+    plan: Optional[QueryPlan] = None
+
+
+def parse_join_keys(sql_on: str, tables: Dict[str, str]) -> Tuple[Tuple[ColumnRef, ColumnRef], ...]:
+    """Equi-join key pairs of a model join condition; `tables` maps model names to physical tables."""
+    keys = []
+    for left_table, left_col, right_table, right_col in _EQUI_JOIN.findall(sql_on):
+        keys.append((ColumnRef(tables.get(left_table, left_table), left_col),
+                     ColumnRef(tables.get(right_table, right_table), right_col)))
+    return tuple(keys)
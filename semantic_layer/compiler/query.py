@@ -7,3 +7,8 @@ class QueryRequest(BaseModel):
     filters: Optional[Dict[str, Any]] = None
     limit: Optional[int] = None
     order_by: Optional[List[str]] = None
+    # Seconds past a cached result's freshness the caller will accept; None = the executor's
+    # default (any within the hard TTL if it has a stale_ttl, else fresh only)
+    max_staleness: Optional[float] = None
+    # Relative error the caller accepts from an approximate (sampled) answer; None = exact only
+    max_error: Optional[float] = None
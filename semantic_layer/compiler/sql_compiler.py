@@ -1,13 +1,131 @@
-from semantic_layer.core.schema import SemanticModel, Dimension, Metric
+from semantic_layer.core.schema import AggregationType, Join, JoinType, SemanticModel, Dimension, Metric
+from semantic_layer.core.time_grains import TIME_TYPES, split_grain
 from .query import QueryRequest
 from .filters import FilterBuilder
-from typing import Optional
+from .plan import ColumnRef, CompiledQuery, PlanAggregate, PlanFilter, PlanJoin, QueryPlan, parse_join_keys
+from typing import Any, Dict, List, Optional, Tuple
 
 class SqlCompiler:
-    def __init__(self, model: SemanticModel):
+    """Compile QueryRequests to SQL.
+    
+    Time dimensions can be requested at a grain as `<dimension>__<grain>`
+    (e.g. `order_date__month`), compiled to `date_trunc`. With
+    `decompose_averages`, each AVG metric also selects `<metric>__sum`
+    and `<metric>__count` so cached results can be re-aggregated.
+    
+    `compile_with_plan` also returns a `QueryPlan` describing the tables,
+    columns, filters, grouping and grains the SQL uses.
+    
+    LEFT joins are only emitted when the request references the joined
+    table (directly or through a table joined from it), assuming they are
+    many-to-one; INNER and FULL joins change which rows exist, so they are
+    always emitted.
+    """
+    
+    def __init__(self, model: SemanticModel, decompose_averages: bool = False):
         self.model = model
+        self.decompose_averages = decompose_averages
     
     def compile(self, request: QueryRequest) -> str:
+        where_clause = ""
+        if request.filters:
+            where_clause = FilterBuilder.build_where_clause(self._filter_expressions(request.filters))
+        return self._build_sql(request, where_clause)
+    
+    def compile_parameterized(self, request: QueryRequest, source: Optional[str] = None) -> Tuple[str, List[Any]]:
+        """Compile to a SQL template plus bind parameters.
+        
+        Requests that differ only in filter values share the same template,
+        which lets adapters reuse prepared statements. `source` replaces
+        the base table in the FROM clause (e.g. with a sampled subquery).
+        """
+        where_clause, params = "", []
+        if request.filters:
+            where_clause, params = FilterBuilder.build_parameterized_where_clause(
+                self._filter_expressions(request.filters)
+            )
+        return self._build_sql(request, where_clause, source), params
+    
+    def compile_with_plan(self, request: QueryRequest) -> CompiledQuery:
+        sql, params = self.compile_parameterized(request)
+        return CompiledQuery(sql=sql, params=params, plan=self.plan(request))
+    
+    def plan(self, request: QueryRequest) -> QueryPlan:
+        columns, group_by, aggregates, grains, filters = [], [], [], [], []
+        
+        for dim_name in request.dimensions:
+            dim = self._find_dimension(dim_name)
+            if dim:
+                base_name, grain = split_grain(dim_name)
+                source = dim if grain is None else self._find_dimension(base_name)
+                ref = ColumnRef(self._table_of(base_name), source.sql)
+                columns.append(ref)
+                group_by.append(ref)
+                if grain is not None:
+                    grains.append((base_name, grain.value))
+        
+        for metric_name in request.metrics:
+            metric = self._find_metric(metric_name)
+            if metric:
+                ref = ColumnRef(self._table_of(metric_name), metric.sql)
+                columns.append(ref)
+                aggregates.append(PlanAggregate(metric.name, metric.aggregation.value, ref))
+        
+        for column, value in (request.filters or {}).items():
+            ref = self._filter_column(column)
+            columns.append(ref)
+            values = tuple(value) if isinstance(value, list) else (value,)
+            filters.append(PlanFilter(ref, values))
+        
+        physical = {table.name: table.sql_table_name for table in self.model.tables}
+        joins = tuple(
+            PlanJoin(table=join.to_table, type=join.type.value, on=join.sql_on,
+                     keys=parse_join_keys(join.sql_on, physical))
+            for join in self._required_joins(request)
+        )
+        for join in joins:
+            for left, right in join.keys:
+                columns.extend([left, right])
+        
+        return QueryPlan(
+            tables=tuple(self.resolve_tables(request)),
+            columns=tuple(dict.fromkeys(columns)),
+            filters=tuple(filters),
+            group_by=tuple(group_by),
+            aggregates=tuple(aggregates),
+            joins=joins,
+            grains=tuple(grains),
+            limit=request.limit,
+        )
+    
+    def _table_of(self, name: str) -> str:
+        """Physical table defining the dimension or metric `name`."""
+        for table in self.model.tables:
+            if any(d.name == name for d in table.dimensions) or any(m.name == name for m in table.metrics):
+                return table.sql_table_name
+        return self.model.tables[0].sql_table_name
+    
+    def _filter_expressions(self, filters: Dict[str, Any]) -> Dict[str, Any]:
+        """Filters keyed by dimension name apply to the dimension's SQL; other keys are raw columns."""
+        expressions = {}
+        for column, value in filters.items():
+            dim = None if "." in column else self._find_dimension(column)
+            expressions[dim.sql if dim else column] = value
+        return expressions
+    
+    def _filter_column(self, column: str) -> ColumnRef:
+        """Filters are written against raw columns, optionally qualified as table.column, or dimensions."""
+        qualifier, _, name = column.rpartition(".")
+        for table in self.model.tables:
+            if qualifier in (table.name, table.sql_table_name):
+                return ColumnRef(table.sql_table_name, name)
+            if not qualifier:
+                for dim in table.dimensions:
+                    if dim.sql == column or dim.name == column:
+                        return ColumnRef(table.sql_table_name, dim.sql)
+        return ColumnRef(self.model.tables[0].sql_table_name, column)
+    
+    def _build_sql(self, request: QueryRequest, where_clause: str, source: Optional[str] = None) -> str:
         select_parts = []
         
         for dim_name in request.dimensions:
@@ -19,21 +137,19 @@ class SqlCompiler:
             metric = self._find_metric(metric_name)
             if metric:
                 select_parts.append(f"{metric.aggregation.value}({metric.sql}) AS {metric.name}")
+                if self.decompose_averages and metric.aggregation == AggregationType.AVG:
+                    select_parts.append(f"sum({metric.sql}) AS {metric.name}__sum")
+                    select_parts.append(f"count({metric.sql}) AS {metric.name}__count")
         
         table = self.model.tables[0]
-        sql = f"SELECT {', '.join(select_parts)} FROM {table.sql_table_name}"
+        sql = f"SELECT {', '.join(select_parts)} FROM {source or table.sql_table_name}"
         
         # Add JOINs
-        for join in self.model.joins:
+        for join in self._required_joins(request):
             sql += f" {join.type.value.upper()} JOIN {join.to_table} ON {join.sql_on}"
         
-        if request.filters:
-            where_clause = FilterBuilder.build_where_clause(request.filters)
-            if where_clause:
-                if " GROUP BY" in sql:
-                    sql = sql.replace(" GROUP BY", f" WHERE {where_clause} GROUP BY")
-                else:
-                    sql += f" WHERE {where_clause}"
+        if where_clause:
+            sql += f" WHERE {where_clause}"
         
         if request.dimensions:
             sql += f" GROUP BY {', '.join(request.dimensions)}"
@@ -43,11 +159,45 @@ class SqlCompiler:
         
         return sql
     
+    def resolve_tables(self, request: QueryRequest) -> List[str]:
+        """Physical tables the compiled SQL for `request` reads."""
+        tables = [self.model.tables[0].sql_table_name]
+        for join in self._required_joins(request):
+            if join.to_table not in tables:
+                tables.append(join.to_table)
+        return tables
+    
+    def _referenced_tables(self, request: QueryRequest) -> List[str]:
+        tables = [self._table_of(split_grain(name)[0]) for name in request.dimensions]
+        tables += [self._table_of(name) for name in request.metrics]
+        tables += [self._filter_column(column).table for column in (request.filters or {})]
+        return list(dict.fromkeys(tables))
+    
+    def _required_joins(self, request: QueryRequest) -> List[Join]:
+        """Joins on the path from the base table to every referenced table, plus row-changing joins."""
+        physical = {table.name: table.sql_table_name for table in self.model.tables}
+        incoming = {join.to_table: join for join in self.model.joins}
+        base = self.model.tables[0].sql_table_name
+        targets = self._referenced_tables(request)
+        targets += [join.to_table for join in self.model.joins if join.type != JoinType.LEFT]
+        required = set()
+        for table in targets:
+            # Walk back towards the base table; the guard stops on cyclic join graphs
+            while table != base and table in incoming and table not in required:
+                required.add(table)
+                table = physical.get(incoming[table].from_table, incoming[table].from_table)
+        return [join for join in self.model.joins if join.to_table in required]
+    
     def _find_dimension(self, name: str) -> Optional[Dimension]:
         for table in self.model.tables:
             for dim in table.dimensions:
                 if dim.name == name:
                     return dim
+        base, grain = split_grain(name)
+        if grain is not None:
+            dim = self._find_dimension(base)
+            if dim is not None and dim.type in TIME_TYPES:
+                return dim.model_copy(update={"name": name, "sql": f"date_trunc('{grain.value}', {dim.sql})"})
         return None
     
     def _find_metric(self, name: str) -> Optional[Metric]:
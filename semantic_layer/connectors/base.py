@@ -1,16 +1,123 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+import json
+from typing import List, Dict, Any, Iterator, Optional, Sequence
+import time
 import pandas as pd
+import pyarrow as pa
+
+from .statement_cache import PreparedStatement, PreparedStatementCache, is_preparable, is_schema_change
 
 class DataSourceAdapter(ABC):
     """Base class for data source adapters."""
     
+    # Whether parameterized SELECTs run as cached prepared statements; if not, every
+    # statement is bound by the driver per call and planned again
+    binds_prepared_parameters = True
+    
+    def __init__(self, statement_cache_size: int = 128):
+        self.statement_cache = PreparedStatementCache(max_size=statement_cache_size)
+    
     @abstractmethod
     def connect(self, connection_params: Dict[str, Any]):
         """Establish connection."""
         pass
     
     @abstractmethod
-    def execute_query(self, sql: str) -> pd.DataFrame:
-        """Execute SQL and return DataFrame."""
+    def execute_query(self, sql: str, params: Optional[Sequence[Any]] = None) -> pd.DataFrame:
+        """Execute SQL and return DataFrame.
+        
+        `sql` may be a template with $1, $2... placeholders bound from `params`.
+        """
         pass
+    
+    def execute_batches(self, sql: str, params: Optional[Sequence[Any]] = None,
+                        batch_size: int = 65536) -> Iterator[pa.RecordBatch]:
+        """Execute SQL and yield the result as Arrow record batches.
+        
+        Adapters that can stream should override this; the default
+        materializes the full DataFrame first.
+        """
+        df = self.execute_query(sql, params)
+        yield from pa.Table.from_pandas(df, preserve_index=False).to_batches(max_chunksize=batch_size)
+    
+    def get_table_watermark(self, table: str, updated_at_column: Optional[str] = None) -> Optional[tuple]:
+        """A cheap value that changes whenever `table`'s data changes.
+        
+        The default is the row count plus, if given, the maximum of an
+        updated-at column, which is a scan on engines that cannot answer
+        it from metadata. Adapters with better signals (snapshot IDs,
+        file modification times, table statistics) should override this.
+        """
+        select = "count(*) AS row_count"
+        if updated_at_column:
+            select += f", max({updated_at_column}) AS last_updated"
+        row = self.execute_query(f"SELECT {select} FROM {table}").iloc[0]
+        return tuple(row.tolist())
+    
+    def explain(self, sql: str, params: Optional[Sequence[Any]] = None, analyze: bool = False) -> Any:
+        """The engine's JSON plan for `sql`; with `analyze`, the query runs and actuals are included.
+        
+        `EXPLAIN (ANALYZE, FORMAT JSON)` is understood by DuckDB and
+        Postgres; adapters for other engines should override this.
+        """
+        options = "ANALYZE, FORMAT JSON" if analyze else "FORMAT JSON"
+        df = self.execute_query(f"EXPLAIN ({options}) {sql}", params)
+        value = df.iloc[0, -1]  # DuckDB: (explain_key, explain_value); Postgres: ("QUERY PLAN")
+        return json.loads(value) if isinstance(value, str) else value
+    
+    def sample_fraction_sql(self, table: str, fraction: float, seed: Optional[int] = None) -> str:
+        """SQL reading about `fraction` of `table` by sampling storage blocks, for approximate answers."""
+        repeatable = f" REPEATABLE ({int(seed)})" if seed is not None else ""
+        return f"SELECT * FROM {table} TABLESAMPLE SYSTEM ({fraction * 100:g}){repeatable}"
+    
+    def sample_table_sql(self, table: str, rows: int) -> str:
+        """SQL returning roughly `rows` rows of `table` for statistics collection.
+        
+        The default takes the first rows, which is biased for clustered
+        tables; adapters with native sampling should override this.
+        """
+        return f"SELECT * FROM {table} LIMIT {int(rows)}"
+    
+    def _run_statement(self, sql: str):
+        """Run a statement whose result is not needed (PREPARE, DEALLOCATE)."""
+        raise NotImplementedError
+    
+    def _execute_prepared(self, statement: PreparedStatement, params: Sequence[Any]):
+        """Execute a prepared statement with `params`, as the driver or engine accepts them."""
+        raise NotImplementedError
+    
+    def _prepare(self, template: str) -> PreparedStatement:
+        """Return the cached prepared statement for a template, preparing it on a miss."""
+        statement = self.statement_cache.get(template)
+        if statement is None:
+            name = self.statement_cache.next_name()
+            start = time.perf_counter()
+            self._run_statement(f"PREPARE {name} AS {template}")
+            statement = PreparedStatement(
+                name=name, template=template,
+                prepare_ms=(time.perf_counter() - start) * 1000
+            )
+            evicted = self.statement_cache.put(statement)
+            if evicted:
+                self._run_statement(f"DEALLOCATE {evicted.name}")
+        statement.executions += 1
+        return statement
+    
+    def _use_prepared(self, sql: str, params: Optional[Sequence[Any]] = None) -> bool:
+        if is_schema_change(sql):
+            # Cached plans may reference dropped or altered objects
+            self.invalidate_prepared_statements()
+            return False
+        # Only templates reused with different bindings pay off; one-off statements
+        # (statistics, counts, EXPLAIN) would just churn the cache
+        return bool(params) and self.binds_prepared_parameters and is_preparable(sql)
+    
+    def invalidate_prepared_statements(self) -> int:
+        """Deallocate every cached prepared statement."""
+        dropped = self.statement_cache.invalidate()
+        for statement in dropped:
+            self._run_statement(f"DEALLOCATE {statement.name}")
+        return len(dropped)
+    
+    def get_statement_cache_stats(self) -> Dict:
+        return self.statement_cache.get_stats()
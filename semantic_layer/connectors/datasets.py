@@ -0,0 +1,137 @@
+import glob
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+PARQUET = "parquet"
+ARROW = "arrow"
+
+
+@dataclass
+class ColumnStatistics:
+    name: str
+    min: Any = None
+    max: Any = None
+    null_count: int = 0
+    row_count: int = 0
+
+
+@dataclass
+class DatasetSource:
+    """A file-backed dataset that can be queried in place as a table.
+
+    `path` is a single file, a directory (scanned recursively) or a glob.
+    Hive-style `key=value` directories become partition columns, which
+    lets filters on those columns skip whole files.
+    """
+    path: str
+    format: str = PARQUET
+    hive_partitioning: bool = True
+    statistics: Dict[str, ColumnStatistics] = field(default_factory=dict)
+
+    def files(self) -> List[str]:
+        return sorted(glob.glob(self.scan_pattern(), recursive=True))
+
+    def scan_pattern(self) -> str:
+        if os.path.isdir(self.path):
+            suffix = "*.parquet" if self.format == PARQUET else "*.arrow"
+            return os.path.join(self.path, "**", suffix)
+        return self.path
+
+    def scan_sql(self) -> str:
+        """Table function DuckDB uses to scan a Parquet dataset."""
+        pattern = self.scan_pattern().replace("'", "''")
+        hive = "true" if self.hive_partitioning else "false"
+        return f"read_parquet('{pattern}', hive_partitioning={hive})"
+
+    def arrow_dataset(self) -> ds.Dataset:
+        """Open an Arrow IPC dataset with memory-mapped file reads."""
+        filesystem = pafs.LocalFileSystem(use_mmap=True)
+        partitioning = "hive" if self.hive_partitioning else None
+        if os.path.isdir(self.path):
+            return ds.dataset(self.path, format="ipc", partitioning=partitioning, filesystem=filesystem)
+        return ds.dataset(self.files(), format="ipc", filesystem=filesystem)
+
+    def watermark(self) -> Tuple[Tuple[str, int, int], ...]:
+        """(file, mtime_ns, size) for every file: changes whenever a file is added, removed or rewritten."""
+        entries = []
+        for path in self.files():
+            stat = os.stat(path)
+            entries.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(entries)
+
+    def collect_statistics(self) -> Dict[str, ColumnStatistics]:
+        """Gather per-column min/max/null counts without scanning data where possible."""
+        if self.format == PARQUET:
+            self.statistics = _parquet_statistics(self.files())
+        else:
+            self.statistics = _arrow_statistics(self.arrow_dataset())
+        return self.statistics
+
+
+def _merge(stats: Dict[str, ColumnStatistics], name: str, lo: Any, hi: Any, nulls: int, rows: int):
+    entry = stats.setdefault(name, ColumnStatistics(name=name))
+    if lo is not None and (entry.min is None or lo < entry.min):
+        entry.min = lo
+    if hi is not None and (entry.max is None or hi > entry.max):
+        entry.max = hi
+    entry.null_count += nulls
+    entry.row_count += rows
+
+
+def _parquet_statistics(files: List[str]) -> Dict[str, ColumnStatistics]:
+    # Row-group footers already carry min/max/null counts
+    stats: Dict[str, ColumnStatistics] = {}
+    for path in files:
+        metadata = pq.ParquetFile(path).metadata
+        for rg in range(metadata.num_row_groups):
+            row_group = metadata.row_group(rg)
+            for col in range(row_group.num_columns):
+                chunk = row_group.column(col)
+                column_stats = chunk.statistics
+                if column_stats is not None and column_stats.has_min_max:
+                    lo, hi = column_stats.min, column_stats.max
+                else:
+                    lo = hi = None
+                nulls = column_stats.null_count if column_stats is not None and column_stats.has_null_count else 0
+                _merge(stats, chunk.path_in_schema, lo, hi, nulls, row_group.num_rows)
+    return stats
+
+
+def _arrow_statistics(dataset: ds.Dataset) -> Dict[str, ColumnStatistics]:
+    # IPC files carry no statistics; compute them over the memory-mapped batches
+    stats: Dict[str, ColumnStatistics] = {}
+    for batch in dataset.to_batches():
+        for name, column in zip(batch.schema.names, batch.columns):
+            lo = hi = None
+            if len(column) and (pa.types.is_integer(column.type) or pa.types.is_floating(column.type)
+                                or pa.types.is_temporal(column.type) or pa.types.is_string(column.type)):
+                extrema = pc.min_max(column)
+                lo, hi = extrema["min"].as_py(), extrema["max"].as_py()
+            _merge(stats, name, lo, hi, column.null_count, len(column))
+    return stats
+
+
+def register_dataset(conn, name: str, source: DatasetSource, collect_statistics: bool = True) -> DatasetSource:
+    """Expose a dataset to a DuckDB connection under `name`.
+
+    Parquet datasets become views over read_parquet so DuckDB prunes
+    partitions and row groups from the WHERE clause. Arrow IPC datasets
+    are registered as memory-mapped pyarrow datasets; DuckDB pushes
+    filters into the Arrow scanner.
+    """
+    if source.format == PARQUET:
+        conn.execute(f"CREATE OR REPLACE VIEW {name} AS SELECT * FROM {source.scan_sql()}")
+    elif source.format == ARROW:
+        conn.register(name, source.arrow_dataset())
+    else:
+        raise ValueError(f"Unsupported dataset format: {source.format}")
+    if collect_statistics:
+        source.collect_statistics()
+    return source
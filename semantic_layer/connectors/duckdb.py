@@ -1,15 +1,119 @@
 from .base import DataSourceAdapter
-from typing import Dict, Any
+from .datasets import DatasetSource, register_dataset
+from .statement_cache import PreparedStatement
+from typing import Dict, Any, Iterator, List, Optional, Sequence
+import datetime
+import decimal
+import math
+import numbers
 import pandas as pd
+import pyarrow as pa
 import duckdb
+import numpy as np
+
+
+def _literal(value: Any) -> Optional[str]:
+    """DuckDB SQL literal for a bind value; None if the type has no safe literal form."""
+    if value is None or value is pd.NaT:
+        return "NULL"
+    if isinstance(value, (bool, np.bool_)):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, numbers.Integral):
+        return str(int(value))
+    if isinstance(value, numbers.Real):
+        value = float(value)
+        return f"'{value!r}'::DOUBLE" if math.isnan(value) or math.isinf(value) else f"{value!r}::DOUBLE"
+    if isinstance(value, decimal.Decimal):
+        return str(value) if value.is_finite() else None
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    if isinstance(value, datetime.datetime):
+        if getattr(value, "nanosecond", 0):
+            return None  # TIMESTAMP literals stop at microseconds
+        kind = "TIMESTAMPTZ" if value.tzinfo is not None else "TIMESTAMP"
+        return f"{kind} '{value.isoformat(sep=' ')}'"
+    if isinstance(value, datetime.date):
+        return f"DATE '{value.isoformat()}'"
+    if isinstance(value, datetime.time):
+        return f"TIME '{value.isoformat()}'"
+    if isinstance(value, bytes):
+        return "'" + "".join(f"\\x{b:02x}" for b in value) + "'::BLOB"
+    if isinstance(value, (list, tuple)):
+        items = [_literal(v) for v in value]
+        return None if None in items else "[" + ", ".join(items) + "]"
+    return None
+
 
 class DuckDBAdapter(DataSourceAdapter):
-    def __init__(self):
+    """DuckDB adapter; parameterized SELECTs run as cached prepared statements.
+
+    The Python driver cannot bind parameters into `EXECUTE`, so each
+    template is prepared once with `PREPARE` and executed with its values
+    rendered as escaped literals. Values without a safe literal form fall
+    back to the driver's own binding, which re-plans the query.
+    """
+    
+    def __init__(self, statement_cache_size: int = 128):
+        super().__init__(statement_cache_size=statement_cache_size)
         self.conn = None
+        self.datasets: Dict[str, DatasetSource] = {}
     
     def connect(self, connection_params: Dict[str, Any]):
         db_path = connection_params.get("database", ":memory:")
         self.conn = duckdb.connect(db_path)
+        self.statement_cache.invalidate()
+        self.datasets = {}
+    
+    def register_dataset(self, name: str, path: str, format: str = "parquet",
+                         hive_partitioning: bool = True) -> DatasetSource:
+        """Query Parquet or Arrow IPC files in place as the table `name`.
+        
+        Point a Table's sql_table_name at `name` to use the files as a
+        model source without loading them into the database.
+        """
+        source = DatasetSource(path=path, format=format, hive_partitioning=hive_partitioning)
+        register_dataset(self.conn, name, source)
+        self.datasets[name] = source
+        self.invalidate_prepared_statements()
+        return source
+    
+    def get_column_statistics(self, name: str) -> Dict:
+        return self.datasets[name].statistics
+    
+    def get_table_watermark(self, table: str, updated_at_column: Optional[str] = None) -> Optional[tuple]:
+        # Datasets change when their files do; no need to scan them
+        if table in self.datasets:
+            return self.datasets[table].watermark()
+        return super().get_table_watermark(table, updated_at_column)
+    
+    def sample_fraction_sql(self, table: str, fraction: float, seed: Optional[int] = None) -> str:
+        method = "system" if seed is None else f"system, {int(seed)}"
+        return f"SELECT * FROM {table} USING SAMPLE {fraction * 100:g} PERCENT ({method})"
+    
+    def sample_table_sql(self, table: str, rows: int) -> str:
+        return f"SELECT * FROM {table} USING SAMPLE reservoir({int(rows)} ROWS)"
+    
+    def execute_query(self, sql: str, params: Optional[Sequence[Any]] = None) -> pd.DataFrame:
+        return self._execute(sql, params).df()
+    
+    def execute_batches(self, sql: str, params: Optional[Sequence[Any]] = None,
+                        batch_size: int = 65536) -> Iterator[pa.RecordBatch]:
+        result = self._execute(sql, params)
+        # fetch_record_batch is deprecated from DuckDB 1.4; older releases only have it
+        reader = getattr(result, "to_arrow_reader", None) or result.fetch_record_batch
+        yield from reader(batch_size)
+    
+    def _execute(self, sql: str, params: Optional[Sequence[Any]] = None):
+        if self._use_prepared(sql, params):
+            literals = [_literal(value) for value in params]
+            if None not in literals:
+                return self._execute_prepared(self._prepare(sql), literals)
+        if params:
+            return self.conn.execute(sql, list(params))
+        return self.conn.execute(sql)
+    
+    def _run_statement(self, sql: str):
+        self.conn.execute(sql)
     
-    def execute_query(self, sql: str) -> pd.DataFrame:
-        return self.conn.execute(sql).df()
+    def _execute_prepared(self, statement: PreparedStatement, params: List[str]):
+        return self.conn.execute(f"EXECUTE {statement.name}({', '.join(params)})")
@@ -1,16 +1,39 @@
 from .base import DataSourceAdapter
-from typing import Dict, Any
+from .statement_cache import PreparedStatement
+from collections import deque
+from typing import Dict, Any, Optional, Sequence
 import pandas as pd
 
 class PostgresAdapter(DataSourceAdapter):
-    def __init__(self):
+    def __init__(self, statement_cache_size: int = 128, max_logged: int = 1000):
+        super().__init__(statement_cache_size=statement_cache_size)
         self.conn = None
+        self.executed = deque(maxlen=max_logged)  # Recent (statement, params) sent to the server
     
     def connect(self, connection_params: Dict[str, Any]):
         # TODO: Implement actual Postgres connection
         print(f"Connecting to Postgres: {connection_params}")
         self.conn = "mock_connection"
+        self.statement_cache.invalidate()
     
-    def execute_query(self, sql: str) -> pd.DataFrame:
+    def execute_query(self, sql: str, params: Optional[Sequence[Any]] = None) -> pd.DataFrame:
+        if self._use_prepared(sql, params):
+            self._execute_prepared(self._prepare(sql), params)
+        else:
+            self.executed.append((sql, list(params or [])))
         # Mock implementation
         return pd.DataFrame({"result": [1, 2, 3]})
+    
+    def get_table_watermark(self, table: str, updated_at_column: Optional[str] = None) -> Optional[tuple]:
+        # Write counters from the statistics collector avoid scanning the table
+        df = self.execute_query(
+            "SELECT n_tup_ins, n_tup_upd, n_tup_del FROM pg_stat_user_tables WHERE relname = $1", [table]
+        )
+        return tuple(df.iloc[0].tolist()) if len(df) else None
+    
+    def _run_statement(self, sql: str):
+        self.executed.append((sql, []))
+    
+    def _execute_prepared(self, statement: PreparedStatement, params: Sequence[Any]):
+        # A driver sends the values in the protocol's Bind message, never in the SQL text
+        self.executed.append((statement.name, list(params)))
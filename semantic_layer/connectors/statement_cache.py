@@ -0,0 +1,88 @@
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+_SCHEMA_CHANGE_PATTERN = re.compile(
+    r"^\s*(CREATE|ALTER|DROP|TRUNCATE|RENAME|ATTACH|DETACH|IMPORT)\b", re.IGNORECASE
+)
+_PREPARABLE_PATTERN = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+
+
+@dataclass
+class PreparedStatement:
+    name: str
+    template: str
+    prepare_ms: float
+    executions: int = 0
+
+
+class PreparedStatementCache:
+    """LRU of prepared statements keyed by SQL template text."""
+
+    def __init__(self, max_size: int = 128, prefix: str = "sl_stmt"):
+        self.max_size = max_size
+        self.prefix = prefix
+        self._statements: "OrderedDict[str, PreparedStatement]" = OrderedDict()
+        self._counter = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.plan_time_saved_ms = 0.0
+
+    def get(self, template: str) -> Optional[PreparedStatement]:
+        statement = self._statements.get(template)
+        if statement is None:
+            self.misses += 1
+            return None
+        self._statements.move_to_end(template)
+        self.hits += 1
+        # Every reuse skips one parse/plan round trip
+        self.plan_time_saved_ms += statement.prepare_ms
+        return statement
+
+    def next_name(self) -> str:
+        self._counter += 1
+        return f"{self.prefix}_{self._counter}"
+
+    def put(self, statement: PreparedStatement) -> Optional[PreparedStatement]:
+        """Store a statement; returns the evicted one, if any, so it can be deallocated."""
+        self._statements[statement.template] = statement
+        self._statements.move_to_end(statement.template)
+        if len(self._statements) > self.max_size:
+            _, evicted = self._statements.popitem(last=False)
+            self.evictions += 1
+            return evicted
+        return None
+
+    def invalidate(self) -> List[PreparedStatement]:
+        """Drop every statement, e.g. after a schema change."""
+        dropped = list(self._statements.values())
+        self._statements.clear()
+        if dropped:
+            self.invalidations += 1
+        return dropped
+
+    def __len__(self) -> int:
+        return len(self._statements)
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "statements": len(self._statements),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "plan_time_saved_ms": round(self.plan_time_saved_ms, 3),
+        }
+
+
+def is_schema_change(sql: str) -> bool:
+    return bool(_SCHEMA_CHANGE_PATTERN.match(sql))
+
+
+def is_preparable(sql: str) -> bool:
+    return bool(_PREPARABLE_PATTERN.match(sql))
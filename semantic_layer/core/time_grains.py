@@ -0,0 +1,68 @@
+from enum import Enum
+from typing import Optional, Tuple
+
+import pandas as pd
+
+from .schema import DataType
+
+# A time dimension is requested at a grain as "<dimension>__<grain>", e.g. "order_date__month"
+GRAIN_SEPARATOR = "__"
+
+
+class TimeGrain(str, Enum):
+    HOUR = "hour"
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+    QUARTER = "quarter"
+    YEAR = "year"
+
+
+# Grains each grain can be re-bucketed into without splitting a bucket
+_ROLLUPS = {
+    TimeGrain.HOUR: {TimeGrain.DAY, TimeGrain.WEEK, TimeGrain.MONTH, TimeGrain.QUARTER, TimeGrain.YEAR},
+    TimeGrain.DAY: {TimeGrain.WEEK, TimeGrain.MONTH, TimeGrain.QUARTER, TimeGrain.YEAR},
+    TimeGrain.WEEK: set(),  # weeks straddle month and year boundaries
+    TimeGrain.MONTH: {TimeGrain.QUARTER, TimeGrain.YEAR},
+    TimeGrain.QUARTER: {TimeGrain.YEAR},
+    TimeGrain.YEAR: set(),
+}
+
+_PERIODS = {
+    TimeGrain.HOUR: "h",
+    TimeGrain.DAY: "D",
+    TimeGrain.WEEK: "W-SUN",  # weeks ending Sunday start on Monday, like date_trunc('week')
+    TimeGrain.MONTH: "M",
+    TimeGrain.QUARTER: "Q",
+    TimeGrain.YEAR: "Y",
+}
+
+TIME_TYPES = (DataType.DATE, DataType.TIMESTAMP)
+
+
+def split_grain(name: str) -> Tuple[str, Optional[TimeGrain]]:
+    """("order_date", MONTH) for "order_date__month"; (name, None) without a grain suffix."""
+    base, sep, grain = name.rpartition(GRAIN_SEPARATOR)
+    if sep and base:
+        try:
+            return base, TimeGrain(grain.lower())
+        except ValueError:
+            pass
+    return name, None
+
+
+def native_grain(data_type: DataType) -> Optional[TimeGrain]:
+    """Grain of an untruncated time column; None for timestamps, which are finer than any grain."""
+    return TimeGrain.DAY if data_type == DataType.DATE else None
+
+
+def can_roll_up(source: Optional[TimeGrain], target: TimeGrain) -> bool:
+    """Whether values at `source` grain (None = untruncated timestamp) can be re-bucketed to `target`."""
+    return source is None or source == target or target in _ROLLUPS[source]
+
+
+def truncate(values: pd.Series, grain: TimeGrain) -> pd.Series:
+    """Vectorized equivalent of SQL date_trunc(grain, values)."""
+    timestamps = pd.to_datetime(values)
+    truncated = timestamps.dt.to_period(_PERIODS[grain]).dt.start_time
+    return truncated.astype(timestamps.dtype)
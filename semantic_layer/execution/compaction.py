@@ -0,0 +1,126 @@
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from semantic_layer.core.schema import AggregationType, DataType, SemanticModel
+
+
+@dataclass
+class CompactionReport:
+    bytes_before: int
+    bytes_after: int
+    conversions: Dict[str, str] = field(default_factory=dict)  # column -> new dtype
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+    def to_dict(self) -> Dict:
+        return {
+            "bytes_before": self.bytes_before,
+            "bytes_after": self.bytes_after,
+            "bytes_saved": self.bytes_saved,
+            "conversions": dict(self.conversions),
+        }
+
+
+class ResultCompactor:
+    """Shrink fetched results using the types declared in the semantic model.
+
+    String dimensions with few distinct values are dictionary-encoded as
+    categoricals; integer columns are downcast to the narrowest integer
+    type that holds every value; float columns are downcast to float32
+    only when the round trip is exact.
+    """
+
+    def __init__(self, model: SemanticModel, max_cardinality_ratio: float = 0.5):
+        self.model = model
+        self.max_cardinality_ratio = max_cardinality_ratio
+        self._column_types = self._declared_types(model)
+
+    @staticmethod
+    def _declared_types(model: SemanticModel) -> Dict[str, DataType]:
+        types = {}
+        for table in model.tables:
+            for dim in table.dimensions:
+                types[dim.name] = dim.type
+            for metric in table.metrics:
+                # COUNT is integral whatever the counted column is
+                if metric.aggregation == AggregationType.COUNT:
+                    types[metric.name] = DataType.INTEGER
+                else:
+                    types[metric.name] = metric.type
+        return types
+
+    def compact(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, CompactionReport]:
+        bytes_before = int(df.memory_usage(deep=True).sum())
+        conversions = {}
+        columns = {}
+        for name in df.columns:
+            converted = self._compact_column(df[name], self._column_types.get(name))
+            if converted is not None:
+                columns[name] = converted
+                conversions[name] = str(converted.dtype)
+        if columns:
+            df = df.assign(**columns)
+        bytes_after = int(df.memory_usage(deep=True).sum())
+        return df, CompactionReport(bytes_before, bytes_after, conversions)
+
+    def compact_table(self, table: pa.Table) -> Tuple[pd.DataFrame, CompactionReport]:
+        """Convert an Arrow table column by column, so only one column is ever uncompacted."""
+        columns = {}
+        conversions = {}
+        bytes_before = bytes_after = 0
+        for name in table.column_names:
+            series = table.column(name).to_pandas()
+            bytes_before += int(series.memory_usage(deep=True, index=False))
+            converted = self._compact_column(series, self._column_types.get(name))
+            if converted is not None:
+                series = converted
+                conversions[name] = str(series.dtype)
+            bytes_after += int(series.memory_usage(deep=True, index=False))
+            columns[name] = series
+        return pd.DataFrame(columns), CompactionReport(bytes_before, bytes_after, conversions)
+
+    def _compact_column(self, series: pd.Series, declared: Optional[DataType]) -> Optional[pd.Series]:
+        if declared == DataType.STRING:
+            return self._dictionary_encode(series)
+        if declared == DataType.INTEGER and pd.api.types.is_numeric_dtype(series):
+            return self._downcast_integer(series)
+        if declared == DataType.FLOAT and pd.api.types.is_float_dtype(series):
+            return self._downcast_float(series)
+        return None
+
+    def _dictionary_encode(self, series: pd.Series) -> Optional[pd.Series]:
+        if isinstance(series.dtype, pd.CategoricalDtype) or len(series) < 2:
+            return None
+        if series.nunique(dropna=True) > len(series) * self.max_cardinality_ratio:
+            return None
+        return series.astype("category")
+
+    @staticmethod
+    def _downcast_integer(series: pd.Series) -> Optional[pd.Series]:
+        if series.isna().any():
+            return None
+        original = series.dtype
+        if pd.api.types.is_float_dtype(series):
+            values = series.to_numpy()
+            if not (np.isfinite(values).all() and np.array_equal(values, np.trunc(values))):
+                return None
+            series = series.astype("int64")
+        downcast = pd.to_numeric(series, downcast="integer")
+        return downcast if downcast.dtype != original else None
+
+    @staticmethod
+    def _downcast_float(series: pd.Series) -> Optional[pd.Series]:
+        if series.dtype == np.float32:
+            return None
+        values = series.to_numpy(dtype=np.float64)
+        narrowed = values.astype(np.float32)
+        # Only keep float32 when no value changes (NaNs compare equal here)
+        if not np.array_equal(narrowed.astype(np.float64), values, equal_nan=True):
+            return None
+        return pd.Series(narrowed, index=series.index, name=series.name)
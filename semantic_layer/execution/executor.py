@@ -0,0 +1,316 @@
+import asyncio
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, replace
+from typing import Dict, Iterator, Optional, Set
+
+import pandas as pd
+import pyarrow as pa
+
+from semantic_layer.core.schema import SemanticModel
+from semantic_layer.compiler.plan import QueryPlan
+from semantic_layer.compiler.query import QueryRequest
+from semantic_layer.compiler.sql_compiler import SqlCompiler
+from semantic_layer.connectors.base import DataSourceAdapter
+from semantic_layer.cache.keys import QueryCanonicalizer
+from semantic_layer.cache.single_flight import SingleFlight
+from semantic_layer.cache.smart_cache import SmartCache
+from semantic_layer.cache.subsumption import SubsumptionIndex
+from semantic_layer.cache.watermarks import TableWatermarkTracker
+from semantic_layer.governance.lineage import DataLineage
+from semantic_layer.optimization.profiler import QueryProfiler, stage
+from .compaction import CompactionReport, ResultCompactor
+from .spill import SpilledResult, SpillWriter
+
+
+@dataclass
+class QueryResult:
+    sql: str
+    data: Optional[pd.DataFrame] = None
+    compaction: Optional[CompactionReport] = None
+    spill: Optional[SpilledResult] = None
+    plan: Optional[QueryPlan] = None
+    error_bound: Optional[float] = None  # Relative error (~95% confidence) of an approximate answer
+
+    @property
+    def spilled(self) -> bool:
+        return self.spill is not None
+
+    @property
+    def row_count(self) -> int:
+        return self.spill.num_rows if self.spill else len(self.data)
+
+    def iter_batches(self, batch_size: int = 65536) -> Iterator[pa.RecordBatch]:
+        """Yield the result in batches without materializing a spilled result."""
+        if self.spill:
+            yield from self.spill.iter_batches()
+        else:
+            table = pa.Table.from_pandas(self.data, preserve_index=False)
+            yield from table.to_batches(max_chunksize=batch_size)
+
+    def to_pandas(self) -> pd.DataFrame:
+        if not self.spill:
+            return self.data
+        df = self.spill.to_pandas()
+        self.compaction = self.spill.compaction or self.compaction
+        return df
+
+
+class QueryExecutor:
+    """Compile semantic queries and run them against a data source adapter.
+
+    With `memory_budget_bytes` set, results are streamed from the adapter
+    in Arrow batches and spill to a temporary IPC file once the budget is
+    exceeded, so an oversized result cannot exhaust process memory.
+
+    Results kept in `cache` are tagged with the tables they read, so
+    `cache.invalidate_by_table` drops exactly the affected entries.
+    Identical requests arriving while one is already running wait for
+    that execution instead of hitting the warehouse again.
+
+    With `stale_ttl` set, an expired result stays servable for that long:
+    requests get the stale value immediately and one background refresh
+    per key replaces it. `QueryRequest.max_staleness` caps how stale a
+    value a caller accepts. Without `stale_ttl`, only fresh results are
+    served unless the request sets `max_staleness`. `close()` stops the
+    refresh workers.
+
+    With a `watermarks` tracker and no fixed `cache_ttl`, entries get the
+    TTL the tracker learned from their tables' update frequency.
+
+    On an exact miss, a cached result at a finer grain (more dimensions,
+    or a finer time grain such as daily for a monthly request) or with
+    looser filters is filtered and re-aggregated locally when the metrics
+    allow.
+
+    With a `profiler`, every query's latency is recorded per fingerprint
+    (query shape, ignoring filter values) with a breakdown into the
+    canonicalize, cache_lookup, compile, execute, fetch and cache_store
+    stages.
+    """
+
+    def __init__(self, model: SemanticModel, adapter: DataSourceAdapter, compact_results: bool = False,
+                 memory_budget_bytes: Optional[int] = None, spill_dir: Optional[str] = None,
+                 batch_size: int = 65536, cache: Optional[SmartCache] = None,
+                 lineage: Optional[DataLineage] = None, cache_ttl: Optional[int] = None,
+                 stale_ttl: Optional[int] = None, refresh_workers: int = 2,
+                 watermarks: Optional[TableWatermarkTracker] = None,
+                 profiler: Optional[QueryProfiler] = None):
+        self.model = model
+        self.adapter = adapter
+        # Cached AVG metrics carry their SUM/COUNT so they can be rolled up later
+        self.compiler = SqlCompiler(model, decompose_averages=cache is not None)
+        self.canonicalizer = QueryCanonicalizer(model)
+        self.compactor = ResultCompactor(model) if compact_results else None
+        self.memory_budget_bytes = memory_budget_bytes
+        self.spill_dir = spill_dir
+        self.batch_size = batch_size
+        self.cache = cache
+        self.lineage = lineage
+        self.cache_ttl = cache_ttl
+        self.watermarks = watermarks
+        self.stale_ttl = stale_ttl
+        self.profiler = profiler
+        self.single_flight = SingleFlight()
+        self.subsumption = SubsumptionIndex(model) if cache is not None else None
+        self.subsumption_hits = 0
+        self.refresh_pool = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="sl-refresh")
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self.stale_served = 0
+        self.background_refreshes = 0
+        self.bytes_saved = 0
+        self.spilled_queries = 0
+        self.spilled_bytes = 0
+
+    def cache_key(self, request: QueryRequest) -> str:
+        return self.canonicalizer.cache_key(request)
+
+    def table_dependencies(self, request: QueryRequest) -> Set[str]:
+        """Tables a request reads: the compiler's resolved tables plus lineage upstreams."""
+        tables = set(self.compiler.resolve_tables(request))
+        if self.lineage:
+            for name in list(request.metrics) + list(request.dimensions):
+                tables |= self.lineage.get_upstream_tables(name)
+        return tables
+
+    def profile(self):
+        """Context in which a query is profiled; joins an already open profile (e.g. the API's)."""
+        return self.profiler.profile() if self.profiler else nullcontext()
+
+    def _normalize(self, request: QueryRequest, timer):
+        with stage("canonicalize"):
+            request = self.canonicalizer.normalize(request)
+            key = self.cache_key(request)
+            if timer is not None and timer.fingerprint is None:
+                timer.fingerprint = self.canonicalizer.fingerprint(request)
+        return request, key
+
+    def execute(self, request: QueryRequest) -> QueryResult:
+        with self.profile() as timer:
+            request, key = self._normalize(request, timer)
+            with stage("cache_lookup"):
+                result = self._lookup(key, request)
+            if result is None:
+                result = self.single_flight.do(key, lambda: self._execute_and_store(key, request),
+                                               recheck=lambda: self._recheck(key))
+            return self._in_request_order(result, request)
+
+    async def execute_async(self, request: QueryRequest) -> QueryResult:
+        with self.profile() as timer:
+            request, key = self._normalize(request, timer)
+            with stage("cache_lookup"):
+                result = self._lookup(key, request)
+            if result is None:
+                result = await self.single_flight.do_async(
+                    key, lambda: asyncio.to_thread(self._execute_and_store, key, request),
+                    recheck=lambda: self._recheck(key)
+                )
+            return self._in_request_order(result, request)
+
+    @staticmethod
+    def _in_request_order(result: QueryResult, request: QueryRequest) -> QueryResult:
+        """Project to the requested columns, in request order, dropping cached helper columns."""
+        if result.data is None:
+            return result
+        columns = list(request.dimensions) + list(request.metrics)
+        if list(result.data.columns) == columns or not set(columns) <= set(result.data.columns):
+            return result
+        return replace(result, data=result.data[columns])
+
+    def max_staleness(self, request: QueryRequest) -> Optional[float]:
+        """Seconds of staleness `request` accepts; stale results are opt-in via `stale_ttl` or the request."""
+        if request.max_staleness is None and self.stale_ttl is None:
+            return 0
+        return request.max_staleness
+
+    def close(self):
+        """Stop the background refresh workers, letting queued refreshes finish."""
+        self.refresh_pool.shutdown(wait=True)
+
+    def _lookup(self, key: str, request: QueryRequest) -> Optional[QueryResult]:
+        if self.cache is None:
+            return None
+        cached, stale = self.cache.get_with_staleness(key, self.max_staleness(request))
+        if cached is not None and stale:
+            self.stale_served += 1
+            self._refresh_in_background(key, request)
+        if cached is None:
+            cached = self._answer_from_broader(key, request)
+        return cached
+
+    def _recheck(self, key: str) -> Optional[QueryResult]:
+        """A fresh result stored by the previous leader after this caller's lookup missed."""
+        if self.cache is None:
+            return None
+        return self.cache.peek(key)[0]
+
+    def _answer_from_broader(self, key: str, request: QueryRequest) -> Optional[QueryResult]:
+        canonical = self.canonicalizer.canonicalize(request)
+        for entry in self.subsumption.candidates(canonical, self.compiler.resolve_tables(request)):
+            cached = self.cache.get(entry.key)
+            if cached is None or cached.data is None:
+                self.subsumption.remove(entry.key)
+                continue
+            data = self.subsumption.answer(
+                entry, cached.data, canonical, list(request.dimensions), list(request.metrics)
+            )
+            if data is None:
+                continue
+            self.subsumption_hits += 1
+            result = QueryResult(sql=cached.sql, data=data)
+            dependencies = self.table_dependencies(request)
+            self.cache.set(key, result, ttl=self._ttl_for(dependencies), dependencies=dependencies,
+                           stale_ttl=self.stale_ttl)
+            return result
+        return None
+
+    def _refresh_in_background(self, key: str, request: QueryRequest):
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            self.background_refreshes += 1
+
+        def refresh():
+            try:
+                self.single_flight.do(key, lambda: self._execute_and_store(key, request))
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+
+        self.refresh_pool.submit(refresh)
+
+    def _execute_and_store(self, key: str, request: QueryRequest) -> QueryResult:
+        if self.cache is not None and self.watermarks is not None:
+            # Baseline before reading, so a change landing mid-query still invalidates the result
+            self.watermarks.observe(self.table_dependencies(request))
+        started = time.perf_counter()
+        result = self._execute(request)
+        if self.cache is not None and not result.spilled:
+            dependencies = self.table_dependencies(request)
+            cost = time.perf_counter() - started
+            with stage("cache_store"):
+                # Execution time is the recompute cost an admission filter weighs
+                self.cache.set(key, result, ttl=self._ttl_for(dependencies), dependencies=dependencies,
+                               stale_ttl=self.stale_ttl, cost=cost)
+            self.subsumption.add(key, self.canonicalizer.canonicalize(request),
+                                 self.compiler.resolve_tables(request))
+        return result
+
+    def _ttl_for(self, dependencies: Set[str]) -> Optional[int]:
+        if self.cache_ttl is None and self.watermarks is not None:
+            return self.watermarks.ttl_for(dependencies)
+        return self.cache_ttl
+
+    def _execute(self, request: QueryRequest) -> QueryResult:
+        with stage("compile"):
+            compiled = self.compiler.compile_with_plan(request)
+        sql, params = compiled.sql, compiled.params
+        if self.memory_budget_bytes is None:
+            with stage("execute"):
+                df = self.adapter.execute_query(sql, params)
+            with stage("fetch"):
+                return self._finish(sql, df, compiled.plan)
+
+        writer = SpillWriter(self.memory_budget_bytes, self.spill_dir)
+        try:
+            # Time to the first batch is execution; draining the rest is fetching
+            with stage("execute"):
+                batches = iter(self.adapter.execute_batches(sql, params, batch_size=self.batch_size))
+                first = next(batches, None)
+            with stage("fetch"):
+                for batch in itertools.chain([first] if first is not None else [], batches):
+                    writer.write(batch)
+        except Exception:
+            writer.abort()
+            raise
+        spill = writer.finish(self.compactor)
+        if spill is None:
+            with stage("fetch"):
+                return self._finish(sql, writer.to_pandas(), compiled.plan)
+        self.spilled_queries += 1
+        self.spilled_bytes += spill.nbytes
+        return QueryResult(sql=sql, spill=spill, plan=compiled.plan)
+
+    def _finish(self, sql: str, df: pd.DataFrame, plan: Optional[QueryPlan] = None) -> QueryResult:
+        report = None
+        if self.compactor:
+            df, report = self.compactor.compact(df)
+            self.bytes_saved += report.bytes_saved
+        return QueryResult(sql=sql, data=df, compaction=report, plan=plan)
+
+    def get_stats(self) -> Dict:
+        return {
+            "compaction_bytes_saved": self.bytes_saved,
+            "spilled_queries": self.spilled_queries,
+            "spilled_bytes": self.spilled_bytes,
+            "single_flight": self.single_flight.get_stats(),
+            "stale_served": self.stale_served,
+            "background_refreshes": self.background_refreshes,
+            "subsumption_hits": self.subsumption_hits,
+            **({"profile": self.profiler.get_stats()} if self.profiler else {}),
+        }
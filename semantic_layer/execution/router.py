@@ -0,0 +1,420 @@
+import logging
+import math
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from semantic_layer.cache.subsumption import REAGGREGATIONS, SubsumptionIndex
+from semantic_layer.compiler.filters import FilterBuilder
+from semantic_layer.compiler.query import QueryRequest
+from semantic_layer.core.schema import AggregationType
+from semantic_layer.core.time_grains import split_grain
+from semantic_layer.optimization.cost_estimator import CostEstimator
+from semantic_layer.optimization.profiler import stage
+from .executor import QueryExecutor, QueryResult
+
+logger = logging.getLogger(__name__)
+
+CACHE = "cache"
+ROLLUP = "rollup"
+MATERIALIZED = "materialized"
+WAREHOUSE = "warehouse"
+APPROXIMATE = "approximate"
+
+# Latency assumed for a path before any actuals have been recorded
+_DEFAULT_LATENCY = {CACHE: 0.001, ROLLUP: 0.01, MATERIALIZED: 0.1, WAREHOUSE: 1.0, APPROXIMATE: 0.5}
+# Aggregates whose totals a uniform sample estimates by scaling up
+_SCALABLE = {AggregationType.SUM, AggregationType.COUNT}
+
+
+@dataclass
+class MaterializedAggregate:
+    table: str  # Physical table holding the pre-aggregated rows
+    dimensions: List[str]  # Columns named after dimensions, optionally at a grain (order_date__day)
+    metrics: List[str]  # Columns named after metrics; AVG needs <metric>__sum and <metric>__count
+    source_tables: List[str]
+    refreshed_at: float = 0.0
+    ttl: int = 3600  # Seconds considered fresh when source changes are not tracked
+
+
+@dataclass
+class RouteCandidate:
+    path: str
+    latency_seconds: float
+    warehouse_usd: float = 0.0
+    bytes_scanned: float = 0.0
+    error_bound: Optional[float] = None
+    score: float = 0.0
+    detail: Any = None  # What the path needs to run: aggregate or sample fraction
+
+    def to_dict(self) -> Dict:
+        return {
+            "path": self.path,
+            "latency_ms": round(self.latency_seconds * 1000, 3),
+            "warehouse_usd": round(self.warehouse_usd, 6),
+            "bytes_scanned": int(self.bytes_scanned),
+            "error_bound": self.error_bound,
+            "score": round(self.score, 6),
+        }
+
+
+@dataclass
+class RouteDecision:
+    fingerprint: str
+    candidates: List[RouteCandidate]  # Eligible paths, cheapest first
+    rejected: Dict[str, str]  # Path -> why it could not answer
+    timestamp: float
+    path: Optional[str] = None
+    actual_seconds: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "fingerprint": self.fingerprint,
+            "path": self.path,
+            "actual_ms": None if self.actual_seconds is None else round(self.actual_seconds * 1000, 3),
+            "candidates": [c.to_dict() for c in self.candidates],
+            "rejected": dict(self.rejected),
+            "timestamp": self.timestamp,
+        }
+
+
+class ExecutionRouter:
+    """Answer each query by the cheapest path that meets its constraints.
+
+    Candidate paths are an exact cache hit, a roll-up of a broader cached
+    result, a registered materialized aggregate, the live warehouse and a
+    block-sampled approximate query. Each eligible path gets an estimated
+    latency and warehouse cost (from `CostEstimator` and its statistics)
+    and is scored as `warehouse_usd + latency_weight * seconds`.
+
+    Freshness follows `QueryRequest.max_staleness`: stale cache entries
+    follow the cache's rules, and a materialized aggregate is stale once a
+    source table changed after its refresh (per the executor's watermark
+    tracker, baselined by `mark_refreshed`) or, untracked, once its `ttl`
+    has passed. Approximate answers
+    are only considered when `QueryRequest.max_error` is set, for SUM,
+    COUNT and AVG metrics, with a sample fraction sized so the estimated
+    relative error at ~95% confidence stays within it; they are not cached.
+
+    Measured latencies replace the estimates as they are recorded, per
+    path and query fingerprint. If a chosen path turns out unable to
+    answer, the next cheapest runs. Every decision is logged and the most
+    recent `max_decisions` are kept.
+    """
+
+    def __init__(self, executor: QueryExecutor, estimator: Optional[CostEstimator] = None,
+                 aggregates: Optional[List[MaterializedAggregate]] = None, latency_weight: float = 0.01,
+                 scan_bytes_per_second: float = 1e9, confidence_z: float = 1.96, design_effect: float = 1.5,
+                 sample_block_rows: int = 2048, max_sample_fraction: float = 0.25,
+                 sample_seed: Optional[int] = None, smoothing: float = 0.3, max_decisions: int = 1000,
+                 clock: Callable[[], float] = time.time):
+        self.executor = executor
+        self.estimator = estimator or CostEstimator()
+        self.aggregates: List[MaterializedAggregate] = list(aggregates or [])
+        self.latency_weight = latency_weight
+        self.scan_bytes_per_second = scan_bytes_per_second
+        self.confidence_z = confidence_z
+        self.design_effect = design_effect
+        self.sample_block_rows = sample_block_rows
+        self.max_sample_fraction = max_sample_fraction
+        self.sample_seed = sample_seed
+        self.smoothing = smoothing
+        self.clock = clock
+        self.decisions = deque(maxlen=max_decisions)
+        self.routed = Counter()
+        self.fallbacks = 0
+        self._index = SubsumptionIndex(executor.model)
+        self._aggregations = {
+            metric.name: metric.aggregation for table in executor.model.tables for metric in table.metrics
+        }
+        self._actuals: Dict[Tuple[str, str], float] = {}  # (path, fingerprint) -> EWMA seconds
+        self._seconds_per_byte: Dict[str, float] = {}  # path -> EWMA
+        self._lock = threading.Lock()
+
+    def register_aggregate(self, aggregate: MaterializedAggregate):
+        self.aggregates.append(aggregate)
+
+    def mark_refreshed(self, table: str, at: Optional[float] = None):
+        tracker = self.executor.watermarks
+        for aggregate in self.aggregates:
+            if aggregate.table == table:
+                if tracker is not None:
+                    # Changes are only seen against a baseline read before the refresh time
+                    tracker.observe(aggregate.source_tables)
+                aggregate.refreshed_at = self.clock() if at is None else at
+
+    def execute(self, request: QueryRequest) -> QueryResult:
+        executor = self.executor
+        with executor.profile() as timer:
+            request, key = executor._normalize(request, timer)
+            with stage("route"):
+                decision = self._route(request, key)
+            for candidate in decision.candidates:
+                started = time.perf_counter()
+                result = self._run(candidate, request, key)
+                if result is None:
+                    decision.rejected[candidate.path] = "could not answer when run"
+                    self.fallbacks += 1
+                    continue
+                elapsed = time.perf_counter() - started
+                decision.path, decision.actual_seconds = candidate.path, elapsed
+                self._record_actual(candidate, decision.fingerprint, elapsed)
+                self._log(decision)
+                return executor._in_request_order(result, request)
+        raise RuntimeError("No execution path could answer the query")  # The warehouse always should
+
+    def route(self, request: QueryRequest) -> RouteDecision:
+        """Rank the paths for `request` without running it or touching cache statistics."""
+        request, key = self.executor._normalize(request, None)
+        return self._route(request, key)
+
+    def _route(self, request: QueryRequest, key: str) -> RouteDecision:
+        fingerprint = self.executor.canonicalizer.fingerprint(request)
+        plan = self.executor.compiler.plan(request)
+        estimate = self.estimator.estimate_cost(plan)
+        candidates, rejected = [], {}
+
+        cache_candidate = self._cache_candidate(request, key, fingerprint, rejected)
+        if cache_candidate:
+            candidates.append(cache_candidate)
+        else:
+            candidates.extend(filter(None, [self._rollup_candidate(request, fingerprint, rejected)]))
+        candidates.extend(filter(None, [self._materialized_candidate(request, fingerprint, rejected)]))
+        warehouse = RouteCandidate(
+            path=WAREHOUSE, bytes_scanned=estimate["estimated_bytes_scanned"],
+            warehouse_usd=estimate["estimated_cost_usd"],
+            latency_seconds=self._latency(WAREHOUSE, fingerprint, estimate["estimated_bytes_scanned"]),
+        )
+        candidates.append(warehouse)
+        candidates.extend(filter(None, [self._approximate_candidate(request, plan, warehouse, fingerprint, rejected)]))
+
+        for candidate in candidates:
+            candidate.score = candidate.warehouse_usd + self.latency_weight * candidate.latency_seconds
+        candidates.sort(key=lambda c: c.score)
+        return RouteDecision(fingerprint=fingerprint, candidates=candidates, rejected=rejected,
+                             timestamp=self.clock())
+
+    def _cache_candidate(self, request, key, fingerprint, rejected) -> Optional[RouteCandidate]:
+        cache = self.executor.cache
+        if cache is None:
+            rejected[CACHE] = "no cache configured"
+            return None
+        # Ranking must not count as a lookup; the hit is recorded when the path runs
+        cached, _ = cache.peek(key, self.executor.max_staleness(request))
+        if cached is None:
+            rejected[CACHE] = "not cached"
+            return None
+        return RouteCandidate(path=CACHE, latency_seconds=self._latency(CACHE, fingerprint))
+
+    def _rollup_candidate(self, request, fingerprint, rejected) -> Optional[RouteCandidate]:
+        executor = self.executor
+        if executor.subsumption is None:
+            rejected[ROLLUP] = "no cache configured"
+            return None
+        canonical = executor.canonicalizer.canonicalize(request)
+        entries = executor.subsumption.candidates(canonical, executor.compiler.resolve_tables(request))
+        if not entries:
+            rejected[ROLLUP] = "no broader cached result"
+            return None
+        return RouteCandidate(path=ROLLUP, latency_seconds=self._latency(ROLLUP, fingerprint))
+
+    def _materialized_candidate(self, request, fingerprint, rejected) -> Optional[RouteCandidate]:
+        covering = [a for a in self.aggregates if self._covers(a, request)]
+        if not covering:
+            rejected[MATERIALIZED] = "no covering aggregate"
+            return None
+        now = self.clock()
+        fresh = [a for a in covering if self._acceptable(self._staleness(a, now), request.max_staleness)]
+        if not fresh:
+            rejected[MATERIALIZED] = "covering aggregates are stale"
+            return None
+        sized = [(self._table_bytes(a.table), len(a.dimensions), a) for a in fresh]
+        size, _, aggregate = min(sized, key=lambda s: (s[0], s[1]))
+        return RouteCandidate(path=MATERIALIZED, bytes_scanned=size,
+                              warehouse_usd=size / 1e12 * self.estimator.cost_per_tb,
+                              latency_seconds=self._latency(MATERIALIZED, fingerprint, size), detail=aggregate)
+
+    def _approximate_candidate(self, request, plan, warehouse: RouteCandidate, fingerprint,
+                               rejected) -> Optional[RouteCandidate]:
+        if request.max_error is None:
+            rejected[APPROXIMATE] = "exact answer required"
+            return None
+        if any(self._aggregations.get(m) not in _SCALABLE | {AggregationType.AVG} for m in request.metrics):
+            rejected[APPROXIMATE] = "MIN/MAX cannot be estimated from a sample"
+            return None
+        base = plan.base_table
+        stats = self.estimator.statistics.get(base) if self.estimator.statistics else None
+        if stats is None or not stats.row_count:
+            rejected[APPROXIMATE] = f"no statistics for {base}"
+            return None
+        filters = plan.filters_on(base)
+        rows = stats.row_count * self.estimator.selectivity(base, filters)
+        groups = self.estimator.estimate_cardinality(
+            base, filters, [c.sql for c in plan.group_by if c.table == base]
+        )
+        # Block sampling: a group's rows only give independent draws up to the number of blocks
+        units = min(rows / max(groups, 1), stats.row_count / self.sample_block_rows)
+        if units < 1:
+            rejected[APPROXIMATE] = "too few rows per group to sample"
+            return None
+        needed = self.confidence_z ** 2 * self.design_effect / (request.max_error ** 2 * units)
+        fraction = needed / (1 + needed)
+        if fraction > self.max_sample_fraction:
+            rejected[APPROXIMATE] = f"a {fraction:.0%} sample would be needed"
+            return None
+        fraction = max(fraction, 1e-4)
+        error = self.confidence_z * math.sqrt(self.design_effect * (1 - fraction) / (fraction * units))
+        scanned = warehouse.bytes_scanned * fraction
+        latency = self._actuals.get((APPROXIMATE, fingerprint)) or warehouse.latency_seconds * fraction
+        return RouteCandidate(path=APPROXIMATE, bytes_scanned=scanned,
+                              warehouse_usd=warehouse.warehouse_usd * fraction, latency_seconds=latency,
+                              error_bound=round(error, 4), detail=fraction)
+
+    def _run(self, candidate: RouteCandidate, request: QueryRequest, key: str) -> Optional[QueryResult]:
+        executor = self.executor
+        if candidate.path == CACHE:
+            cached, stale = executor.cache.get_with_staleness(key, executor.max_staleness(request))
+            if stale:
+                executor.stale_served += 1
+                executor._refresh_in_background(key, request)
+            return cached
+        if candidate.path == ROLLUP:
+            return executor._answer_from_broader(key, request)
+        if candidate.path == MATERIALIZED:
+            sql, params = self._aggregate_sql(candidate.detail, request)
+            with stage("execute"):
+                df = executor.adapter.execute_query(sql, params)
+            return QueryResult(sql=sql, data=df)
+        if candidate.path == APPROXIMATE:
+            return self._run_sampled(request, candidate.detail, candidate.error_bound)
+        return executor.single_flight.do(key, lambda: executor._execute_and_store(key, request),
+                                         recheck=lambda: executor._recheck(key))
+
+    def _run_sampled(self, request: QueryRequest, fraction: float, error_bound: float) -> QueryResult:
+        executor = self.executor
+        base = executor.model.tables[0].sql_table_name
+        sample = executor.adapter.sample_fraction_sql(base, fraction, self.sample_seed)
+        with stage("compile"):
+            sql, params = executor.compiler.compile_parameterized(
+                request, source=f"({sample}) AS {base.rpartition('.')[2]}"
+            )
+        with stage("execute"):
+            df = executor.adapter.execute_query(sql, params)
+        # Scale sampled totals up to the whole table; AVG is a ratio and needs no scaling
+        for column in df.columns:
+            name, _, suffix = column.partition("__")
+            if self._aggregations.get(name) in _SCALABLE or suffix in ("sum", "count"):
+                df[column] = df[column] / fraction
+        return QueryResult(sql=sql, data=df, error_bound=error_bound)
+
+    def _covers(self, aggregate: MaterializedAggregate, request: QueryRequest) -> bool:
+        # Exactly the tables the request reads: joining more (or fewer) could change the rows
+        if set(aggregate.source_tables) != set(self.executor.compiler.resolve_tables(request)):
+            return False
+        dims = frozenset(aggregate.dimensions)
+        for column in list(request.dimensions) + list(request.filters or {}):
+            if self._index.source_column(column, dims) is None:
+                return False
+        for metric in request.metrics:
+            aggregation = self._aggregations.get(metric)
+            if aggregation == AggregationType.AVG:
+                if not {f"{metric}__sum", f"{metric}__count"} <= set(aggregate.metrics):
+                    return False
+            elif aggregation not in REAGGREGATIONS or metric not in aggregate.metrics:
+                return False
+        return True
+
+    def _aggregate_sql(self, aggregate: MaterializedAggregate, request: QueryRequest) -> Tuple[str, List[Any]]:
+        dims = frozenset(aggregate.dimensions)
+
+        def column(name: str) -> str:
+            source = self._index.source_column(name, dims)
+            if source == name:
+                return name
+            return f"date_trunc('{split_grain(name)[1].value}', {source})"
+
+        select = [f"{column(d)} AS {d}" for d in request.dimensions]
+        for metric in request.metrics:
+            aggregation = self._aggregations[metric]
+            if aggregation == AggregationType.AVG:
+                select.append(f"sum({metric}__sum) / sum({metric}__count) AS {metric}")
+            else:
+                select.append(f"{REAGGREGATIONS[aggregation]}({metric}) AS {metric}")
+        sql = f"SELECT {', '.join(select)} FROM {aggregate.table}"
+        where, params = FilterBuilder.build_parameterized_where_clause(
+            {column(name): value for name, value in (request.filters or {}).items()}
+        )
+        if where:
+            sql += f" WHERE {where}"
+        if request.dimensions:
+            sql += f" GROUP BY {', '.join(request.dimensions)}"
+        if request.limit:
+            sql += f" LIMIT {request.limit}"
+        return sql, params
+
+    def _staleness(self, aggregate: MaterializedAggregate, now: float) -> float:
+        """Seconds the aggregate has been out of date; negative while still fresh."""
+        tracker = self.executor.watermarks
+        if tracker is not None and all(tracker.observed_at.get(t, float("inf")) <= aggregate.refreshed_at
+                                       for t in aggregate.source_tables):
+            changes = [tracker.last_change.get(t) for t in aggregate.source_tables]
+            changes = [c for c in changes if c is not None and c > aggregate.refreshed_at]
+            return now - min(changes) if changes else -1.0
+        return now - aggregate.refreshed_at - aggregate.ttl
+
+    @staticmethod
+    def _acceptable(staleness: float, max_staleness: Optional[float]) -> bool:
+        return staleness <= 0 or (max_staleness is not None and staleness <= max_staleness)
+
+    def _table_bytes(self, table: str) -> float:
+        stats = self.estimator.statistics.get(table) if self.estimator.statistics else None
+        return stats.size_bytes if stats else 0.0
+
+    def _latency(self, path: str, fingerprint: str, scanned: float = 0.0) -> float:
+        with self._lock:
+            actual = self._actuals.get((path, fingerprint))
+            rate = self._seconds_per_byte.get(path)
+        if actual is not None:
+            return actual
+        if scanned and rate is not None:
+            return scanned * rate
+        if scanned and path in (WAREHOUSE, MATERIALIZED):
+            return scanned / self.scan_bytes_per_second
+        return _DEFAULT_LATENCY[path]
+
+    def _record_actual(self, candidate: RouteCandidate, fingerprint: str, seconds: float):
+        with self._lock:
+            self.routed[candidate.path] += 1
+            key = (candidate.path, fingerprint)
+            previous = self._actuals.get(key)
+            self._actuals[key] = seconds if previous is None else (
+                self.smoothing * seconds + (1 - self.smoothing) * previous
+            )
+            if candidate.bytes_scanned:
+                rate = seconds / candidate.bytes_scanned
+                previous = self._seconds_per_byte.get(candidate.path)
+                self._seconds_per_byte[candidate.path] = rate if previous is None else (
+                    self.smoothing * rate + (1 - self.smoothing) * previous
+                )
+
+    def _log(self, decision: RouteDecision):
+        self.decisions.append(decision)
+        chosen = decision.candidates[[c.path for c in decision.candidates].index(decision.path)]
+        logger.info(
+            "Routed %s to %s (est %.1fms, $%.6f, actual %.1fms); alternatives: %s; rejected: %s",
+            decision.fingerprint[:12], decision.path, chosen.latency_seconds * 1000, chosen.warehouse_usd,
+            decision.actual_seconds * 1000,
+            ", ".join(f"{c.path}={c.score:.6f}" for c in decision.candidates if c is not chosen) or "none",
+            "; ".join(f"{path}: {reason}" for path, reason in decision.rejected.items()) or "none",
+        )
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "routed": dict(self.routed),
+                "fallbacks": self.fallbacks,
+                "decisions_kept": len(self.decisions),
+                "aggregates": len(self.aggregates),
+            }
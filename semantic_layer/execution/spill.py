@@ -0,0 +1,109 @@
+import os
+import tempfile
+import weakref
+from typing import Iterator, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+
+class SpilledResult:
+    """A query result written to a temporary Arrow IPC file.
+
+    Batches are read back through a memory map, so iterating a spilled
+    result never holds more than one batch in process memory. With a
+    `compactor`, `to_pandas` compacts the result as it is converted.
+    """
+
+    def __init__(self, path: str, schema: pa.Schema, num_rows: int, nbytes: int, compactor=None):
+        self.path = path
+        self.schema = schema
+        self.num_rows = num_rows
+        self.nbytes = nbytes
+        self.compactor = compactor
+        self.compaction = None  # CompactionReport of the last to_pandas()
+        self._finalizer = weakref.finalize(self, _remove, path)
+
+    def iter_batches(self) -> Iterator[pa.RecordBatch]:
+        with pa.memory_map(self.path, "r") as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i)
+
+    def to_pandas(self) -> pd.DataFrame:
+        with pa.memory_map(self.path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+            if self.compactor is None:
+                return table.to_pandas()
+            df, self.compaction = self.compactor.compact_table(table)
+            return df
+
+    def cleanup(self):
+        self._finalizer()
+
+
+def _remove(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class SpillWriter:
+    """Buffer batches in memory until a byte budget is exceeded, then spill to disk."""
+
+    def __init__(self, memory_budget_bytes: int, spill_dir: Optional[str] = None):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.spill_dir = spill_dir
+        self.buffered: List[pa.RecordBatch] = []
+        self.buffered_bytes = 0
+        self.num_rows = 0
+        self.nbytes = 0
+        self.schema: Optional[pa.Schema] = None
+        self._path: Optional[str] = None
+        self._sink = None
+        self._writer = None
+
+    @property
+    def spilled(self) -> bool:
+        return self._writer is not None
+
+    def write(self, batch: pa.RecordBatch):
+        if self.schema is None:
+            self.schema = batch.schema
+        self.num_rows += batch.num_rows
+        self.nbytes += batch.nbytes
+        if self.spilled:
+            self._writer.write_batch(batch)
+            return
+        self.buffered.append(batch)
+        self.buffered_bytes += batch.nbytes
+        if self.buffered_bytes > self.memory_budget_bytes:
+            self._start_spill()
+
+    def _start_spill(self):
+        fd, self._path = tempfile.mkstemp(prefix="sl_spill_", suffix=".arrow", dir=self.spill_dir)
+        os.close(fd)
+        self._sink = pa.OSFile(self._path, "wb")
+        self._writer = pa.ipc.new_file(self._sink, self.schema)
+        for batch in self.buffered:
+            self._writer.write_batch(batch)
+        self.buffered = []
+        self.buffered_bytes = 0
+
+    def finish(self, compactor=None) -> Optional[SpilledResult]:
+        """Close the spill file; returns None when everything fit in memory."""
+        if not self.spilled:
+            return None
+        self._writer.close()
+        self._sink.close()
+        return SpilledResult(self._path, self.schema, self.num_rows, self.nbytes, compactor)
+
+    def abort(self):
+        if self.spilled:
+            self._writer.close()
+            self._sink.close()
+            _remove(self._path)
+
+    def to_pandas(self) -> pd.DataFrame:
+        if not self.buffered:
+            return pd.DataFrame() if self.schema is None else self.schema.empty_table().to_pandas()
+        return pa.Table.from_batches(self.buffered, schema=self.schema).to_pandas()
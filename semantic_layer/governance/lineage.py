@@ -30,6 +30,13 @@ class DataLineage:
         
         return dependencies
     
+    def get_upstream_tables(self, node_name: str) -> Set[str]:
+        """Get the tables a node ultimately reads from."""
+        return {
+            dep for dep in self.get_upstream_dependencies(node_name)
+            if dep not in self.graph or self.graph[dep].type == "table"
+        }
+    
     def get_downstream_impact(self, node_name: str) -> Set[str]:
         """Get all metrics/dimensions that depend on this node."""
         impacted = set()
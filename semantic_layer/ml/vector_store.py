@@ -1,13 +1,79 @@
-from typing import List, Dict
+from typing import List, Dict, Tuple
 import numpy as np
 
 class VectorStore:
-    def __init__(self):
-        self.vectors = {}
+    """In-memory cosine-similarity index.
+    
+    Vectors are L2-normalized into one contiguous float32 matrix, so a
+    search is a single matrix-vector product over all stored rows.
+    """
+    
+    def __init__(self, dim: int = None, initial_capacity: int = 64):
+        self.dim = dim
+        self.keys: List[str] = []
+        self.index: Dict[str, int] = {}  # key -> row
+        self.matrix = None if dim is None else np.zeros((initial_capacity, dim), dtype=np.float32)
+        self.initial_capacity = initial_capacity
+    
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+    
+    def __len__(self) -> int:
+        return len(self.keys)
     
     def add(self, key: str, vector: np.ndarray):
-        self.vectors[key] = vector
+        vector = self._normalize(np.ravel(vector))
+        if self.matrix is None:
+            self.dim = vector.shape[0]
+            self.matrix = np.zeros((self.initial_capacity, self.dim), dtype=np.float32)
+        if vector.shape[0] != self.dim:
+            raise ValueError(f"Expected vector of dimension {self.dim}, got {vector.shape[0]}")
+        row = self.index.get(key)
+        if row is None:
+            row = len(self.keys)
+            if row == self.matrix.shape[0]:
+                grown = np.zeros((row * 2, self.dim), dtype=np.float32)
+                grown[:row] = self.matrix
+                self.matrix = grown
+            self.keys.append(key)
+            self.index[key] = row
+        self.matrix[row] = vector
+    
+    def remove(self, key: str) -> bool:
+        """Delete a vector by moving the last row into its slot."""
+        row = self.index.pop(key, None)
+        if row is None:
+            return False
+        last = len(self.keys) - 1
+        if row != last:
+            moved = self.keys[last]
+            self.matrix[row] = self.matrix[last]
+            self.keys[row] = moved
+            self.index[moved] = row
+        self.keys.pop()
+        return True
+    
+    def search(self, query_vector: np.ndarray, top_k: int = 5) -> List[Tuple[str, float]]:
+        """Return up to top_k (key, cosine similarity) pairs, best first."""
+        return self.search_batch(np.atleast_2d(query_vector), top_k)[0]
     
-    def search(self, query_vector: np.ndarray, top_k: int = 5) -> List[str]:
-        # Simple cosine similarity search
-        return list(self.vectors.keys())[:top_k]
+    def search_batch(self, query_vectors: np.ndarray, top_k: int = 5) -> List[List[Tuple[str, float]]]:
+        """Search several queries with one matrix-matrix product."""
+        queries = self._normalize(np.atleast_2d(query_vectors))
+        n = len(self.keys)
+        if n == 0:
+            return [[] for _ in range(len(queries))]
+        scores = queries @ self.matrix[:n].T  # (queries, n)
+        k = min(top_k, n)
+        if k < n:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(n), (len(queries), n))
+        results = []
+        for q, rows in enumerate(top):
+            ordered = rows[np.argsort(-scores[q, rows])]
+            results.append([(self.keys[r], float(scores[q, r])) for r in ordered])
+        return results
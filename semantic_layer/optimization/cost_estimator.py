@@ -1,59 +1,157 @@
-from typing import Dict, List
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 import re
+import threading
+
+from semantic_layer.compiler.plan import QueryPlan
+from .statistics import StatisticsCatalog
+
+_IDENTIFIER = re.compile(r"[A-Za-z_]\w*")
+
+# Selectivity assumed for a predicate on a column without statistics
+DEFAULT_SELECTIVITY = 0.1
 
 class CostEstimator:
-    """Estimate query execution cost for optimization."""
+    """Estimate query execution cost for optimization.
     
-    def __init__(self, warehouse_type: str = "snowflake"):
+    Estimates are computed from the compiler's `QueryPlan`, so the tables,
+    columns, filters and grouping are known exactly rather than recovered
+    from SQL text, and are memoized per plan until the statistics change.
+    
+    With a `StatisticsCatalog`, table sizes come from collected statistics,
+    scans are pruned to the referenced columns, and filter selectivity and
+    output cardinality come from per-column distinct counts, null
+    fractions and value ranges.
+    """
+    
+    def __init__(self, warehouse_type: str = "snowflake", statistics: Optional[StatisticsCatalog] = None,
+                 memo_size: int = 1024):
         self.warehouse_type = warehouse_type
         self.cost_per_tb = 5.0  # USD per TB scanned
+        self.statistics = statistics
+        self.memo_size = memo_size
+        self._memo: "OrderedDict[Tuple[QueryPlan, int], Dict]" = OrderedDict()
+        self._memo_lock = threading.Lock()
+        self.memo_hits = 0
+        self.memo_misses = 0
     
-    def estimate_cost(self, sql: str, table_stats: Dict) -> Dict:
-        """Estimate query cost based on tables and operations."""
-        tables = self._extract_tables(sql)
+    def estimate_cost(self, plan: QueryPlan, table_stats: Optional[Dict] = None) -> Dict:
+        """Estimate query cost based on tables and operations.
         
+        `table_stats` ({table: {"size_bytes": ...}}) overrides the catalog;
+        such estimates are not memoized.
+        """
+        if table_stats:
+            return self._estimate(plan, table_stats)
+        memo_key = (plan, self.statistics.version if self.statistics else 0)
+        with self._memo_lock:
+            cached = self._memo.get(memo_key)
+            if cached is not None:
+                self._memo.move_to_end(memo_key)
+                self.memo_hits += 1
+                return dict(cached)
+            self.memo_misses += 1
+        estimate = self._estimate(plan, {})
+        with self._memo_lock:
+            self._memo[memo_key] = estimate
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return dict(estimate)
+    
+    def _estimate(self, plan: QueryPlan, table_stats: Dict) -> Dict:
         total_bytes = 0
-        for table in tables:
+        for table in plan.tables:
             if table in table_stats:
                 total_bytes += table_stats[table]["size_bytes"]
+            elif self.statistics and self.statistics.get(table):
+                total_bytes += self._scanned_bytes(plan, self.statistics.get(table))
         
         # Estimate based on operations
         complexity_multiplier = 1.0
-        if "JOIN" in sql.upper():
+        if plan.joins:
             complexity_multiplier *= 1.5
-        if "GROUP BY" in sql.upper():
+        if plan.group_by:
             complexity_multiplier *= 1.2
-        if "DISTINCT" in sql.upper():
-            complexity_multiplier *= 1.3
         
         estimated_bytes = total_bytes * complexity_multiplier
         estimated_cost = (estimated_bytes / 1e12) * self.cost_per_tb
         
+        base = plan.base_table
+        group_by = [c.sql for c in plan.group_by if c.table == base] if plan.aggregates else None
         return {
             "estimated_bytes_scanned": estimated_bytes,
             "estimated_cost_usd": round(estimated_cost, 4),
-            "tables_accessed": tables,
+            "estimated_rows": self.estimate_cardinality(base, plan.filters_on(base), group_by),
+            "tables_accessed": list(plan.tables),
             "complexity_score": complexity_multiplier
         }
     
-    def _extract_tables(self, sql: str) -> List[str]:
-        """Extract table names from SQL."""
-        pattern = r'FROM\s+([\w.]+)|JOIN\s+([\w.]+)'
-        matches = re.findall(pattern, sql, re.IGNORECASE)
-        tables = [m[0] or m[1] for m in matches]
-        return list(set(tables))
+    @staticmethod
+    def _scanned_bytes(plan: QueryPlan, stats) -> int:
+        """Columnar warehouses read only the columns a query references."""
+        if not stats.columns:
+            return stats.size_bytes
+        referenced = set()
+        for expression in plan.columns_of(stats.table):
+            referenced |= {name for name in _IDENTIFIER.findall(expression) if name in stats.columns}
+        return int(stats.size_bytes * len(referenced) / len(stats.columns))
     
-    def suggest_optimizations(self, sql: str, cost: Dict) -> List[str]:
+    def selectivity(self, table: str, filters: Optional[Dict[str, Any]]) -> float:
+        """Fraction of `table`'s rows matching equality / IN `filters`, assuming independent columns."""
+        stats = self.statistics.get(table) if self.statistics else None
+        selectivity = 1.0
+        for column, value in (filters or {}).items():
+            profile = stats.columns.get(column.rpartition(".")[2]) if stats else None
+            if profile is None or not profile.ndv:
+                selectivity *= DEFAULT_SELECTIVITY
+                continue
+            values = value if isinstance(value, list) else [value]
+            in_range = [v for v in values if self._within(profile, v)]
+            # Equality never matches NULLs; values outside [min, max] match nothing
+            selectivity *= min(len(in_range) / profile.ndv, 1.0) * (1 - profile.null_fraction)
+        return selectivity
+    
+    @staticmethod
+    def _within(profile, value) -> bool:
+        try:
+            return ((profile.min is None or value >= profile.min)
+                    and (profile.max is None or value <= profile.max))
+        except TypeError:
+            return True
+    
+    def estimate_cardinality(self, table: str, filters: Optional[Dict[str, Any]] = None,
+                             group_by: Optional[List[str]] = None) -> Optional[int]:
+        """Estimated output rows; `group_by=None` means no aggregation, `[]` a single aggregate row.
+        
+        Returns None when `table` has no statistics.
+        """
+        stats = self.statistics.get(table) if self.statistics else None
+        if stats is None:
+            return None
+        rows = stats.row_count * self.selectivity(table, filters)
+        if group_by is None:
+            return int(round(rows))
+        groups = 1
+        for column in group_by:
+            profile = stats.columns.get(column.rpartition(".")[2])
+            # Unknown grouping columns are assumed not to reduce the row count
+            groups *= profile.ndv if profile and profile.ndv else stats.row_count
+        return max(int(round(min(rows, groups))), 1)
+    
+    def suggest_optimizations(self, plan: QueryPlan, cost: Dict) -> List[str]:
         """Suggest query optimizations to reduce cost."""
         suggestions = []
         
         if cost["estimated_cost_usd"] > 1.0:
             suggestions.append("Consider materializing this query for reuse")
         
-        if "SELECT *" in sql:
-            suggestions.append("Select only required columns instead of SELECT *")
+        if not plan.filters and cost["estimated_bytes_scanned"] > 1e9:
+            suggestions.append("Query scans entire tables - add filters or a date range")
         
         if cost["complexity_score"] > 2.0:
             suggestions.append("Query is complex - consider breaking into CTEs")
         
         return suggestions
+    
+    def get_stats(self) -> Dict:
+        return {"memoized_plans": len(self._memo), "memo_hits": self.memo_hits, "memo_misses": self.memo_misses}
@@ -1,7 +1,255 @@
-class QueryExplain:
-    def explain(self, sql: str) -> dict:
+import hashlib
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+# Operator flags
+FULL_SCAN = "full_scan"
+EXPLODING_JOIN = "exploding_join"
+SPILLING = "spilling"
+MISESTIMATE = "misestimate"
+HOT = "hot"
+
+
+@dataclass
+class PlanNode:
+    operator: str
+    estimated_rows: Optional[float] = None
+    actual_rows: Optional[float] = None
+    time_ms: Optional[float] = None  # Time spent in this operator alone
+    rows_scanned: Optional[float] = None  # Rows read from storage, after zone-map/index pruning
+    table: Optional[str] = None
+    filter: Optional[str] = None
+    spilled: bool = False
+    details: Dict[str, Any] = field(default_factory=dict)
+    children: List["PlanNode"] = field(default_factory=list)
+    flags: List[str] = field(default_factory=list)
+
+    @property
+    def rows(self) -> Optional[float]:
+        return self.actual_rows if self.actual_rows is not None else self.estimated_rows
+
+    @property
+    def kind(self) -> str:
+        name = self.operator.upper()
+        if "SCAN" in name:
+            return "scan"
+        if "JOIN" in name or "NESTED LOOP" in name:
+            return "join"
+        if "AGGREGATE" in name or "GROUP_BY" in name:
+            return "aggregate"
+        if "SORT" in name or "ORDER_BY" in name or "TOP_N" in name:
+            return "sort"
+        return "other"
+
+    def walk(self) -> Iterator["PlanNode"]:
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def to_dict(self) -> Dict:
+        return {
+            "operator": self.operator,
+            "estimated_rows": self.estimated_rows,
+            "actual_rows": self.actual_rows,
+            "time_ms": self.time_ms,
+            "rows_scanned": self.rows_scanned,
+            "table": self.table,
+            "filter": self.filter,
+            "spilled": self.spilled,
+            "flags": list(self.flags),
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+@dataclass
+class ExplainResult:
+    sql: str
+    fingerprint: str
+    analyzed: bool
+    root: PlanNode
+
+    @property
+    def total_ms(self) -> Optional[float]:
+        times = [node.time_ms for node in self.root.walk() if node.time_ms is not None]
+        return sum(times) if times else None
+
+    @property
+    def rows_scanned(self) -> Optional[float]:
+        scanned = [node.rows_scanned for node in self.root.walk() if node.rows_scanned is not None]
+        return sum(scanned) if scanned else None
+
+    @property
+    def hot_operators(self) -> List[PlanNode]:
+        return [node for node in self.root.walk() if node.flags]
+
+    def to_dict(self) -> Dict:
         return {
-            "plan": "Sequential Scan",
-            "estimated_rows": 1000,
-            "estimated_cost": 100.0
+            "fingerprint": self.fingerprint,
+            "analyzed": self.analyzed,
+            "total_ms": self.total_ms,
+            "rows_scanned": self.rows_scanned,
+            "plan": self.root.to_dict(),
+            "hot_operators": [
+                {"operator": n.operator, "table": n.table, "flags": list(n.flags)} for n in self.hot_operators
+            ],
         }
+
+
+def _number(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_duckdb_plan(data: Any) -> PlanNode:
+    """Parse DuckDB's `EXPLAIN (FORMAT JSON)` list or `EXPLAIN (ANALYZE, FORMAT JSON)` profile."""
+    if isinstance(data, list):
+        data = data[0]
+    # Temp-directory use is only reported for the whole query, on the profile's root;
+    # the per-operator copies of the metric are always zero
+    spilled_bytes = _number(data.get("system_peak_temp_dir_size")) or 0
+    # The analyzed profile wraps the plan in query-level metrics and an EXPLAIN_ANALYZE operator
+    while ("operator_name" not in data and "name" not in data) or data.get("operator_name") == "EXPLAIN_ANALYZE":
+        data = data["children"][0]
+    root = _parse_duckdb_node(data)
+    if spilled_bytes:
+        # Only the blocking operators (sorts, aggregates, joins) can have written it
+        blocking = [node for node in root.walk() if node.kind in ("sort", "aggregate", "join")]
+        for node in blocking or [root]:
+            node.spilled = True
+    return root
+
+
+def _parse_duckdb_node(data: Dict) -> PlanNode:
+    info = data.get("extra_info") or {}
+    analyzed = "operator_name" in data
+    node = PlanNode(
+        operator=data["operator_name"] if analyzed else data["name"],
+        estimated_rows=_number(info.get("Estimated Cardinality")),
+        actual_rows=_number(data.get("operator_cardinality")) if analyzed else None,
+        time_ms=data["operator_timing"] * 1000 if analyzed and "operator_timing" in data else None,
+        rows_scanned=_number(data.get("operator_rows_scanned")) if analyzed else None,
+        table=info.get("Table"),
+        filter=info.get("Filters") or None,
+        details=info,
+    )
+    node.children = [_parse_duckdb_node(child) for child in data.get("children", [])]
+    return node
+
+
+def parse_postgres_plan(data: Any) -> PlanNode:
+    """Parse Postgres `EXPLAIN (FORMAT JSON[, ANALYZE])` output."""
+    if isinstance(data, list):
+        data = data[0]
+    plan = data.get("Plan", data)
+    loops = plan.get("Actual Loops", 1) or 1
+    children = [parse_postgres_plan(child) for child in plan.get("Plans", [])]
+    total_ms = plan.get("Actual Total Time")
+    if total_ms is not None:
+        # Postgres reports inclusive per-loop times; keep the operator's own share
+        inclusive = total_ms * loops
+        total_ms = max(inclusive - sum(_inclusive_ms(child) for child in plan.get("Plans", [])), 0.0)
+    operator = plan["Node Type"]
+    if operator == "Aggregate" and plan.get("Strategy") == "Hashed":
+        operator = "HashAggregate"
+    return PlanNode(
+        operator=operator,
+        estimated_rows=_number(plan.get("Plan Rows")),
+        actual_rows=plan["Actual Rows"] * loops if "Actual Rows" in plan else None,
+        time_ms=total_ms,
+        table=plan.get("Relation Name"),
+        filter=plan.get("Filter") or plan.get("Index Cond"),
+        spilled=(plan.get("Sort Space Type") == "Disk" or plan.get("HashAgg Batches", 1) > 1
+                 or plan.get("Hash Batches", 1) > 1 or bool(plan.get("Disk Usage"))),
+        details={k: v for k, v in plan.items() if k != "Plans"},
+        children=children,
+    )
+
+
+def _inclusive_ms(plan: Dict) -> float:
+    return (plan.get("Actual Total Time") or 0.0) * (plan.get("Actual Loops", 1) or 1)
+
+
+def parse_plan(data: Any) -> PlanNode:
+    first = data[0] if isinstance(data, list) and data else data
+    if isinstance(first, dict) and "Plan" in first:
+        return parse_postgres_plan(data)
+    if isinstance(first, dict) and ("name" in first or "children" in first):
+        return parse_duckdb_plan(data)
+    raise ValueError(f"Unrecognized plan format: {str(data)[:80]}")
+
+
+def fingerprint(sql: str) -> str:
+    """Identify a query shape: literals and whitespace are ignored."""
+    normalized = re.sub(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b", "?", sql)
+    normalized = re.sub(r"\s+", " ", normalized).strip().lower()
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+class QueryExplain:
+    """Run the adapter's EXPLAIN / EXPLAIN ANALYZE and flag expensive operators.
+
+    Plans from DuckDB and Postgres are parsed into a common `PlanNode`
+    tree. Operators are flagged as full scans (unfiltered sequential scans
+    of at least `full_scan_rows`), exploding joins (output more than
+    `explode_factor` times the larger input), spilling (sorts, aggregates
+    and hash joins that went to disk; DuckDB only reports temp-directory
+    use per query, so every blocking operator of a spilled query is
+    flagged), misestimates (actual rows off by
+    `misestimate_factor` or more) and hot (at least `hot_fraction` of the
+    analyzed run time). Flag counts are kept per query fingerprint.
+    """
+
+    def __init__(self, adapter, full_scan_rows: int = 10_000, explode_factor: float = 2.0,
+                 misestimate_factor: float = 10.0, hot_fraction: float = 0.5, min_rows: int = 1000):
+        self.adapter = adapter
+        self.full_scan_rows = full_scan_rows
+        self.explode_factor = explode_factor
+        self.misestimate_factor = misestimate_factor
+        self.hot_fraction = hot_fraction
+        self.min_rows = min_rows
+        self.hotspots: Dict[str, Counter] = {}
+        self._lock = threading.Lock()
+
+    def explain(self, sql: str, params: Optional[Sequence[Any]] = None, analyze: bool = False,
+                query_fingerprint: Optional[str] = None) -> ExplainResult:
+        root = parse_plan(self.adapter.explain(sql, params, analyze=analyze))
+        result = ExplainResult(sql=sql, fingerprint=query_fingerprint or fingerprint(sql),
+                               analyzed=analyze, root=root)
+        self._flag(result)
+        with self._lock:
+            counts = self.hotspots.setdefault(result.fingerprint, Counter())
+            for node in result.hot_operators:
+                counts.update(node.flags)
+        return result
+
+    def _flag(self, result: ExplainResult):
+        total_ms = result.total_ms
+        for node in result.root.walk():
+            rows = node.rows or 0
+            if (node.kind == "scan" and not node.filter and "SEQ" in node.operator.upper()
+                    and rows >= self.full_scan_rows):
+                node.flags.append(FULL_SCAN)
+            if node.kind == "join" and node.children and rows >= self.min_rows:
+                largest_input = max(child.rows or 0 for child in node.children)
+                if rows > self.explode_factor * max(largest_input, 1):
+                    node.flags.append(EXPLODING_JOIN)
+            if node.spilled:
+                node.flags.append(SPILLING)
+            if node.actual_rows is not None and node.estimated_rows is not None:
+                high = max(node.actual_rows, node.estimated_rows)
+                low = max(min(node.actual_rows, node.estimated_rows), 1)
+                if high >= self.min_rows and high / low >= self.misestimate_factor:
+                    node.flags.append(MISESTIMATE)
+            if total_ms and node.time_ms is not None and node.time_ms >= self.hot_fraction * total_ms:
+                node.flags.append(HOT)
+
+    def get_hotspots(self, query_fingerprint: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            if query_fingerprint is not None:
+                return {query_fingerprint: dict(self.hotspots.get(query_fingerprint, {}))}
+            return {fp: dict(counts) for fp, counts in self.hotspots.items()}
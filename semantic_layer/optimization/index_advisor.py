@@ -1,5 +1,352 @@
+import re
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from semantic_layer.compiler.plan import CompiledQuery, QueryPlan
+from .cost_estimator import DEFAULT_SELECTIVITY, CostEstimator
+from .explain import QueryExplain
+
+INDEX = "index"
+SORT_KEY = "sort_key"
+PARTITION = "partition"
+
+
+@dataclass
+class WorkloadQuery:
+    plan: QueryPlan
+    sql: Optional[str] = None
+    params: List[Any] = field(default_factory=list)
+    count: int = 0
+    seconds: float = 0.0  # Total recorded run time
+    timed: int = 0  # Runs with a recorded time
+
+
+@dataclass
+class Recommendation:
+    kind: str  # INDEX, SORT_KEY or PARTITION
+    table: str
+    columns: List[str]
+    queries: int  # Workload queries that benefit
+    estimated_benefit: float  # Share of the workload's cost saved
+    estimated_seconds_saved: Optional[float]
+    reason: str
+    what_if: Optional[Dict] = None
+
+    @property
+    def ddl(self) -> str:
+        columns = ", ".join(self.columns)
+        if self.kind == INDEX:
+            name = re.sub(r"\W", "_", f"idx_{self.table}_{'_'.join(self.columns)}")
+            return f"CREATE INDEX {name} ON {self.table} ({columns})"
+        if self.kind == SORT_KEY:
+            # Sorted storage lets DuckDB and Parquet readers skip row groups by min/max
+            return f"CREATE OR REPLACE TABLE {self.table} AS SELECT * FROM {self.table} ORDER BY {columns}"
+        return f"COPY {self.table} TO '{self.table}' (FORMAT parquet, PARTITION_BY ({columns}))"
+
+    def to_dict(self) -> Dict:
+        return {
+            "kind": self.kind,
+            "table": self.table,
+            "columns": list(self.columns),
+            "queries": self.queries,
+            "estimated_benefit": round(self.estimated_benefit, 4),
+            "estimated_seconds_saved": (
+                None if self.estimated_seconds_saved is None else round(self.estimated_seconds_saved, 3)
+            ),
+            "reason": self.reason,
+            "ddl": self.ddl,
+            "what_if": self.what_if,
+        }
+
+
 class IndexAdvisor:
-    def recommend_indexes(self, query_history: list) -> list:
+    """Recommend indexes, sort keys and partition keys from the recorded workload.
+
+    Every recorded query plan contributes its equality filters, join keys
+    and group-by sets, weighted by how often it ran and how long it took
+    (or, untimed, by its estimated scan size). A physical design's benefit
+    is the share of that weighted cost it would save, using selectivities
+    from the cost estimator's statistics catalog:
+
+    - an index pays off for predicates selecting at most
+      `max_index_selectivity` of a table, including the inner side of a
+      join whose outer side is filtered down that far;
+    - partitioning on a column with at most `max_partitions` values
+      prunes everything but the matching partitions;
+    - sorting on the most valuable remaining filter columns lets zone
+      maps skip row groups.
+
+    Plans keep their filter values, which the selectivities depend on, so
+    the workload holds at most `max_plans` of them and forgets the least
+    recently recorded first.
+
+    `what_if` replays the queries filtering or joining on a
+    recommendation's leading column against a local DuckDB copy of
+    the tables (sampled to `sample_rows` each) before and after applying
+    a recommendation and reports the measured change in rows scanned and
+    run time.
+    """
+
+    def __init__(self, estimator: Optional[CostEstimator] = None, min_frequency: int = 2,
+                 max_index_selectivity: float = 0.05, max_partitions: int = 1000, min_benefit: float = 0.01,
+                 max_plans: int = 10_000):
+        self.estimator = estimator
+        self.min_frequency = min_frequency
+        self.max_index_selectivity = max_index_selectivity
+        self.max_partitions = max_partitions
+        self.min_benefit = min_benefit
+        self.max_plans = max_plans
+        self.workload: "OrderedDict[QueryPlan, WorkloadQuery]" = OrderedDict()  # least recently recorded first
+        self.evicted_plans = 0
+
+    def record(self, query: Union[QueryPlan, CompiledQuery], seconds: Optional[float] = None):
+        plan = query.plan if isinstance(query, CompiledQuery) else query
+        entry = self.workload.get(plan)
+        if entry is None:
+            entry = self.workload[plan] = WorkloadQuery(plan=plan)
+            if len(self.workload) > self.max_plans:
+                self.workload.popitem(last=False)
+                self.evicted_plans += 1
+        else:
+            self.workload.move_to_end(plan)
+        if isinstance(query, CompiledQuery) and entry.sql is None:
+            entry.sql, entry.params = query.sql, list(query.params)
+        entry.count += 1
+        if seconds is not None:
+            entry.seconds += seconds
+            entry.timed += 1
+
+    def analyze_workload(self) -> Dict:
+        filters, join_keys, group_by_sets = Counter(), Counter(), Counter()
+        for entry in self.workload.values():
+            plan = entry.plan
+            filters.update({f"{f.column.table}.{f.column.sql}": entry.count for f in plan.filters})
+            for join in plan.joins:
+                join_keys.update({f"{l.table}.{l.sql} = {r.table}.{r.sql}": entry.count for l, r in join.keys})
+            if plan.group_by:
+                group_by_sets[tuple(f"{c.table}.{c.sql}" for c in plan.group_by)] += entry.count
+        return {
+            "queries": sum(e.count for e in self.workload.values()),
+            "distinct_plans": len(self.workload),
+            "evicted_plans": self.evicted_plans,
+            "seconds": round(sum(e.seconds for e in self.workload.values()), 3),
+            "filter_columns": dict(filters.most_common()),
+            "join_keys": dict(join_keys.most_common()),
+            "group_by_sets": [{"columns": list(k), "queries": v} for k, v in group_by_sets.most_common()],
+        }
+
+    def recommend_indexes(self, query_history: Optional[Iterable[Union[QueryPlan, CompiledQuery]]] = None
+                          ) -> List[Recommendation]:
+        for query in query_history or []:
+            self.record(query)
+        weights, timed = self._weights()
+        total = sum(weights.values())
+        if not total:
+            return []
+
+        candidates: Dict[Tuple[str, str, Tuple[str, ...]], List] = {}
+
+        def credit(kind, table, columns, entry, saved, reason):
+            slot = candidates.setdefault((kind, table, tuple(columns)), [0.0, 0, reason])
+            slot[0] += saved
+            slot[1] += entry.count
+
+        for entry in self.workload.values():
+            plan, weight = entry.plan, weights[entry.plan]
+            for table in plan.tables:
+                share = weight * self._table_share(plan, table)
+                filters = plan.filters_on(table)
+                for column, values in filters.items():
+                    selectivity = self._selectivity(table, {column: values})
+                    if selectivity <= self.max_index_selectivity:
+                        credit(INDEX, table, [column], entry, share * (1 - selectivity),
+                               f"equality filter selecting ~{selectivity:.2%} of rows")
+                    ndv = self._ndv(table, column)
+                    if ndv is not None and 2 <= ndv <= self.max_partitions:
+                        credit(PARTITION, table, [column], entry, share * (1 - selectivity),
+                               f"filtered column with {ndv} distinct values")
+                if len(filters) > 1:
+                    selectivity = self._selectivity(table, filters)
+                    if selectivity <= self.max_index_selectivity:
+                        columns = sorted(filters, key=lambda c: self._selectivity(table, {c: filters[c]}))
+                        credit(INDEX, table, columns, entry, share * (1 - selectivity),
+                               f"combined equality filters selecting ~{selectivity:.2%} of rows")
+            self._credit_join_keys(entry, weight, credit)
+
+        recommendations = [
+            Recommendation(kind=kind, table=table, columns=list(columns), queries=queries,
+                           estimated_benefit=saved / total,
+                           estimated_seconds_saved=saved if timed else None, reason=reason)
+            for (kind, table, columns), (saved, queries, reason) in candidates.items()
+        ]
+        partitions = self._best_per_table([r for r in recommendations if r.kind == PARTITION])
+        recommendations = [r for r in recommendations if r.kind == INDEX] + partitions
+        recommendations += self._sort_keys(weights, total, timed, {r.table: r.columns[0] for r in partitions})
+        recommendations = [
+            r for r in recommendations if r.queries >= self.min_frequency and r.estimated_benefit >= self.min_benefit
+        ]
+        return sorted(recommendations, key=lambda r: r.estimated_benefit, reverse=True)
+
+    def _credit_join_keys(self, entry: WorkloadQuery, weight: float, credit):
+        """Index the inner join key when the filtered outer side probes only a small part of it."""
+        plan = entry.plan
+        for join in plan.joins:
+            for outer, inner in join.keys:
+                outer_rows = self._row_count(outer.table)
+                inner_rows = self._row_count(inner.table)
+                if not outer_rows or not inner_rows:
+                    continue
+                probes = outer_rows * self._selectivity(outer.table, plan.filters_on(outer.table))
+                fraction = probes / inner_rows
+                if fraction <= self.max_index_selectivity:
+                    credit(INDEX, inner.table, [inner.sql], entry,
+                           weight * self._table_share(plan, inner.table) * (1 - fraction),
+                           f"join key probed for ~{fraction:.2%} of rows")
+
+    def _sort_keys(self, weights: Dict[QueryPlan, float], total: float, timed: bool,
+                   partitioned: Dict[str, str]) -> List[Recommendation]:
+        # Rank each table's filter columns by the cost they could prune, excluding partition keys
+        value: Dict[str, Counter] = {}
+        for plan, weight in weights.items():
+            for table in plan.tables:
+                for column, values in plan.filters_on(table).items():
+                    if partitioned.get(table) != column:
+                        saved = weight * self._table_share(plan, table) * (
+                            1 - self._selectivity(table, {column: values})
+                        )
+                        value.setdefault(table, Counter())[column] += saved
         recommendations = []
-        # Analyze query patterns
+        for table, columns in value.items():
+            key = [column for column, _ in columns.most_common(2)]
+            saved, queries = 0.0, 0
+            for plan, weight in weights.items():
+                filters = plan.filters_on(table)
+                if key[0] not in filters:
+                    continue  # Only a filter on the leading column prunes row groups
+                used = {c: filters[c] for c in key if c in filters}
+                saved += weight * self._table_share(plan, table) * (1 - self._selectivity(table, used))
+                queries += self.workload[plan].count
+            if saved:
+                recommendations.append(Recommendation(
+                    kind=SORT_KEY, table=table, columns=key, queries=queries, estimated_benefit=saved / total,
+                    estimated_seconds_saved=saved if timed else None,
+                    reason="sorted storage lets zone maps skip row groups for these filters",
+                ))
         return recommendations
+
+    @staticmethod
+    def _best_per_table(recommendations: List[Recommendation]) -> List[Recommendation]:
+        best: Dict[str, Recommendation] = {}
+        for r in recommendations:
+            if r.table not in best or r.estimated_benefit > best[r.table].estimated_benefit:
+                best[r.table] = r
+        return list(best.values())
+
+    def _weights(self) -> Tuple[Dict[QueryPlan, float], bool]:
+        """Cost of each plan in the workload: recorded seconds, else estimated scan bytes, else run count."""
+        timed_runs = sum(e.timed for e in self.workload.values())
+        if timed_runs:
+            mean = sum(e.seconds for e in self.workload.values()) / timed_runs
+            return {p: e.seconds + (e.count - e.timed) * mean for p, e in self.workload.items()}, True
+        weights = {}
+        for plan, entry in self.workload.items():
+            scanned = self.estimator.estimate_cost(plan)["estimated_bytes_scanned"] if self.estimator else 0
+            weights[plan] = entry.count * (scanned or 1)
+        return weights, False
+
+    def _table_share(self, plan: QueryPlan, table: str) -> float:
+        sizes = {t: self._size(t) for t in plan.tables}
+        if all(sizes.values()):
+            return sizes[table] / sum(sizes.values())
+        return 1 / len(plan.tables)
+
+    def _stats(self, table: str):
+        catalog = self.estimator.statistics if self.estimator else None
+        return catalog.get(table) if catalog else None
+
+    def _size(self, table: str) -> int:
+        stats = self._stats(table)
+        return stats.size_bytes if stats else 0
+
+    def _row_count(self, table: str) -> int:
+        stats = self._stats(table)
+        return stats.row_count if stats else 0
+
+    def _ndv(self, table: str, column: str) -> Optional[int]:
+        stats = self._stats(table)
+        profile = stats.columns.get(column) if stats else None
+        return profile.ndv if profile else None
+
+    def _selectivity(self, table: str, filters: Dict[str, List[Any]]) -> float:
+        if self.estimator is not None:
+            return self.estimator.selectivity(table, filters)
+        return DEFAULT_SELECTIVITY ** len(filters)
+
+    def what_if(self, recommendation: Recommendation, adapter, sample_rows: Optional[int] = 100_000) -> Dict:
+        """Measure `recommendation` by replaying the affected workload on a local DuckDB copy.
+
+        Tables are copied through `adapter`, sampled to `sample_rows`
+        (None copies them whole). Partitioning is approximated by clustering the copy on the
+        partition key, which prunes the same data through zone maps.
+        """
+        from semantic_layer.connectors.duckdb import DuckDBAdapter
+
+        queries = [e for e in self.workload.values() if e.sql and self._affects(recommendation, e.plan)]
+        result = {"queries": len(queries), "confirmed": False}
+        if not queries:
+            recommendation.what_if = result
+            return result
+
+        local = DuckDBAdapter()
+        local.connect({"database": ":memory:"})
+        for table in sorted({t for e in queries for t in e.plan.tables}):
+            self._copy_table(adapter, local, table, sample_rows)
+        explain = QueryExplain(local)
+        before = self._replay(explain, queries)
+        ddl = recommendation.ddl
+        if recommendation.kind == PARTITION:
+            ddl = Recommendation(SORT_KEY, recommendation.table, recommendation.columns, 0, 0.0, None, "").ddl
+        local.execute_query(ddl)
+        after = self._replay(explain, queries)
+        local.conn.close()
+
+        result.update({
+            "rows_scanned_before": before[0],
+            "rows_scanned_after": after[0],
+            "scan_reduction": 1 - after[0] / before[0] if before[0] else 0.0,
+            "ms_before": round(before[1], 3),
+            "ms_after": round(after[1], 3),
+        })
+        result["confirmed"] = result["scan_reduction"] > 0
+        recommendation.what_if = result
+        return result
+
+    @staticmethod
+    def _affects(recommendation: Recommendation, plan: QueryPlan) -> bool:
+        """Whether `plan` filters or joins on the recommendation's leading column."""
+        column = recommendation.columns[0]
+        if column in plan.filters_on(recommendation.table):
+            return True
+        return any(inner.table == recommendation.table and inner.sql == column
+                   for join in plan.joins for _, inner in join.keys)
+
+    @staticmethod
+    def _copy_table(adapter, local, table: str, sample_rows: Optional[int]):
+        sql = adapter.sample_table_sql(table, sample_rows) if sample_rows else f"SELECT * FROM {table}"
+        df = adapter.execute_query(sql)
+        schema, _, _ = table.rpartition(".")
+        if schema:
+            local.execute_query(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+        local.conn.register("__what_if_source", df)
+        local.execute_query(f"CREATE TABLE {table} AS SELECT * FROM __what_if_source")
+        local.conn.unregister("__what_if_source")
+
+    @staticmethod
+    def _replay(explain: QueryExplain, queries: List[WorkloadQuery]) -> Tuple[float, float]:
+        rows_scanned, elapsed_ms = 0.0, 0.0
+        for entry in queries:
+            result = explain.explain(entry.sql, entry.params, analyze=True)
+            rows_scanned += (result.rows_scanned or 0) * entry.count
+            elapsed_ms += (result.total_ms or 0) * entry.count
+        return rows_scanned, elapsed_ms
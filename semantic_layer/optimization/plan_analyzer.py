@@ -1,7 +1,29 @@
+from typing import Optional
+
+from semantic_layer.compiler.plan import QueryPlan
+from .cost_estimator import CostEstimator
+
 class QueryPlanAnalyzer:
-    def analyze(self, sql: str) -> dict:
-        return {
-            "tables": [],
-            "joins": [],
-            "filters": []
+    """Summarize a compiled query's plan, optionally with its cost estimate."""
+    
+    def __init__(self, estimator: Optional[CostEstimator] = None):
+        self.estimator = estimator
+    
+    def analyze(self, plan: QueryPlan) -> dict:
+        analysis = {
+            "tables": list(plan.tables),
+            "joins": [
+                {"table": j.table, "type": j.type, "on": j.on,
+                 "keys": [(f"{l.table}.{l.sql}", f"{r.table}.{r.sql}") for l, r in j.keys]}
+                for j in plan.joins
+            ],
+            "filters": [
+                {"table": f.column.table, "column": f.column.sql, "values": list(f.values)} for f in plan.filters
+            ],
+            "group_by": [f"{c.table}.{c.sql}" for c in plan.group_by],
+            "grains": dict(plan.grains),
+            "columns": [f"{c.table}.{c.sql}" for c in plan.columns],
         }
+        if self.estimator is not None:
+            analysis["cost"] = self.estimator.estimate_cost(plan)
+        return analysis
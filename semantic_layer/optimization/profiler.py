@@ -1,33 +1,237 @@
+import threading
 import time
+from collections import OrderedDict, deque
 from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+# Stages of answering a query, in order: the executor stores results in the cache
+# (cache_store) and the API encodes the response (serialize)
+STAGES = ("canonicalize", "cache_lookup", "compile", "execute", "fetch", "cache_store", "serialize")
+
+
+class LatencyHistogram:
+    """Fixed-memory, HDR-style latency histogram.
+
+    Values are recorded in microseconds into log-linear buckets: each
+    power-of-two range is split into 2**(sub_bucket_bits - 1) linear
+    sub-buckets, so every recorded value is known to within
+    1 / 2**(sub_bucket_bits - 1) (under 2% by default) from 1us up to
+    `max_ms`. Larger values are clamped; the exact maximum is kept apart.
+    Fewer sub-bucket bits and a narrower `dtype` trade precision and
+    headroom for memory when many histograms are kept.
+    """
+
+    def __init__(self, max_ms: float = 3_600_000, sub_bucket_bits: int = 7, dtype=np.int64):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.half = 1 << (sub_bucket_bits - 1)
+        self.max_value = int(max_ms * 1000)
+        self.counts = np.zeros(self._index(self.max_value) + 1, dtype=dtype)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.min_ms = float("inf")
+        self.max_ms = 0.0
+
+    def _index(self, value: int) -> int:
+        bucket = max(value.bit_length() - self.sub_bucket_bits, 0)
+        return bucket * self.half + (value >> bucket)
+
+    def _value_at(self, index: int) -> int:
+        """Highest value that lands in bucket `index`."""
+        bucket = max(index // self.half - 1, 0)
+        sub = index - bucket * self.half
+        return ((sub + 1) << bucket) - 1
+
+    def record(self, duration_ms: float):
+        value = min(max(int(duration_ms * 1000), 0), self.max_value)
+        self.counts[self._index(value)] += 1
+        self.total += 1
+        self.sum_ms += duration_ms
+        self.min_ms = min(self.min_ms, duration_ms)
+        self.max_ms = max(self.max_ms, duration_ms)
+
+    def percentile(self, p: float) -> float:
+        if not self.total:
+            return 0.0
+        rank = max(int(np.ceil(p / 100 * self.total)), 1)
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(self._value_at(index) / 1000, self.max_ms)
+
+    def merge(self, other: "LatencyHistogram"):
+        if (other.sub_bucket_bits, other.max_value) != (self.sub_bucket_bits, self.max_value):
+            raise ValueError("Cannot merge histograms with different bucket layouts")
+        self.counts += other.counts
+        self.total += other.total
+        self.sum_ms += other.sum_ms
+        self.min_ms = min(self.min_ms, other.min_ms)
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def summary(self) -> Dict:
+        if not self.total:
+            return {"count": 0}
+        return {
+            "count": self.total,
+            "avg_ms": round(self.sum_ms / self.total, 3),
+            "min_ms": round(self.min_ms, 3),
+            "p50_ms": round(self.percentile(50), 3),
+            "p95_ms": round(self.percentile(95), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+class QueryTimer:
+    """Timings of one query, filled in stage by stage."""
+
+    def __init__(self, profiler: "QueryProfiler", query_id: Optional[str]):
+        self.profiler = profiler
+        self.query_id = query_id
+        self.fingerprint: Optional[str] = None
+        self.stages: Dict[str, float] = {}
 
-class QueryProfiler:
-    def __init__(self):
-        self.profiles = []
-    
     @contextmanager
-    def profile(self, query_id: str):
-        start = time.time()
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
         try:
             yield
         finally:
-            duration = time.time() - start
-            self.profiles.append({
-                "query_id": query_id,
-                "duration_ms": duration * 1000,
-                "timestamp": time.time()
-            })
-    
-    def get_slow_queries(self, threshold_ms: float = 1000):
-        return [p for p in self.profiles if p["duration_ms"] > threshold_ms]
-    
-    def get_stats(self):
-        if not self.profiles:
-            return {}
-        durations = [p["duration_ms"] for p in self.profiles]
-        return {
-            "avg_ms": sum(durations) / len(durations),
-            "max_ms": max(durations),
-            "min_ms": min(durations),
-            "total_queries": len(self.profiles)
-        }
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name: str, duration_ms: float):
+        self.stages[name] = self.stages.get(name, 0.0) + duration_ms
+
+
+_current: ContextVar[Optional[QueryTimer]] = ContextVar("current_query_timer", default=None)
+
+
+def current_timer() -> Optional[QueryTimer]:
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time `name` within the query being profiled in this context; a no-op when none is."""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    with timer.stage(name):
+        yield
+
+
+class QueryProfiler:
+    """Per-fingerprint latency histograms with a per-stage breakdown.
+
+    Memory is bounded: each fingerprint keeps one `LatencyHistogram` for
+    the whole query and one per stage it has gone through, at
+    `fingerprint_sub_bucket_bits` precision with 32-bit counts (~1.9 KB
+    each at the defaults, against ~14 KB for the full-precision overall
+    histogram); at most `max_fingerprints` fingerprints are kept (least
+    recently seen dropped first), and only the last `slow_samples`
+    queries slower than `slow_threshold_ms` are kept individually, with
+    their stage timings.
+
+    Code running inside `profile()` marks stages with the module-level
+    `stage(name)`; nested `profile()` calls join the enclosing query.
+    """
+
+    def __init__(self, slow_threshold_ms: float = 1000, slow_samples: int = 100,
+                 max_fingerprints: int = 500, max_ms: float = 3_600_000, fingerprint_sub_bucket_bits: int = 5):
+        self.slow_threshold_ms = slow_threshold_ms
+        self.max_fingerprints = max_fingerprints
+        self.max_ms = max_ms
+        self.fingerprint_sub_bucket_bits = fingerprint_sub_bucket_bits
+        self.overall = LatencyHistogram(max_ms)
+        self.fingerprints: "OrderedDict[str, Dict[str, LatencyHistogram]]" = OrderedDict()
+        self.slow_queries = deque(maxlen=slow_samples)
+        self.evicted_fingerprints = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profile(self, query_id: Optional[str] = None) -> Iterator[QueryTimer]:
+        current = _current.get()
+        if current is not None and current.profiler is self:
+            current.query_id = current.query_id or query_id
+            yield current
+            return
+        timer = QueryTimer(self, query_id)
+        token = _current.set(timer)
+        start = time.perf_counter()
+        try:
+            yield timer
+        finally:
+            _current.reset(token)
+            self.record(timer.fingerprint or timer.query_id or "unknown",
+                        (time.perf_counter() - start) * 1000, timer.stages, timer.query_id)
+
+    def record(self, fingerprint: str, duration_ms: float, stages: Optional[Dict[str, float]] = None,
+               query_id: Optional[str] = None):
+        stages = stages or {}
+        with self._lock:
+            histograms = self.fingerprints.get(fingerprint)
+            if histograms is None:
+                histograms = self.fingerprints[fingerprint] = {"total": self._histogram()}
+                if len(self.fingerprints) > self.max_fingerprints:
+                    self.fingerprints.popitem(last=False)
+                    self.evicted_fingerprints += 1
+            else:
+                self.fingerprints.move_to_end(fingerprint)
+            histograms["total"].record(duration_ms)
+            for name, stage_ms in stages.items():
+                histogram = histograms.get(name)
+                if histogram is None:
+                    histogram = histograms[name] = self._histogram()
+                histogram.record(stage_ms)
+            self.overall.record(duration_ms)
+            if duration_ms > self.slow_threshold_ms:
+                self.slow_queries.append({
+                    "query_id": query_id,
+                    "fingerprint": fingerprint,
+                    "duration_ms": duration_ms,
+                    "stages": {name: round(ms, 3) for name, ms in stages.items()},
+                    "timestamp": time.time(),
+                })
+
+    def _histogram(self, dtype=np.int32) -> LatencyHistogram:
+        return LatencyHistogram(self.max_ms, self.fingerprint_sub_bucket_bits, dtype)
+
+    def get_slow_queries(self, threshold_ms: Optional[float] = None) -> List[Dict]:
+        """Recent slow queries, newest last; only those kept in the ring buffer."""
+        threshold_ms = self.slow_threshold_ms if threshold_ms is None else threshold_ms
+        with self._lock:
+            return [q for q in self.slow_queries if q["duration_ms"] > threshold_ms]
+
+    def get_fingerprint_stats(self, fingerprint: str) -> Dict:
+        with self._lock:
+            histograms = self.fingerprints.get(fingerprint)
+            if histograms is None:
+                return {}
+            return {
+                **histograms["total"].summary(),
+                "stages": {name: histograms[name].summary() for name in _ordered_stages(histograms)},
+            }
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            if not self.overall.total:
+                return {}
+            stages: Dict[str, LatencyHistogram] = {}
+            for histograms in self.fingerprints.values():
+                for name in _ordered_stages(histograms):
+                    stages.setdefault(name, self._histogram(np.int64)).merge(histograms[name])
+            summary = self.overall.summary()
+            return {
+                **summary,
+                "total_queries": summary["count"],
+                "fingerprints": len(self.fingerprints),
+                "evicted_fingerprints": self.evicted_fingerprints,
+                "slow_queries": len(self.slow_queries),
+                "stages": {name: h.summary() for name, h in stages.items()},
+            }
+
+
+def _ordered_stages(histograms: Dict[str, LatencyHistogram]) -> List[str]:
+    known = [name for name in STAGES if name in histograms]
+    return known + sorted(name for name in histograms if name != "total" and name not in STAGES)
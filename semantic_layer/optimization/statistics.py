@@ -0,0 +1,288 @@
+import base64
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class HyperLogLog:
+    """Distinct-count sketch: 2**precision one-byte registers, ~1.04/sqrt(m) error.
+
+    Values are hashed and registered in one vectorized pass; sketches of
+    the same precision merge by taking the register-wise maximum, which
+    is what makes incremental statistics refreshes possible.
+    """
+
+    def __init__(self, precision: int = 12, registers: Optional[np.ndarray] = None):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = registers if registers is not None else np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, values: Iterable[Any]):
+        series = values if isinstance(values, pd.Series) else pd.Series(list(values))
+        series = series.dropna()
+        if series.empty:
+            return
+        hashes = pd.util.hash_pandas_object(series, index=False).to_numpy(dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.precision)) - 1)
+        # frexp's exponent is the bit length; exact since rest < 2**53
+        _, bit_length = np.frexp(rest.astype(np.float64))
+        rank = (64 - self.precision - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog"):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLogs of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * np.log(self.m / zeros)  # Linear counting for small cardinalities
+        return int(round(estimate))
+
+    def to_dict(self) -> Dict:
+        return {"precision": self.precision, "registers": base64.b64encode(self.registers.tobytes()).decode()}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "HyperLogLog":
+        registers = np.frombuffer(base64.b64decode(data["registers"]), dtype=np.uint8).copy()
+        return cls(precision=data["precision"], registers=registers)
+
+
+@dataclass
+class ColumnProfile:
+    name: str
+    ndv: int = 0
+    null_fraction: float = 0.0
+    min: Any = None
+    max: Any = None
+    sketch: Optional[HyperLogLog] = None
+
+    def to_dict(self) -> Dict:
+        data = {k: v for k, v in asdict(self).items() if k != "sketch"}
+        data["sketch"] = self.sketch.to_dict() if self.sketch else None
+        return data
+
+
+@dataclass
+class TableStatistics:
+    table: str
+    row_count: int = 0
+    size_bytes: int = 0
+    columns: Dict[str, ColumnProfile] = field(default_factory=dict)
+    watermark: Any = None
+    updated_at_column: Optional[str] = None
+    high_watermark: Any = None  # max(updated_at_column) covered by the sketches
+    sampled: bool = False
+    collected_at: float = 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "table": self.table,
+            "row_count": self.row_count,
+            "size_bytes": self.size_bytes,
+            "columns": {name: col.to_dict() for name, col in self.columns.items()},
+            "watermark": self.watermark,
+            "updated_at_column": self.updated_at_column,
+            "high_watermark": self.high_watermark,
+            "sampled": self.sampled,
+            "collected_at": self.collected_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "TableStatistics":
+        columns = {}
+        for name, col in data["columns"].items():
+            sketch = HyperLogLog.from_dict(col.pop("sketch")) if col.get("sketch") else None
+            columns[name] = ColumnProfile(sketch=sketch, **{k: v for k, v in col.items() if k != "sketch"})
+        data = dict(data, columns=columns)
+        # JSON turns tuples into lists; watermarks are compared as tuples
+        if isinstance(data.get("watermark"), list):
+            data["watermark"] = _as_tuple(data["watermark"])
+        return cls(**data)
+
+
+def _as_tuple(value):
+    return tuple(_as_tuple(v) for v in value) if isinstance(value, list) else value
+
+
+def _json_default(value):
+    if isinstance(value, (np.integer, np.floating, np.bool_)):
+        return value.item()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+class StatisticsCatalog:
+    """Table and column statistics gathered through a data source adapter.
+
+    `collect` reads the table's watermark first and does nothing if it
+    has not moved. Tables with at most `sample_rows` rows are scanned
+    fully; larger ones are sampled and NDV is extrapolated from the
+    sample's frequency profile. With an updated-at column, a refresh
+    scans only rows newer than the last collection and merges them into
+    the stored sketches. Updated rows only add to the sketches: the
+    values they replaced still count towards NDV and min/max, and the
+    null fraction assumes the replaced versions matched the table's, so
+    these drift until the next full collection. The catalog is
+    persisted as JSON at `path`.
+    """
+
+    def __init__(self, adapter, path: Optional[str] = None, sample_rows: int = 100_000, precision: int = 12):
+        self.adapter = adapter
+        self.path = path
+        self.sample_rows = sample_rows
+        self.precision = precision
+        self.tables: Dict[str, TableStatistics] = {}
+        self.full_collections = 0
+        self.incremental_collections = 0
+        self.skipped_collections = 0
+        self.version = 0  # Bumped whenever any table's statistics change
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.tables = {name: TableStatistics.from_dict(data) for name, data in json.load(f).items()}
+
+    def get(self, table: str) -> Optional[TableStatistics]:
+        return self.tables.get(table)
+
+    def collect_model(self, model, updated_at_columns: Optional[Dict[str, str]] = None) -> List[TableStatistics]:
+        updated_at_columns = updated_at_columns or {}
+        return [self.collect(t.sql_table_name, updated_at_columns.get(t.sql_table_name)) for t in model.tables]
+
+    def collect(self, table: str, updated_at_column: Optional[str] = None) -> TableStatistics:
+        watermark = self.adapter.get_table_watermark(table, updated_at_column)
+        if watermark is not None:
+            watermark = _as_tuple(json.loads(json.dumps(list(watermark), default=_json_default)))
+        current = self.tables.get(table)
+        if current is not None and watermark is not None and current.watermark == watermark:
+            self.skipped_collections += 1
+            return current
+
+        if (current is not None and updated_at_column and current.updated_at_column == updated_at_column
+                and current.high_watermark is not None):
+            stats = self._collect_incremental(table, current, updated_at_column)
+            self.incremental_collections += 1
+        else:
+            stats = self._collect_full(table, updated_at_column)
+            self.full_collections += 1
+        stats.watermark = watermark
+        stats.collected_at = time.time()
+        with self._lock:
+            self.tables[table] = stats
+            self.version += 1
+        self.save()
+        return stats
+
+    def _row_count(self, table: str) -> int:
+        return int(self.adapter.execute_query(f"SELECT count(*) AS n FROM {table}").iloc[0, 0])
+
+    def _collect_full(self, table: str, updated_at_column: Optional[str]) -> TableStatistics:
+        row_count = self._row_count(table)
+        sampled = row_count > self.sample_rows
+        if sampled:
+            df = self.adapter.execute_query(self.adapter.sample_table_sql(table, self.sample_rows))
+        else:
+            df = self.adapter.execute_query(f"SELECT * FROM {table}")
+        stats = TableStatistics(table=table, row_count=row_count, updated_at_column=updated_at_column,
+                                sampled=sampled)
+        row_bytes = df.memory_usage(deep=True, index=False).sum() / len(df) if len(df) else 0
+        stats.size_bytes = int(row_bytes * row_count)
+        for name in df.columns:
+            column = df[name]
+            profile = ColumnProfile(name=name, sketch=HyperLogLog(self.precision))
+            profile.sketch.add(column)
+            non_null = column.dropna()
+            profile.null_fraction = 1 - len(non_null) / len(column) if len(column) else 0.0
+            if len(non_null):
+                profile.min, profile.max = _extremes(non_null)
+            profile.ndv = self._estimate_ndv(non_null, profile.sketch, row_count, sampled)
+            stats.columns[name] = profile
+        if updated_at_column and updated_at_column in df.columns and not sampled:
+            stats.high_watermark = _scalar(df[updated_at_column].max())
+        return stats
+
+    @staticmethod
+    def _estimate_ndv(values: pd.Series, sketch: HyperLogLog, row_count: int, sampled: bool) -> int:
+        if not sampled or values.empty:
+            return sketch.count()
+        # GEE estimator: values seen once in the sample stand for sqrt(N/n) values in the table
+        frequencies = values.value_counts(sort=False)
+        singletons = int((frequencies == 1).sum())
+        if singletons == len(values):
+            return row_count  # No value repeats in the sample: treat the column as unique
+        repeated = len(frequencies) - singletons
+        estimate = np.sqrt(row_count / len(values)) * singletons + repeated
+        return int(min(max(estimate, len(frequencies)), row_count))
+
+    def _collect_incremental(self, table: str, current: TableStatistics,
+                             updated_at_column: str) -> TableStatistics:
+        delta = self.adapter.execute_query(
+            f"SELECT * FROM {table} WHERE {updated_at_column} > $1", [current.high_watermark]
+        )
+        previous_rows = current.row_count
+        row_count = self._row_count(table)
+        stats = TableStatistics(table=table, row_count=row_count, updated_at_column=updated_at_column,
+                                sampled=current.sampled, high_watermark=current.high_watermark)
+        stats.size_bytes = int(current.size_bytes / previous_rows * row_count) if previous_rows else 0
+        for name, old in current.columns.items():
+            profile = ColumnProfile(name=name, ndv=old.ndv, null_fraction=old.null_fraction,
+                                    min=old.min, max=old.max, sketch=old.sketch)
+            if name in delta.columns and len(delta):
+                column = delta[name]
+                profile.sketch = profile.sketch or HyperLogLog(self.precision)
+                profile.sketch.add(column)
+                non_null = column.dropna()
+                # The delta holds updated rows as well as new ones; rows outside it keep the old fraction
+                nulls = old.null_fraction * max(row_count - len(column), 0) + (len(column) - len(non_null))
+                profile.null_fraction = min(nulls / row_count, 1.0) if row_count else 0.0
+                if len(non_null):
+                    lo, hi = _extremes(non_null)
+                    profile.min = lo if old.min is None else min(old.min, lo)
+                    profile.max = hi if old.max is None else max(old.max, hi)
+                profile.ndv = min(max(old.ndv, profile.sketch.count()), row_count)
+            stats.columns[name] = profile
+        if len(delta):
+            stats.high_watermark = _scalar(delta[updated_at_column].max())
+        return stats
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {name: stats.to_dict() for name, stats in self.tables.items()}
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, default=_json_default)
+        os.replace(tmp, self.path)
+
+    def get_stats(self) -> Dict:
+        return {
+            "tables": len(self.tables),
+            "full_collections": self.full_collections,
+            "incremental_collections": self.incremental_collections,
+            "skipped_collections": self.skipped_collections,
+        }
+
+
+def _scalar(value):
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _extremes(values: pd.Series):
+    try:
+        return _scalar(values.min()), _scalar(values.max())
+    except TypeError:  # Mixed, unorderable types
+        return None, None
@@ -0,0 +1,145 @@
+import socketserver
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from semantic_layer.cache.resp import RespError, read_reply
+
+
+class _Store:
+    def __init__(self):
+        self.strings: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.sets: Dict[bytes, Set[bytes]] = {}
+        self.set_expiry: Dict[bytes, float] = {}
+        self.lock = threading.Lock()
+
+    def _live_set(self, key: bytes) -> Optional[Set[bytes]]:
+        expires_at = self.set_expiry.get(key)
+        if expires_at is not None and time.time() >= expires_at:
+            self.sets.pop(key, None)
+            del self.set_expiry[key]
+        return self.sets.get(key)
+
+    def expires_at(self, key: bytes) -> Tuple[bool, Optional[float]]:
+        """(exists, expiry) of a string or set key."""
+        if self._live(key) is not None:
+            return True, self.strings[key][1]
+        if self._live_set(key) is not None:
+            return True, self.set_expiry.get(key)
+        return False, None
+
+    def _live(self, key: bytes) -> Optional[bytes]:
+        entry = self.strings.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and time.time() >= expires_at:
+            del self.strings[key]
+            return None
+        return value
+
+
+def _bulk(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                command = read_reply(self.rfile)
+            except (ConnectionError, RespError):
+                return
+            self.wfile.write(self.server.dispatch(command))
+            self.wfile.flush()
+
+
+class LocalRedisServer(socketserver.ThreadingTCPServer):
+    """In-process stand-in for a Redis server, for tests and local runs.
+
+    Implements the handful of commands the cache tiers use: PING, GET,
+    SET (EX/PX), DEL, PTTL, PEXPIRE, SADD, SMEMBERS, DBSIZE and FLUSHDB.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.store = _Store()
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> "LocalRedisServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def dispatch(self, command) -> bytes:
+        name, args = command[0].upper(), command[1:]
+        store = self.store
+        with store.lock:
+            if name == b"PING":
+                return b"+PONG\r\n"
+            if name == b"GET":
+                return _bulk(store._live(args[0]))
+            if name == b"SET":
+                expires_at = None
+                options = [a.upper() for a in args[2:]]
+                if b"PX" in options:
+                    expires_at = time.time() + int(args[2 + options.index(b"PX") + 1]) / 1000
+                elif b"EX" in options:
+                    expires_at = time.time() + int(args[2 + options.index(b"EX") + 1])
+                store.strings[args[0]] = (args[1], expires_at)
+                return b"+OK\r\n"
+            if name == b"DEL":
+                removed = 0
+                for key in args:
+                    live = store._live(key) is not None
+                    removed += int(live or key in store.sets)
+                    store.strings.pop(key, None)
+                    store.sets.pop(key, None)
+                    store.set_expiry.pop(key, None)
+                return b":%d\r\n" % removed
+            if name == b"PTTL":
+                exists, expires_at = store.expires_at(args[0])
+                if not exists:
+                    return b":-2\r\n"
+                if expires_at is None:
+                    return b":-1\r\n"
+                return b":%d\r\n" % int((expires_at - time.time()) * 1000)
+            if name == b"PEXPIRE":
+                expires_at = time.time() + int(args[1]) / 1000
+                if store._live(args[0]) is not None:
+                    store.strings[args[0]] = (store.strings[args[0]][0], expires_at)
+                elif store._live_set(args[0]) is not None:
+                    store.set_expiry[args[0]] = expires_at
+                else:
+                    return b":0\r\n"
+                return b":1\r\n"
+            if name == b"SADD":
+                store._live_set(args[0])
+                members = store.sets.setdefault(args[0], set())
+                before = len(members)
+                members.update(args[1:])
+                return b":%d\r\n" % (len(members) - before)
+            if name == b"SMEMBERS":
+                members = store._live_set(args[0]) or set()
+                return b"*%d\r\n" % len(members) + b"".join(_bulk(m) for m in members)
+            if name == b"DBSIZE":
+                return b":%d\r\n" % (len(store.strings) + len(store.sets))
+            if name == b"FLUSHDB":
+                store.strings.clear()
+                store.sets.clear()
+                store.set_expiry.clear()
+                return b"+OK\r\n"
+        return b"-ERR unknown command '%s'\r\n" % name
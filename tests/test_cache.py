@@ -0,0 +1,687 @@
+import time
+import pytest
+import numpy as np
+from semantic_layer.cache.smart_cache import SmartCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+def test_lru_eviction_respects_byte_budget():
+    cache = SmartCache(max_bytes=3000, eviction_policy="lru")
+    for key in ["a", "b", "c"]:
+        cache.set(key, np.zeros(125))  # 1000 bytes each
+    cache.get("a")
+    cache.set("d", np.zeros(125))
+    
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    stats = cache.get_stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] == 3000
+
+def test_lfu_keeps_frequent_entries():
+    cache = SmartCache(max_bytes=2000, eviction_policy="lfu")
+    cache.set("hot", np.zeros(125))
+    cache.set("cold", np.zeros(125))
+    for _ in range(3):
+        cache.get("hot")
+    cache.set("new", np.zeros(125))
+    assert cache.get("hot") is not None
+    assert cache.get("cold") is None
+
+def test_tinylfu_rejects_one_hit_wonders():
+    cache = SmartCache(max_bytes=100_000, eviction_policy="w-tinylfu")
+    for i in range(100):
+        cache.set(f"dash{i}", np.zeros(125))
+    for _ in range(5):
+        for i in range(100):
+            cache.get(f"dash{i}")
+    for i in range(500):
+        cache.set(f"adhoc{i}", np.zeros(125))
+    survivors = sum(cache.get(f"dash{i}") is not None for i in range(100))
+    assert survivors >= 98
+    assert cache.get_stats()["bytes"] <= 100_000
+
+def test_oversized_value_is_rejected():
+    cache = SmartCache(max_bytes=100)
+    assert cache.set("big", np.zeros(1000)) is False
+    assert cache.get_stats()["rejections"] == 1
+
+def test_expired_entries_purged_without_reads():
+    clock = FakeClock()
+    cache = SmartCache(default_ttl=10, clock=clock)
+    cache.set("a", "x")
+    cache.set("b", "y", ttl=100)
+    clock.now += 50
+    assert cache.purge_expired() == 1
+    assert cache.get_stats()["total_entries"] == 1
+    assert cache.get("b") == "y"
+
+def test_expiry_worker_runs_in_background():
+    cache = SmartCache(default_ttl=0.05)
+    cache.set("a", "x")
+    cache.start_expiry_worker(interval=0.01)
+    try:
+        deadline = time.time() + 2
+        while cache.get_stats()["total_entries"] and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        cache.stop_expiry_worker()
+    assert cache.get_stats()["total_entries"] == 0
+
+def test_invalidate_by_table_uses_recorded_dependencies():
+    cache = SmartCache()
+    cache.set("orders_by_day", "a", dependencies=["orders"])
+    cache.set("orders_by_user", "b", dependencies=["orders", "users"])
+    cache.set("users_by_country", "c", dependencies=["users"])
+    
+    assert cache.invalidate_by_table("orders") == 2
+    assert cache.get("orders_by_user") is None
+    assert cache.get("users_by_country") == "c"
+    assert cache.dependencies == {"users": {"users_by_country"}}
+    assert cache.invalidate_by_table("orders") == 0
+
+@pytest.fixture
+def redis_server():
+    from semantic_layer.testing.redis_server import LocalRedisServer
+    server = LocalRedisServer().start()
+    yield server
+    server.stop()
+
+def test_redis_tier_round_trips_arrow_payloads_with_ttl(redis_server):
+    import pandas as pd
+    from semantic_layer.cache.redis_cache import RedisCache
+    
+    cache = RedisCache(host="127.0.0.1", port=redis_server.port, compression="zstd")
+    df = pd.DataFrame({"country": ["US", "DE"], "revenue": [1.5, 2.5]})
+    cache.set("k", df, ttl=0.2)
+    
+    pd.testing.assert_frame_equal(cache.get("k"), df)
+    assert 0 < cache.ttl("k") <= 0.2
+    time.sleep(0.25)
+    assert cache.get("k") is None
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+def test_tiered_cache_shares_results_between_replicas(redis_server):
+    import pandas as pd
+    from semantic_layer.cache.redis_cache import RedisCache
+    from semantic_layer.cache.tiered import TieredCache
+    
+    replica_a = TieredCache(l2=RedisCache(host="127.0.0.1", port=redis_server.port))
+    replica_b = TieredCache(l2=RedisCache(host="127.0.0.1", port=redis_server.port))
+    df = pd.DataFrame({"n": [1, 2, 3]})
+    replica_a.set("k", df, ttl=60, dependencies=["orders"])
+    
+    pd.testing.assert_frame_equal(replica_b.get("k"), df)
+    replica_b.get("k")
+    stats = replica_b.get_stats()
+    assert stats["l1"]["hits"] == 1
+    assert stats["l2"]["hits"] == 1
+    
+    assert replica_a.invalidate_by_table("orders") == 1
+    assert replica_a.l2.get("k") is None
+
+def test_redis_dependency_sets_expire_with_their_entries(redis_server):
+    import pandas as pd
+    from semantic_layer.cache.redis_cache import RedisCache
+    
+    cache = RedisCache(host="127.0.0.1", port=redis_server.port)
+    cache.set("short", pd.DataFrame({"n": [1]}), ttl=0.2, dependencies=["orders"])
+    cache.set("long", pd.DataFrame({"n": [2]}), ttl=0.4, dependencies=["orders"])
+    cache.set("shorter", pd.DataFrame({"n": [3]}), ttl=0.1, dependencies=["orders"])
+    
+    exists, expires_at = redis_server.store.expires_at(b"sl:deps:orders")
+    assert exists and 0.3 < expires_at - time.time() <= 0.4
+    time.sleep(0.45)
+    assert redis_server.store.expires_at(b"sl:deps:orders") == (False, None)
+    
+    local = RedisCache()
+    local.set("k", 1, ttl=0.05, dependencies=["orders"])
+    time.sleep(0.06)
+    assert local.get("k") is None
+    assert local.dependencies == {}
+
+def test_cache_json_fallback_rejects_values_it_cannot_round_trip():
+    import pandas as pd
+    from semantic_layer.cache.serialization import deserialize_value, serialize_value
+    
+    assert deserialize_value(serialize_value({"rows": [1, 2]})) == {"rows": [1, 2]}
+    with pytest.raises(TypeError, match="Cannot serialize"):
+        serialize_value({"as_of": pd.Timestamp("2024-01-01")})
+
+def test_single_flight_coalesces_threads_and_shares_errors():
+    import threading
+    from semantic_layer.cache.single_flight import SingleFlight
+    
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+    
+    def slow_query():
+        calls.append(1)
+        release.wait(2)
+        return "rows"
+    
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", slow_query))) for _ in range(10)]
+    for t in threads:
+        t.start()
+    while flight.get_stats()["coalesced_waits"] < 9:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join()
+    
+    assert calls == [1]
+    assert results == ["rows"] * 10
+    
+    def failing():
+        raise RuntimeError("warehouse down")
+    with pytest.raises(RuntimeError):
+        flight.do("k", failing)
+    assert flight.get_stats()["errors"] == 1
+    assert flight.in_flight() == 0
+
+def test_single_flight_coalesces_asyncio_tasks():
+    import asyncio
+    from semantic_layer.cache.single_flight import SingleFlight
+    
+    flight = SingleFlight()
+    calls = []
+    
+    async def query():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("bad metric")
+    
+    async def main():
+        return await asyncio.gather(*[flight.do_async("k", query) for _ in range(5)], return_exceptions=True)
+    
+    results = asyncio.run(main())
+    assert calls == [1]
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.get_stats()["coalesced_waits"] == 4
+
+def test_stale_values_served_between_soft_and_hard_ttl():
+    clock = FakeClock()
+    cache = SmartCache(default_ttl=10, default_stale_ttl=20, clock=clock)
+    cache.set("k", "v")
+    
+    clock.now += 15
+    assert cache.get("k") is None
+    assert cache.get_with_staleness("k") == ("v", True)
+    assert cache.get_with_staleness("k", max_staleness=2) == (None, False)
+    
+    clock.now += 20
+    assert cache.get_with_staleness("k") == (None, False)
+    assert cache.get_stats()["stale_hits"] == 1
+
+def test_canonical_keys_ignore_order_and_filter_spelling():
+    from semantic_layer.core.schema import Table, Dimension, Metric, SemanticModel, DataType, AggregationType
+    from semantic_layer.compiler.query import QueryRequest
+    from semantic_layer.cache.keys import QueryCanonicalizer
+    
+    table = Table(
+        name="orders",
+        sql_table_name="orders",
+        dimensions=[
+            Dimension(name="country", type=DataType.STRING, sql="orders.country"),
+            Dimension(name="month", type=DataType.DATE, sql="order_month"),
+        ],
+        metrics=[
+            Metric(name="revenue", type=DataType.FLOAT, aggregation=AggregationType.SUM, sql="amount"),
+            Metric(name="order_count", type=DataType.INTEGER, aggregation=AggregationType.COUNT, sql="id"),
+        ]
+    )
+    canonicalizer = QueryCanonicalizer(SemanticModel(name="test", tables=[table]))
+    
+    a = QueryRequest(metrics=["revenue", "order_count"], dimensions=["country", "month"],
+                     filters={"country": ["US", "DE"]})
+    b = QueryRequest(metrics=["order_count", "Revenue"], dimensions=["month", "country"],
+                     filters={"orders.country": ["DE", "US"]}, max_staleness=60)
+    c = QueryRequest(metrics=["revenue"], dimensions=["country"], filters={"country": "US"})
+    d = QueryRequest(metrics=["revenue"], dimensions=["country"], filters={"country": ["US"]})
+    
+    assert canonicalizer.cache_key(a) == canonicalizer.cache_key(b)
+    assert canonicalizer.cache_key(c) == canonicalizer.cache_key(d)
+    assert canonicalizer.cache_key(a) != canonicalizer.cache_key(c)
+    assert canonicalizer.normalize(b).metrics == ["order_count", "revenue"]
+    
+    conflicting = QueryRequest(metrics=["revenue"], filters={"country": "US", "orders.country": "DE"})
+    with pytest.raises(ValueError, match="conflict"):
+        canonicalizer.cache_key(conflicting)
+
+def test_semantic_intent_cache_applies_threshold_and_lru():
+    from semantic_layer.cache.semantic_cache import SemanticIntentCache
+    
+    cache = SemanticIntentCache(similarity_threshold=0.9, max_entries=2)
+    revenue = np.array([1.0, 0.0, 0.0])
+    churn = np.array([0.0, 1.0, 0.0])
+    cache.set(revenue, {"answer": "revenue"})
+    cache.set(churn, {"answer": "churn"})
+    
+    assert cache.get(np.array([0.95, 0.05, 0.0])) == {"answer": "revenue"}
+    assert cache.get(np.array([0.6, 0.6, 0.5])) is None
+    assert cache.get_many(np.array([[0.0, 2.0, 0.0], [0.0, 0.0, 1.0]])) == [{"answer": "churn"}, None]
+    
+    cache.get(revenue)
+    cache.set(np.array([0.0, 0.0, 1.0]), {"answer": "signups"})
+    assert cache.get(churn) is None
+    assert cache.get(revenue) == {"answer": "revenue"}
+    assert cache.get_stats()["evictions"] == 1
+
+def test_vector_store_search_returns_scores():
+    from semantic_layer.ml.vector_store import VectorStore
+    
+    store = VectorStore(initial_capacity=1)
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, 8))
+    for i, v in enumerate(vectors):
+        store.add(f"k{i}", v)
+    store.remove("k3")
+    
+    matches = store.search(vectors[7], top_k=3)
+    assert matches[0][0] == "k7"
+    assert matches[0][1] == pytest.approx(1.0, abs=1e-5)
+    assert [s for _, s in matches] == sorted((s for _, s in matches), reverse=True)
+    assert all(key != "k3" for key, _ in store.search(vectors[3], top_k=49))
+
+def test_predictive_warmer_prewarms_weekly_pattern_within_budget():
+    from datetime import datetime, timedelta
+    from semantic_layer.cache.predictive import PredictiveCacheWarmer
+    
+    monday = datetime(2024, 3, 4, 9, 5)
+    weekly_report = {"metrics": ["revenue"], "dimensions": ["region"]}
+    daily_check = {"metrics": ["order_count"]}
+    history = []
+    for week in range(4):
+        for hit in range(3):
+            history.append({"request": weekly_report, "timestamp": monday + timedelta(weeks=week, minutes=hit),
+                            "duration_ms": 2000})
+    for day in range(28):
+        history.append({"request": daily_check, "timestamp": monday + timedelta(days=day, minutes=5),
+                        "duration_ms": 100})
+    history.append({"request": {"metrics": ["churn"]}, "timestamp": monday + timedelta(days=1), "duration_ms": 9000})
+    
+    next_monday = monday + timedelta(weeks=4)
+    warmer = PredictiveCacheWarmer(history, budget_seconds=2.0)
+    predictions = warmer.predict_upcoming_queries(60, now=next_monday - timedelta(minutes=35))
+    assert [p.request.metrics for p in predictions] == [["revenue"], ["order_count"]]
+    assert predictions[0].probability == pytest.approx(1.0)
+    assert predictions[0].expected_hits == pytest.approx(3.0)
+    
+    class RecordingExecutor:
+        def __init__(self):
+            self.executed = []
+        
+        def execute(self, request):
+            self.executed.append(request.metrics)
+    
+    executor = RecordingExecutor()
+    warmed = warmer.warm_cache(executor, 60, now=next_monday - timedelta(minutes=35))
+    assert executor.executed == [["revenue"]]
+    assert len(warmed) == 1
+    
+    assert warmer.record(weekly_report, next_monday)
+    assert not warmer.record(daily_check, next_monday)
+    stats = warmer.get_stats()
+    assert stats["warm_hits"] == 1
+    assert stats["warm_hit_rate"] == 1.0
+
+def test_predictive_warmer_budgets_unmeasured_queries_conservatively():
+    from datetime import datetime, timedelta
+    from semantic_layer.cache.predictive import PredictiveCacheWarmer
+    
+    monday = datetime(2024, 3, 4, 9, 5)
+    history = [{"request": {"metrics": ["revenue"]}, "timestamp": monday + timedelta(days=day)} for day in range(7)]
+    warmer = PredictiveCacheWarmer(history, budget_seconds=30.0, default_cost_seconds=60.0)
+    now = monday + timedelta(days=7, minutes=-30)
+    
+    predictions = warmer.predict_upcoming_queries(60, now=now)
+    assert predictions[0].cost_seconds == 60.0
+    
+    class RecordingExecutor:
+        def __init__(self):
+            self.executed = []
+        
+        def execute(self, request):
+            self.executed.append(request.metrics)
+    
+    executor = RecordingExecutor()
+    assert warmer.warm_cache(executor, 60, now=now) == []
+    assert executor.executed == []
+
+def test_disk_cache_survives_restart_and_evicts_lru(tmp_path):
+    import pandas as pd
+    import pyarrow as pa
+    from semantic_layer.cache.disk_cache import DiskCache
+    
+    clock = FakeClock()
+    cache = DiskCache(str(tmp_path), default_ttl=60, clock=clock)
+    table = pa.table({"region": ["EU", "US"], "revenue": [10.0, 20.0]})
+    cache.set("table", table, dependencies=["orders"])
+    cache.set("frame", pd.DataFrame({"n": range(1000)}), dependencies=["users"])
+    cache.set("meta", {"rows": 2})
+    
+    restarted = DiskCache(str(tmp_path), default_ttl=60, clock=clock)
+    assert restarted.get("table").equals(table)
+    assert restarted.get("frame")["n"].sum() == sum(range(1000))
+    assert restarted.get("meta") == {"rows": 2}
+    assert restarted.invalidate_by_table("users") == 1
+    assert restarted.get("frame") is None
+    
+    clock.now += 61
+    assert DiskCache(str(tmp_path), clock=clock).get_stats()["total_entries"] == 0
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["index.json"]
+    
+    bounded = DiskCache(str(tmp_path / "bounded"), max_bytes=3 * cache.index["table"]["size"], clock=clock)
+    for key in ["a", "b", "c"]:
+        bounded.set(key, table)
+    bounded.get("a")
+    bounded.set("d", table)
+    assert bounded.get("b") is None
+    assert bounded.get("a") is not None
+    assert bounded.get_stats()["evictions"] == 1
+
+def test_disk_cache_journals_writes_and_ignores_stray_directories(tmp_path):
+    import pyarrow as pa
+    from semantic_layer.cache.disk_cache import DiskCache
+
+    (tmp_path / "scratch").mkdir()
+    cache = DiskCache(str(tmp_path), default_ttl=60)
+    snapshot = (tmp_path / "index.json").read_text()
+    table = pa.table({"n": [1, 2]})
+    for i in range(10):
+        cache.set(f"k{i}", table, dependencies=["orders"])
+    cache.delete("k0")
+    # Writes go to the log; the snapshot is only rewritten on compaction
+    assert (tmp_path / "index.json").read_text() == snapshot
+    with open(tmp_path / "index.log", "a") as f:
+        f.write('["set","torn')
+
+    restarted = DiskCache(str(tmp_path), default_ttl=60)
+    assert restarted.get("k0") is None
+    assert restarted.get("k9").equals(table)
+    assert restarted.get_stats()["total_entries"] == 9
+    assert (tmp_path / "scratch").is_dir()
+    with pytest.raises(TypeError):
+        restarted.set("bad", {"at": object()})
+
+def test_tiered_cache_warms_from_disk_after_restart(tmp_path):
+    import pandas as pd
+    from semantic_layer.cache.disk_cache import DiskCache
+    from semantic_layer.cache.redis_cache import RedisCache
+    from semantic_layer.cache.tiered import TieredCache
+    
+    df = pd.DataFrame({"region": ["EU"], "revenue": [1.5]})
+    TieredCache(l3=DiskCache(str(tmp_path))).set("k", df, ttl=60, dependencies=["orders"])
+    
+    restarted = TieredCache(l1=SmartCache(), l2=RedisCache(), l3=DiskCache(str(tmp_path)))
+    assert restarted.get("k").equals(df)
+    assert restarted.l1.get("k").equals(df)
+    stats = restarted.get_stats()
+    assert stats["l3"]["hits"] == 1
+    assert stats["misses"] == 0
+
+def test_admission_filter_keeps_dashboards_through_adhoc_flood():
+    from semantic_layer.cache.admission import AdmissionFilter
+    
+    cache = SmartCache(max_bytes=100_000, eviction_policy="lru", admission=AdmissionFilter())
+    for i in range(100):
+        cache.get(f"dash{i}")
+        cache.set(f"dash{i}", np.zeros(125), cost=2.0)
+    for _ in range(3):
+        for i in range(100):
+            cache.get(f"dash{i}")
+    for i in range(500):
+        assert cache.get(f"adhoc{i}") is None
+        cache.set(f"adhoc{i}", np.zeros(125), cost=2.0)
+    
+    assert sum(cache.get(f"dash{i}") is not None for i in range(100)) == 100
+    assert cache.get_stats()["admission"]["rejected"] == 500
+
+def test_admission_peeks_at_every_victim_without_reordering():
+    from semantic_layer.cache.admission import AdmissionFilter
+
+    cache = SmartCache(max_bytes=3000, eviction_policy="w-tinylfu", admission=AdmissionFilter())
+    for key in ["cold", "hot", "warm"]:
+        cache.set(key, np.zeros(125), cost=1.0)
+    for _ in range(3):
+        cache.admission.record_access("hot")
+    policy = cache.policy
+    regions = [list(policy.window), list(policy.probation), list(policy.protected)]
+    victims = list(policy.peek_victims())
+    assert victims == ["cold", "hot", "warm"]
+
+    # Fitting 2000 bytes means evicting two entries; the frequent one is second in line
+    cache.admission.record_access("big")
+    cache.admission.record_access("big")
+    assert not cache.admits("big", 2000, cost=1.0)
+    assert cache.admits("big", 1000, cost=1.0)
+    assert [list(policy.window), list(policy.probation), list(policy.protected)] == regions
+    assert policy.peek_victim() == victims[0]
+
+    copy = SmartCache(max_bytes=3000, eviction_policy="lru")
+    for key in ["cold", "warm", "hot"]:
+        copy.set(key, np.zeros(125))
+    assert list(copy.policy.peek_victims()) == ["cold", "warm", "hot"]
+
+def test_admission_weighs_cost_and_size():
+    from semantic_layer.cache.admission import AdmissionFilter
+    from semantic_layer.cache.tiered import TieredCache
+    from semantic_layer.cache.redis_cache import RedisCache
+    import pyarrow as pa
+    
+    admission = AdmissionFilter()
+    l2 = RedisCache()
+    cache = TieredCache(l1=SmartCache(max_bytes=2000), l2=l2, admission=admission)
+    cache.get("cheap")
+    cache.set("cheap", pa.table({"v": np.zeros(125)}), cost=0.01)
+    cache.get("fast")
+    cache.set("fast", pa.table({"v": np.zeros(125)}), cost=0.01)
+    
+    cache.get("slow")
+    checks = []
+    admits = cache.l1.admits
+    cache.l1.admits = lambda *args, **kwargs: checks.append(args) or admits(*args, **kwargs)
+    assert cache.set("slow", pa.table({"v": np.zeros(125)}), cost=5.0)
+    assert len(checks) == 1
+    assert cache.get("slow") is not None
+    cache.get("huge")
+    assert not cache.set("huge", pa.table({"v": np.zeros(10_000)}), cost=0.05)
+    assert l2.lookup("huge") is None
+    assert admission.get_stats()["rejected"] == 1
+
+def _read_shared_entry(name, queue):
+    from semantic_layer.cache.shared_memory import SharedMemoryCache
+    
+    worker = SharedMemoryCache(name=name)
+    table = worker.get("orders")
+    queue.put(table.column("revenue").to_pylist())
+    del table
+    queue.put(worker.set("from-worker", {"rows": 1}))
+    worker.close()
+
+def test_shared_memory_cache_is_shared_across_processes():
+    import multiprocessing
+    import uuid
+    import pyarrow as pa
+    from semantic_layer.cache.shared_memory import SharedMemoryCache
+    
+    name = f"sl-test-{uuid.uuid4().hex[:8]}"
+    owner = SharedMemoryCache(name=name, size_bytes=1 << 20, slots=64, create=True)
+    try:
+        owner.set("orders", pa.table({"revenue": [1.0, 2.0]}), dependencies=["orders"])
+        queue = multiprocessing.get_context("fork").Queue()
+        process = multiprocessing.get_context("fork").Process(target=_read_shared_entry, args=(name, queue))
+        process.start()
+        assert queue.get(timeout=10) == [1.0, 2.0]
+        assert queue.get(timeout=10) is True
+        process.join(timeout=10)
+        
+        assert owner.get("from-worker") == {"rows": 1}
+        table = owner.get("orders")
+        address = table.column("revenue").chunk(0).buffers()[1].address
+        base = np.frombuffer(owner.shm.buf, dtype=np.uint8).ctypes.data
+        assert not base <= address < base + owner.shm.size  # copied out, so reuse cannot clobber it
+        assert owner.invalidate_by_table("orders") == 1
+        assert owner.get("orders") is None
+    finally:
+        owner.close()
+    assert table.column("revenue").to_pylist() == [1.0, 2.0]
+
+def test_shared_memory_slot_stuck_mid_write_reads_as_miss():
+    import struct
+    import uuid
+    from semantic_layer.cache.shared_memory import SharedMemoryCache, _digest
+
+    name = f"sl-test-{uuid.uuid4().hex[:8]}"
+    cache = SharedMemoryCache(name=name, size_bytes=64 * 1024, slots=16, create=True)
+    try:
+        cache.set("k", {"rows": 1})
+        index, fields = cache._find(_digest("k"))
+        # A writer that died between its two sequence bumps leaves the counter odd
+        struct.pack_into("<Q", cache.shm.buf, cache._slot_offset(index), fields[0] + 1)
+        started = time.time()
+        assert cache.get("k") is None
+        assert time.time() - started < 1
+        assert cache.set("k", {"rows": 2})
+        assert cache.get("k") == {"rows": 2}
+    finally:
+        cache.close()
+
+def test_shared_memory_owner_evicts_oldest_entries():
+    import uuid
+    from semantic_layer.cache.shared_memory import SharedMemoryCache
+    
+    name = f"sl-test-{uuid.uuid4().hex[:8]}"
+    owner = SharedMemoryCache(name=name, size_bytes=64 * 1024, slots=256, create=True,
+                              grace_seconds=0, low_watermark=0.0)
+    worker = SharedMemoryCache(name=name)
+    try:
+        payload = {"blob": "x" * 8000}
+        for i in range(8):
+            assert worker.set(f"k{i}", payload)
+        assert not worker.set("k8", payload)  # full: only the owner frees space
+        
+        assert owner.set("k8", payload)
+        assert owner.get("k0") is None
+        assert worker.get("k8") == payload
+        assert worker.get("k7") == payload
+        assert owner.get_stats()["evictions"] >= 1
+        
+        for i in range(40):
+            assert owner.set("hot", {"i": i, "blob": "y" * 8000})
+        assert worker.get("hot")["i"] == 39
+    finally:
+        worker.close()
+        owner.close()
+
+def test_shared_memory_eviction_clears_tombstones_after_churn():
+    import uuid
+    from semantic_layer.cache.shared_memory import _EMPTY, SharedMemoryCache
+    
+    cache = SharedMemoryCache(name=f"sl-test-{uuid.uuid4().hex[:8]}", size_bytes=64 * 1024, slots=64,
+                              create=True, grace_seconds=0.2, low_watermark=0.0)
+    reads = []
+    read_slot = cache._read_slot
+    cache._read_slot = lambda index: reads.append(index) or read_slot(index)
+    try:
+        assert cache.set("keep", {"rows": 1})
+        for i in range(40):
+            assert cache.set(f"k{i}", {"rows": i})
+            assert cache.delete(f"k{i}")
+        
+        def longest_miss():
+            probes = []
+            for i in range(20):
+                reads.clear()
+                assert cache.get(f"missing{i}") is None
+                probes.append(len(reads))
+            return max(probes)
+        
+        assert longest_miss() > 2
+        time.sleep(0.25)
+        cache.evict()
+        # Only the live key is left in the index, so a miss stops at once
+        assert longest_miss() <= 2
+        assert len(cache._entries(_EMPTY)) == 63
+        assert cache.get("keep") == {"rows": 1}
+    finally:
+        cache.close()
+
+def test_simulator_replays_log_against_configurations(tmp_path):
+    import json
+    from semantic_layer.cache.simulator import CacheConfig, CacheSimulator
+    
+    records = []
+    for minute in range(60):
+        records.append({"key": "dashboard", "timestamp": minute * 60, "size": 1000, "cost": 4.0})
+        records.append({"key": f"adhoc{minute}", "timestamp": minute * 60 + 1, "size": 1000, "cost": 1.0})
+    path = tmp_path / "queries.jsonl"
+    path.write_text("\n".join(json.dumps(r) for r in records))
+    simulator = CacheSimulator.from_file(str(path))
+    
+    unbounded = simulator.replay(CacheConfig(ttl=3600))
+    assert unbounded.requests == 120
+    assert unbounded.hits == 59
+    assert unbounded.bytes_saved == 59 * 1000
+    assert unbounded.warehouse_seconds_saved == 59 * 4.0
+    
+    short_ttl = simulator.replay(CacheConfig(ttl=30))
+    assert short_ttl.hits == 0
+    
+    stale = simulator.replay(CacheConfig(ttl=30, stale_ttl=60))
+    assert stale.stale_hits == 59
+    assert stale.warehouse_seconds_saved == 0
+    
+    reports = simulator.run(CacheSimulator.grid(policies=["lru", "lfu"], sizes=[1500], admission=[False, True]))
+    assert len(reports) == 4
+    assert reports[0].config.admission
+    assert reports[0].hits == 59
+    assert reports[-1].hits == 0
+    assert reports[0].to_dict()["config"].endswith("/ttl=3600s/admission")
+
+def test_single_flight_coalesces_threads_with_tasks_and_rechecks():
+    import asyncio
+    import threading
+    from semantic_layer.cache.single_flight import SingleFlight
+    
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+    
+    def slow_query():
+        calls.append(1)
+        started.set()
+        release.wait(2)
+        return "rows"
+    
+    results = []
+    thread = threading.Thread(target=lambda: results.append(flight.do("k", slow_query)))
+    thread.start()
+    started.wait(2)
+    
+    async def waiter():
+        async def query():
+            calls.append(2)
+            return "other"
+        task = asyncio.ensure_future(flight.do_async("k", query))
+        await asyncio.sleep(0.01)
+        release.set()
+        return await task
+    
+    assert asyncio.run(waiter()) == "rows"
+    thread.join()
+    assert calls == [1]
+    assert results == ["rows"]
+    
+    # A caller arriving after the leader stored its result takes it from the recheck
+    assert flight.do("k", slow_query, recheck=lambda: "cached") == "cached"
+    assert calls == [1]
+    assert flight.get_stats()["rechecked_hits"] == 1
@@ -18,3 +18,81 @@ def test_basic_query():
     
     assert "SELECT" in sql
     assert "GROUP BY" in sql
+
+def test_compile_with_plan_describes_tables_columns_filters_and_grains():
+    orders = Table(
+        name="orders",
+        sql_table_name="raw.orders",
+        dimensions=[
+            Dimension(name="status", type=DataType.STRING, sql="status"),
+            Dimension(name="order_date", type=DataType.DATE, sql="created_at"),
+        ],
+        metrics=[Metric(name="revenue", type=DataType.FLOAT, aggregation=AggregationType.SUM, sql="amount")]
+    )
+    customers = Table(
+        name="customers",
+        sql_table_name="raw.customers",
+        dimensions=[Dimension(name="region", type=DataType.STRING, sql="region")]
+    )
+    model = SemanticModel(name="test", tables=[orders, customers], joins=[
+        Join(from_table="orders", to_table="raw.customers", type=JoinType.LEFT,
+             sql_on="orders.customer_id = customers.id")
+    ])
+    compiled = SqlCompiler(model).compile_with_plan(QueryRequest(
+        metrics=["revenue"], dimensions=["region", "order_date__month"],
+        filters={"status": ["paid", "shipped"], "customers.region": "EU"}
+    ))
+    plan = compiled.plan
+    
+    assert compiled.params == ["paid", "shipped", "EU"]
+    assert plan.tables == ("raw.orders", "raw.customers")
+    assert [(c.table, c.sql) for c in plan.group_by] == [("raw.customers", "region"), ("raw.orders", "created_at")]
+    assert plan.grains == (("order_date", "month"),)
+    assert plan.filters_on("raw.orders") == {"status": ["paid", "shipped"]}
+    assert plan.filters_on("raw.customers") == {"region": ["EU"]}
+    keys = plan.joins[0].keys[0]
+    assert (keys[0].table, keys[0].sql, keys[1].table, keys[1].sql) == (
+        "raw.orders", "customer_id", "raw.customers", "id"
+    )
+    assert set(plan.columns_of("raw.orders")) == {"created_at", "amount", "status", "customer_id"}
+    assert hash(plan) == hash(SqlCompiler(model).plan(QueryRequest(
+        metrics=["revenue"], dimensions=["region", "order_date__month"],
+        filters={"status": ["paid", "shipped"], "customers.region": "EU"}
+    )))
+
+def test_unreferenced_left_joins_are_pruned():
+    orders = Table(
+        name="orders",
+        sql_table_name="raw.orders",
+        dimensions=[Dimension(name="status", type=DataType.STRING, sql="status")],
+        metrics=[Metric(name="revenue", type=DataType.FLOAT, aggregation=AggregationType.SUM, sql="amount")]
+    )
+    customers = Table(
+        name="customers",
+        sql_table_name="raw.customers",
+        dimensions=[Dimension(name="region", type=DataType.STRING, sql="region")]
+    )
+    regions = Table(
+        name="regions",
+        sql_table_name="raw.regions",
+        dimensions=[Dimension(name="continent", type=DataType.STRING, sql="continent")]
+    )
+    model = SemanticModel(name="test", tables=[orders, customers, regions], joins=[
+        Join(from_table="orders", to_table="raw.customers", type=JoinType.LEFT,
+             sql_on="orders.customer_id = customers.id"),
+        Join(from_table="customers", to_table="raw.regions", type=JoinType.LEFT,
+             sql_on="customers.region = regions.code"),
+    ])
+    compiler = SqlCompiler(model)
+    
+    own = QueryRequest(metrics=["revenue"], dimensions=["status"])
+    assert compiler.resolve_tables(own) == ["raw.orders"]
+    assert "JOIN" not in compiler.compile(own)
+    
+    # Reaching regions needs the customers join on the way
+    nested = QueryRequest(metrics=["revenue"], dimensions=["continent"])
+    assert compiler.resolve_tables(nested) == ["raw.orders", "raw.customers", "raw.regions"]
+    assert compiler.compile(nested).count("LEFT JOIN") == 2
+    
+    filtered = QueryRequest(metrics=["revenue"], filters={"customers.region": "EU"})
+    assert compiler.resolve_tables(filtered) == ["raw.orders", "raw.customers"]
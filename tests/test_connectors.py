@@ -0,0 +1,126 @@
+import pytest
+from semantic_layer.core.schema import *
+from semantic_layer.compiler.sql_compiler import SqlCompiler
+from semantic_layer.compiler.query import QueryRequest
+from semantic_layer.connectors.duckdb import DuckDBAdapter
+
+@pytest.fixture
+def adapter():
+    adapter = DuckDBAdapter()
+    adapter.connect({"database": ":memory:"})
+    adapter.execute_query(
+        "CREATE TABLE orders AS SELECT range AS id, "
+        "CASE WHEN range % 2 = 0 THEN 'US' ELSE 'DE' END AS country, "
+        "range * 1.5 AS amount FROM range(100)"
+    )
+    return adapter
+
+@pytest.fixture
+def model():
+    table = Table(
+        name="orders",
+        sql_table_name="orders",
+        dimensions=[Dimension(name="country", type=DataType.STRING, sql="country")],
+        metrics=[Metric(name="revenue", type=DataType.FLOAT, aggregation=AggregationType.SUM, sql="amount")]
+    )
+    return SemanticModel(name="test", tables=[table])
+
+def test_prepared_statements_reused_across_bind_parameters(model):
+    from semantic_layer.connectors.postgres import PostgresAdapter
+    
+    adapter = PostgresAdapter()
+    adapter.connect({})
+    compiler = SqlCompiler(model)
+    sql_us, params_us = compiler.compile_parameterized(
+        QueryRequest(metrics=["revenue"], dimensions=["country"], filters={"country": "US"})
+    )
+    sql_de, params_de = compiler.compile_parameterized(
+        QueryRequest(metrics=["revenue"], dimensions=["country"], filters={"country": "DE"})
+    )
+    assert sql_us == sql_de
+    
+    adapter.execute_query(sql_us, params_us)
+    adapter.execute_query(sql_de, params_de)
+    
+    # Prepared once; values travel as bind parameters, never inlined into the SQL
+    assert list(adapter.executed) == [
+        (f"PREPARE sl_stmt_1 AS {sql_us}", []), ("sl_stmt_1", ["US"]), ("sl_stmt_1", ["DE"])
+    ]
+    stats = adapter.get_statement_cache_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["statements"] == 1
+
+def test_one_off_statements_are_not_prepared(model):
+    from semantic_layer.connectors.postgres import PostgresAdapter
+    
+    adapter = PostgresAdapter(max_logged=2)
+    adapter.connect({})
+    for _ in range(3):
+        adapter.execute_query("SELECT count(*) AS n FROM orders")
+    assert len(adapter.statement_cache) == 0
+    assert len(adapter.executed) == 2
+
+def test_schema_change_invalidates_prepared_statements():
+    from semantic_layer.connectors.postgres import PostgresAdapter
+    
+    adapter = PostgresAdapter()
+    adapter.connect({})
+    adapter.execute_query("SELECT count(*) AS n FROM orders WHERE country = $1", ["US"])
+    assert len(adapter.statement_cache) == 1
+    
+    adapter.execute_query("ALTER TABLE orders ADD COLUMN region VARCHAR")
+    assert len(adapter.statement_cache) == 0
+    assert ("DEALLOCATE sl_stmt_1", []) in adapter.executed
+
+def test_duckdb_reuses_prepared_statements_across_values(adapter, model):
+    compiler = SqlCompiler(model)
+    for country in ["US", "DE", "O'Brien"]:
+        sql, params = compiler.compile_parameterized(
+            QueryRequest(metrics=["revenue"], dimensions=["country"], filters={"country": country})
+        )
+        df = adapter.execute_query(sql, params)
+        assert df["country"].tolist() == ([] if country == "O'Brien" else [country])
+    
+    stats = adapter.get_statement_cache_stats()
+    assert (stats["statements"], stats["misses"], stats["hits"]) == (1, 1, 2)
+    assert stats["plan_time_saved_ms"] > 0
+    
+    # Values with no literal form are bound by the driver instead, bypassing the cache
+    assert adapter.execute_query("SELECT $1 AS v", [{"a": 1}])["v"].tolist() == [{"a": 1}]
+    assert adapter.get_statement_cache_stats()["statements"] == 1
+
+def test_literal_rendering_escapes_quotes(adapter):
+    df = adapter.execute_query("SELECT $1 AS value", ["O'Brien"])
+    assert df["value"].tolist() == ["O'Brien"]
+
+def test_partitioned_parquet_dataset_as_table_source(adapter, model, tmp_path):
+    adapter.execute_query(
+        f"COPY orders TO '{tmp_path}/orders' (FORMAT PARQUET, PARTITION_BY (country))"
+    )
+    source = adapter.register_dataset("orders_files", str(tmp_path / "orders"))
+    assert source.statistics["amount"].min == 0.0
+    assert source.statistics["amount"].max == 148.5
+    
+    model.tables[0].sql_table_name = "orders_files"
+    sql = SqlCompiler(model).compile(
+        QueryRequest(metrics=["revenue"], dimensions=["country"], filters={"country": "US"})
+    )
+    df = adapter.execute_query(sql)
+    assert df["country"].tolist() == ["US"]
+    assert float(df["revenue"][0]) == sum(i * 1.5 for i in range(0, 100, 2))
+    
+    plan = adapter.execute_query(f"EXPLAIN {sql}")
+    assert "Scanning Files: 1/2" in plan.iloc[0, 1]
+
+def test_memory_mapped_arrow_dataset(adapter, tmp_path):
+    import pyarrow as pa
+    table = pa.Table.from_pandas(adapter.execute_query("SELECT * FROM orders"), preserve_index=False)
+    with pa.OSFile(str(tmp_path / "orders.arrow"), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    
+    source = adapter.register_dataset("orders_arrow", str(tmp_path / "orders.arrow"), format="arrow")
+    assert source.statistics["id"].row_count == 100
+    df = adapter.execute_query("SELECT count(*) AS n FROM orders_arrow WHERE country = 'DE'")
+    assert df["n"][0] == 50
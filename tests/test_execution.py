@@ -0,0 +1,487 @@
+import threading
+import time
+import pytest
+from semantic_layer.core.schema import *
+from semantic_layer.compiler.query import QueryRequest
+from semantic_layer.connectors.duckdb import DuckDBAdapter
+from semantic_layer.execution.executor import QueryExecutor
+
+@pytest.fixture
+def adapter():
+    adapter = DuckDBAdapter()
+    adapter.connect({"database": ":memory:"})
+    adapter.execute_query(
+        "CREATE TABLE orders AS SELECT range AS id, "
+        "CASE WHEN range % 3 = 0 THEN 'US' WHEN range % 3 = 1 THEN 'DE' ELSE 'FR' END AS country, "
+        "range % 200 AS day, range * 0.5 AS amount FROM range(30000)"
+    )
+    return adapter
+
+@pytest.fixture
+def model():
+    table = Table(
+        name="orders",
+        sql_table_name="orders",
+        dimensions=[
+            Dimension(name="country", type=DataType.STRING, sql="country"),
+            Dimension(name="day", type=DataType.INTEGER, sql="day"),
+        ],
+        metrics=[
+            Metric(name="order_count", type=DataType.INTEGER, aggregation=AggregationType.COUNT, sql="id"),
+            Metric(name="revenue", type=DataType.FLOAT, aggregation=AggregationType.SUM, sql="amount"),
+        ]
+    )
+    return SemanticModel(name="test", tables=[table])
+
+def test_compaction_uses_declared_types(adapter, model):
+    executor = QueryExecutor(model, adapter, compact_results=True)
+    result = executor.execute(QueryRequest(metrics=["order_count", "revenue"], dimensions=["country", "day"]))
+    
+    df = result.data
+    assert str(df["country"].dtype) == "category"
+    assert str(df["day"].dtype) == "int16"
+    assert str(df["order_count"].dtype) == "int8"
+    assert str(df["revenue"].dtype) == "float32"
+    assert result.compaction.bytes_saved > 0
+    assert executor.get_stats()["compaction_bytes_saved"] == result.compaction.bytes_saved
+
+def test_compaction_keeps_inexact_floats(adapter, model):
+    adapter.execute_query("UPDATE orders SET amount = amount + 0.1")
+    executor = QueryExecutor(model, adapter, compact_results=True)
+    result = executor.execute(QueryRequest(metrics=["revenue"], dimensions=["country"]))
+    assert str(result.data["revenue"].dtype) == "float64"
+
+def test_oversized_result_spills_to_disk(adapter, model, tmp_path):
+    executor = QueryExecutor(model, adapter, memory_budget_bytes=4096, spill_dir=str(tmp_path), batch_size=1024)
+    result = executor.execute(QueryRequest(metrics=["revenue"], dimensions=["country", "day"]))
+    
+    assert result.spilled
+    assert result.data is None
+    assert result.row_count == 600
+    assert len(list(tmp_path.iterdir())) == 1
+    assert sum(batch.num_rows for batch in result.iter_batches()) == 600
+    assert result.to_pandas()["revenue"].sum() == pytest.approx(sum(i * 0.5 for i in range(30000)))
+    
+    result.spill.cleanup()
+    assert list(tmp_path.iterdir()) == []
+
+def test_spilled_results_are_compacted_when_read(adapter, model, tmp_path):
+    executor = QueryExecutor(model, adapter, compact_results=True, memory_budget_bytes=4096,
+                             spill_dir=str(tmp_path), batch_size=1024)
+    result = executor.execute(QueryRequest(metrics=["order_count"], dimensions=["country", "day"]))
+    assert result.spilled
+    
+    df = result.to_pandas()
+    assert str(df["country"].dtype) == "category"
+    assert str(df["day"].dtype) == "int16"
+    assert df["order_count"].sum() == 30000
+    assert result.compaction.bytes_saved > 0
+    result.spill.cleanup()
+
+def test_small_result_stays_in_memory(adapter, model, tmp_path):
+    executor = QueryExecutor(model, adapter, memory_budget_bytes=1 << 20, spill_dir=str(tmp_path))
+    result = executor.execute(QueryRequest(metrics=["revenue"], dimensions=["country"]))
+    assert not result.spilled
+    assert result.row_count == 3
+    assert list(tmp_path.iterdir()) == []
+
+def test_cached_results_invalidated_by_table(adapter, model):
+    from semantic_layer.cache.smart_cache import SmartCache
+    from semantic_layer.governance.lineage import DataLineage, LineageNode
+    
+    lineage = DataLineage()
+    lineage.add_node(LineageNode(name="revenue", type="metric", dependencies=["fx_rates"]))
+    cache = SmartCache()
+    executor = QueryExecutor(model, adapter, cache=cache, lineage=lineage)
+    request = QueryRequest(metrics=["revenue"], dimensions=["country"])
+    
+    first = executor.execute(request)
+    assert executor.execute(request) is first
+    assert cache.get_stats()["hits"] == 1
+    
+    assert cache.invalidate_by_table("fx_rates") == 1
+    assert executor.execute(request) is not first
+    assert cache.invalidate_by_table("orders") == 1
+
+def test_stale_result_served_while_refreshing(adapter, model):
+    from semantic_layer.cache.smart_cache import SmartCache
+    
+    cache = SmartCache()
+    executor = QueryExecutor(model, adapter, cache=cache, cache_ttl=0.05, stale_ttl=60, refresh_workers=1)
+    request = QueryRequest(metrics=["order_count"])
+    first = executor.execute(request)
+    # Hold the refresh worker so both stale reads happen before the refresh runs
+    gate = threading.Event()
+    executor.refresh_pool.submit(gate.wait)
+    
+    adapter.execute_query("INSERT INTO orders VALUES (99999, 'US', 1, 1.0)")
+    time.sleep(0.1)
+    assert executor.execute(request) is first
+    assert executor.execute(QueryRequest(metrics=["order_count"], max_staleness=3600)) is first
+    
+    gate.set()
+    executor.refresh_pool.shutdown(wait=True)
+    refreshed = executor.execute(request)
+    assert refreshed is not first
+    assert refreshed.data["order_count"][0] == 30001
+    stats = executor.get_stats()
+    assert stats["stale_served"] == 2
+    assert stats["background_refreshes"] == 1
+
+def test_stale_results_are_opt_in(adapter, model):
+    from semantic_layer.cache.smart_cache import SmartCache
+    
+    cache = SmartCache(default_stale_ttl=60)
+    executor = QueryExecutor(model, adapter, cache=cache, cache_ttl=0.05)
+    request = QueryRequest(metrics=["order_count"])
+    first = executor.execute(request)
+    time.sleep(0.1)
+    
+    assert executor.execute(request) is not first
+    assert executor.stale_served == 0
+    time.sleep(0.1)
+    assert executor.execute(QueryRequest(metrics=["order_count"], max_staleness=60)) is not None
+    assert executor.stale_served == 1
+    executor.close()
+    assert executor.refresh_pool._shutdown
+
+def test_reordered_request_hits_cache_in_requested_column_order(adapter, model):
+    from semantic_layer.cache.smart_cache import SmartCache
+    
+    cache = SmartCache()
+    executor = QueryExecutor(model, adapter, cache=cache)
+    executor.execute(QueryRequest(metrics=["revenue", "order_count"], dimensions=["country"]))
+    result = executor.execute(QueryRequest(metrics=["order_count", "revenue"], dimensions=["country"]))
+    
+    assert cache.get_stats()["hits"] == 1
+    assert list(result.data.columns) == ["country", "order_count", "revenue"]
+
+def test_narrower_requests_answered_from_cached_broader_result(adapter, model):
+    from semantic_layer.cache.smart_cache import SmartCache
+    
+    executor = QueryExecutor(model, adapter, cache=SmartCache(), compact_results=True)
+    broad = executor.execute(QueryRequest(metrics=["revenue", "order_count"], dimensions=["country", "day"]))
+    
+    by_country = executor.execute(QueryRequest(metrics=["revenue"], dimensions=["country"]))
+    filtered = executor.execute(QueryRequest(
+        metrics=["order_count"], dimensions=["day"], filters={"country": ["US", "DE"]}
+    ))
+    total = executor.execute(QueryRequest(metrics=["order_count"]))
+    
+    assert executor.get_stats()["subsumption_hits"] == 3
+    # Answered from the cached result: none of them ran its own SQL
+    assert by_country.sql == filtered.sql == total.sql == broad.sql
+    
+    expected = adapter.execute_query("SELECT country, sum(amount) AS revenue FROM orders GROUP BY country")
+    got = by_country.data.astype({"country": str}).sort_values("country").reset_index(drop=True)
+    expected = expected.sort_values("country").reset_index(drop=True)
+    assert got["country"].tolist() == expected["country"].tolist()
+    assert got["revenue"].tolist() == pytest.approx(expected["revenue"].tolist())
+    assert filtered.data["order_count"].sum() == 20000
+    assert len(filtered.data) == 200
+    assert total.data["order_count"].tolist() == [30000]
+
+def test_subsumption_respects_cached_filters(adapter, model):
+    from semantic_layer.cache.smart_cache import SmartCache
+    
+    executor = QueryExecutor(model, adapter, cache=SmartCache())
+    executor.execute(QueryRequest(metrics=["revenue"], dimensions=["day"], filters={"country": "US"}))
+    executor.execute(QueryRequest(metrics=["revenue"], dimensions=["day"]))
+    executor.execute(QueryRequest(metrics=["revenue"], filters={"country": "US"}))
+    executor.execute(QueryRequest(metrics=["revenue"], filters={"country": "FR"}))
+    
+    assert executor.get_stats()["subsumption_hits"] == 1
+
+def test_time_grain_rollup_from_cached_daily_result(adapter):
+    from semantic_layer.cache.smart_cache import SmartCache
+    
+    adapter.execute_query("ALTER TABLE orders ADD COLUMN order_date DATE")
+    adapter.execute_query("UPDATE orders SET order_date = DATE '2024-01-01' + CAST(id % 400 AS INTEGER)")
+    table = Table(
+        name="orders",
+        sql_table_name="orders",
+        dimensions=[
+            Dimension(name="country", type=DataType.STRING, sql="country"),
+            Dimension(name="order_date", type=DataType.DATE, sql="order_date"),
+        ],
+        metrics=[
+            Metric(name="revenue", type=DataType.FLOAT, aggregation=AggregationType.SUM, sql="amount"),
+            Metric(name="avg_amount", type=DataType.FLOAT, aggregation=AggregationType.AVG, sql="amount"),
+            Metric(name="largest", type=DataType.FLOAT, aggregation=AggregationType.MAX, sql="amount"),
+        ]
+    )
+    model = SemanticModel(name="test", tables=[table])
+    executor = QueryExecutor(model, adapter, cache=SmartCache())
+    metrics = ["revenue", "avg_amount", "largest"]
+    
+    daily = executor.execute(QueryRequest(metrics=metrics, dimensions=["country", "order_date__day"]))
+    assert list(daily.data.columns) == ["country", "order_date__day"] + metrics
+    monthly = executor.execute(QueryRequest(metrics=metrics, dimensions=["order_date__Month"]))
+    yearly = executor.execute(QueryRequest(metrics=["avg_amount"], dimensions=["order_date__year"],
+                                           filters={"country": "US"}))
+    weekly = executor.execute(QueryRequest(metrics=["revenue"], dimensions=["order_date__week"]))
+    assert executor.get_stats()["subsumption_hits"] == 3
+    
+    expected = adapter.execute_query(
+        "SELECT date_trunc('month', order_date) AS m, sum(amount) AS revenue, avg(amount) AS avg_amount, "
+        "max(amount) AS largest FROM orders GROUP BY m ORDER BY m"
+    )
+    got = monthly.data.sort_values("order_date__month").reset_index(drop=True)
+    assert list(got.columns) == ["order_date__month"] + metrics
+    assert got["order_date__month"].tolist() == expected["m"].tolist()
+    for metric in metrics:
+        assert got[metric].tolist() == pytest.approx(expected[metric].tolist())
+    
+    expected = adapter.execute_query(
+        "SELECT date_trunc('year', order_date) AS y, avg(amount) AS a FROM orders WHERE country = 'US' "
+        "GROUP BY y ORDER BY y"
+    )
+    got = yearly.data.sort_values("order_date__year")
+    assert got["avg_amount"].tolist() == pytest.approx(expected["a"].tolist())
+    assert len(weekly.data) == 58
+
+def test_watermarks_invalidate_only_changed_tables(adapter, model, tmp_path):
+    import pandas as pd
+    from semantic_layer.cache.smart_cache import SmartCache
+    from semantic_layer.cache.watermarks import TableWatermarkTracker
+    
+    pd.DataFrame({"country": ["US", "DE"], "target": [1.0, 2.0]}).to_parquet(tmp_path / "targets.parquet")
+    adapter.register_dataset("targets", str(tmp_path / "targets.parquet"))
+    
+    class Clock:
+        now = 0.0
+        def __call__(self):
+            return self.now
+    
+    clock = Clock()
+    cache = SmartCache()
+    tracker = TableWatermarkTracker(adapter, cache, min_ttl=10, clock=clock)
+    executor = QueryExecutor(model, adapter, cache=cache, watermarks=tracker)
+    request = QueryRequest(metrics=["revenue"], dimensions=["country"])
+    executor.execute(request)
+    cache.set("targets-report", "cached", dependencies=["targets"])
+    
+    assert tracker.poll() == []
+    clock.now = 100
+    adapter.execute_query("INSERT INTO orders VALUES (30000, 'US', 1, 10.0)")
+    assert tracker.poll() == ["orders"]
+    assert cache.get(executor.cache_key(request)) is None
+    assert cache.get("targets-report") == "cached"
+    
+    stat = (tmp_path / "targets.parquet").stat()
+    import os
+    os.utime(tmp_path / "targets.parquet", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert tracker.poll() == ["targets"]
+    assert cache.get("targets-report") is None
+    
+    # Orders changed at t=100 and t=700: learned interval 600s, TTL half of it
+    executor.execute(request)
+    clock.now = 700
+    adapter.execute_query("INSERT INTO orders VALUES (30001, 'US', 1, 10.0)")
+    assert tracker.poll() == ["orders"]
+    assert tracker.ttl_for(["orders"]) == 300
+    assert tracker.ttl_for(["targets"]) == tracker.default_ttl
+    executor.execute(request)
+    entry = cache.cache[executor.cache_key(request)]
+    assert entry["fresh_until"] - entry["created_at"] == pytest.approx(300, abs=1)
+
+def test_watermarks_baseline_before_caching_even_behind_a_tiered_cache(adapter, model):
+    from semantic_layer.cache.tiered import TieredCache
+    from semantic_layer.cache.watermarks import TableWatermarkTracker
+
+    cache = TieredCache()
+    tracker = TableWatermarkTracker(adapter, cache)
+    executor = QueryExecutor(model, adapter, cache=cache, watermarks=tracker)
+    request = QueryRequest(metrics=["revenue"], dimensions=["country"])
+    executor.execute(request)
+    assert "orders" in tracker.watermarks
+
+    # The change lands before the tracker ever polled; the first poll still catches it
+    adapter.execute_query("INSERT INTO orders VALUES (30000, 'US', 1, 10.0)")
+    assert tracker.poll() == ["orders"]
+    assert cache.get(executor.cache_key(request)) is None
+
+def test_profiler_breaks_queries_down_by_fingerprint_and_stage(adapter, model):
+    from semantic_layer.cache.smart_cache import SmartCache
+    from semantic_layer.optimization.profiler import QueryProfiler
+
+    profiler = QueryProfiler(slow_threshold_ms=0, slow_samples=3)
+    executor = QueryExecutor(model, adapter, cache=SmartCache(), profiler=profiler)
+    for country in ["US", "DE", "FR", "US"]:
+        executor.execute(QueryRequest(metrics=["revenue"], filters={"country": country}))
+    executor.execute(QueryRequest(metrics=["revenue"], dimensions=["country"]))
+
+    stats = profiler.get_stats()
+    assert stats["total_queries"] == 5 and stats["fingerprints"] == 2
+    assert stats["stages"]["execute"]["count"] == 4  # The repeated US query was a cache hit
+    assert stats["stages"]["cache_lookup"]["count"] == 5
+
+    fingerprint = executor.canonicalizer.fingerprint(QueryRequest(metrics=["revenue"], filters={"country": "X"}))
+    by_shape = profiler.get_fingerprint_stats(fingerprint)
+    assert by_shape["count"] == 4
+    assert list(by_shape["stages"]) == ["canonicalize", "cache_lookup", "compile", "execute", "fetch", "cache_store"]
+    assert by_shape["p50_ms"] <= by_shape["p99_ms"] <= by_shape["max_ms"]
+
+    slow = profiler.get_slow_queries()
+    assert len(slow) == 3 and slow[-1]["fingerprint"] != fingerprint
+
+def test_router_picks_cheapest_path_and_falls_back_to_warehouse(adapter, model, caplog):
+    import logging
+    from semantic_layer.cache.smart_cache import SmartCache
+    from semantic_layer.execution.router import ExecutionRouter
+    
+    executor = QueryExecutor(model, adapter, cache=SmartCache())
+    router = ExecutionRouter(executor)
+    request = QueryRequest(metrics=["revenue"], dimensions=["country", "day"])
+    
+    with caplog.at_level(logging.INFO, logger="semantic_layer.execution.router"):
+        first = router.execute(request)
+        second = router.execute(request)
+        narrower = router.execute(QueryRequest(metrics=["revenue"], dimensions=["country"]))
+    
+    assert [d.path for d in router.decisions] == ["warehouse", "cache", "rollup"]
+    assert router.decisions[0].rejected["cache"] == "not cached"
+    assert second.data.equals(first.data)
+    assert narrower.data["revenue"].sum() == pytest.approx(sum(i * 0.5 for i in range(30000)))
+    assert "Routed" in caplog.text and "to rollup" in caplog.text
+    assert router.get_stats()["routed"] == {"warehouse": 1, "cache": 1, "rollup": 1}
+
+    # A dry run ranks the cache first without counting as a lookup
+    lookups = executor.cache.get_stats()
+    assert router.route(request).candidates[0].path == "cache"
+    assert executor.cache.get_stats() == lookups
+
+def test_router_covers_requests_that_skip_unreferenced_joins(adapter, model):
+    from semantic_layer.execution.router import ExecutionRouter, MaterializedAggregate
+
+    adapter.execute_query(
+        "CREATE TABLE orders_by_country AS SELECT country, sum(amount) AS revenue FROM orders GROUP BY country"
+    )
+    customers = Table(name="customers", sql_table_name="customers",
+                      dimensions=[Dimension(name="segment", type=DataType.STRING, sql="segment")])
+    joined = SemanticModel(name="test", tables=[*model.tables, customers], joins=[
+        Join(from_table="orders", to_table="customers", type=JoinType.LEFT,
+             sql_on="orders.customer_id = customers.id"),
+    ])
+    aggregate = MaterializedAggregate(table="orders_by_country", dimensions=["country"], metrics=["revenue"],
+                                      source_tables=["orders"], refreshed_at=1000.0)
+    router = ExecutionRouter(QueryExecutor(joined, adapter), aggregates=[aggregate], clock=lambda: 1000.0)
+
+    assert router.route(QueryRequest(metrics=["revenue"], dimensions=["country"])).candidates[0].path == "materialized"
+    by_segment = router.route(QueryRequest(metrics=["revenue"], dimensions=["segment"]))
+    assert by_segment.rejected["materialized"] == "no covering aggregate"
+
+def test_router_uses_fresh_materialized_aggregates_only(adapter, model):
+    from semantic_layer.execution.router import ExecutionRouter, MaterializedAggregate
+    
+    adapter.execute_query(
+        "CREATE TABLE orders_by_country AS SELECT country, day, count(id) AS order_count, "
+        "sum(amount) AS revenue FROM orders GROUP BY country, day"
+    )
+    now = [1000.0]
+    aggregate = MaterializedAggregate(table="orders_by_country", dimensions=["country", "day"],
+                                      metrics=["order_count", "revenue"], source_tables=["orders"],
+                                      refreshed_at=1000.0, ttl=60)
+    router = ExecutionRouter(QueryExecutor(model, adapter), aggregates=[aggregate], clock=lambda: now[0])
+    request = QueryRequest(metrics=["order_count", "revenue"], dimensions=["country"], filters={"country": "US"})
+    
+    result = router.execute(request)
+    assert router.decisions[-1].path == "materialized"
+    assert "orders_by_country" in result.sql
+    assert result.data["order_count"].tolist() == [10000]
+    
+    now[0] = 1100.0
+    router.execute(request)
+    assert router.decisions[-1].path == "warehouse"
+    assert router.decisions[-1].rejected["materialized"] == "covering aggregates are stale"
+    
+    router.execute(QueryRequest(metrics=["revenue"], dimensions=["country"], max_staleness=60))
+    assert router.decisions[-1].path == "materialized"
+    
+    router.mark_refreshed("orders_by_country")
+    router.execute(request)
+    assert router.decisions[-1].path == "materialized"
+
+def test_router_samples_large_tables_within_error_bound(model):
+    from semantic_layer.execution.router import ExecutionRouter
+    from semantic_layer.optimization.cost_estimator import CostEstimator
+    from semantic_layer.optimization.statistics import StatisticsCatalog
+    
+    adapter = DuckDBAdapter()
+    adapter.connect({"database": ":memory:"})
+    adapter.execute_query(
+        "CREATE TABLE orders AS SELECT range AS id, "
+        "CASE WHEN range % 3 = 0 THEN 'US' WHEN range % 3 = 1 THEN 'DE' ELSE 'FR' END AS country, "
+        "range % 200 AS day, (range % 1000) * 0.5 AS amount FROM range(4000000)"
+    )
+    catalog = StatisticsCatalog(adapter)
+    catalog.collect("orders")
+    router = ExecutionRouter(QueryExecutor(model, adapter), estimator=CostEstimator(statistics=catalog),
+                             scan_bytes_per_second=1e6, sample_seed=7)
+    
+    exact = router.execute(QueryRequest(metrics=["order_count", "revenue"], dimensions=["country"]))
+    assert router.decisions[-1].path == "warehouse"
+    assert router.decisions[-1].rejected["approximate"] == "exact answer required"
+    
+    approx = router.execute(QueryRequest(metrics=["order_count", "revenue"], dimensions=["country"],
+                                         max_error=0.25))
+    decision = router.decisions[-1]
+    assert decision.path == "approximate"
+    assert "SAMPLE" in approx.sql
+    assert 0 < approx.error_bound <= 0.25
+    expected = exact.data.set_index("country")
+    for _, row in approx.data.iterrows():
+        for metric in ("order_count", "revenue"):
+            assert row[metric] == pytest.approx(expected.loc[row["country"], metric], rel=approx.error_bound)
+    
+    router.execute(QueryRequest(metrics=["order_count"], dimensions=["day"], max_error=0.01))
+    assert router.decisions[-1].path == "warehouse"
+    assert "sample would be needed" in router.decisions[-1].rejected["approximate"]
+
+def test_duplicate_filter_spellings_are_intersected_not_overwritten(adapter, model):
+    from semantic_layer.cache.smart_cache import SmartCache
+    
+    executor = QueryExecutor(model, adapter, cache=SmartCache())
+    merged = executor.execute(QueryRequest(
+        metrics=["order_count"], dimensions=["country"], filters={"country": ["US"], "orders.country": ["US", "DE"]}
+    ))
+    assert merged.data["country"].tolist() == ["US"]
+    only_us = executor.execute(QueryRequest(metrics=["order_count"], dimensions=["country"], filters={"country": "US"}))
+    assert only_us.data["country"].tolist() == ["US"]
+    
+    with pytest.raises(ValueError, match="conflict"):
+        executor.execute(QueryRequest(metrics=["order_count"], filters={"country": "US", "orders.country": "DE"}))
+
+def test_filters_on_a_dimensions_sql_column_still_compile(adapter):
+    table = Table(
+        name="orders",
+        sql_table_name="orders",
+        dimensions=[Dimension(name="order_day", type=DataType.INTEGER, sql="day")],
+        metrics=[Metric(name="order_count", type=DataType.INTEGER, aggregation=AggregationType.COUNT, sql="id")]
+    )
+    executor = QueryExecutor(SemanticModel(name="test", tables=[table]), adapter)
+    by_column = executor.execute(QueryRequest(metrics=["order_count"], filters={"day": [1, 2]}))
+    by_name = executor.execute(QueryRequest(metrics=["order_count"], filters={"order_day": [1, 2]}))
+    assert by_column.data["order_count"].tolist() == by_name.data["order_count"].tolist() == [300]
+
+def test_redis_generate_key_accepts_plain_dicts():
+    from semantic_layer.cache.redis_cache import RedisCache
+    
+    cache = RedisCache()
+    assert cache.generate_key({"tenant": "a", "sql": "SELECT 1"}) == cache.generate_key({"sql": "SELECT 1", "tenant": "a"})
+    assert cache.generate_key({"tenant": "a"}) != cache.generate_key({"tenant": "b"})
+    assert cache.generate_key({"metrics": ["b", "a"]}) == cache.generate_key({"metrics": ["a", "b"]})
+
+def test_rollup_keeps_null_dimension_group(adapter, model):
+    from semantic_layer.cache.smart_cache import SmartCache
+    
+    adapter.execute_query("UPDATE orders SET country = NULL WHERE id < 10")
+    executor = QueryExecutor(model, adapter, cache=SmartCache())
+    executor.execute(QueryRequest(metrics=["order_count"], dimensions=["country", "day"]))
+    rolled_up = executor.execute(QueryRequest(metrics=["order_count"], dimensions=["country"]))
+    
+    assert executor.get_stats()["subsumption_hits"] == 1
+    counts = dict(zip(rolled_up.data["country"].fillna("<null>"), rolled_up.data["order_count"]))
+    expected = adapter.execute_query("SELECT country, count(id) AS n FROM orders GROUP BY country")
+    assert counts == dict(zip(expected["country"].fillna("<null>"), expected["n"]))
+    assert counts["<null>"] == 10
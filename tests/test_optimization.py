@@ -0,0 +1,257 @@
+import pytest
+from semantic_layer.core.schema import *
+from semantic_layer.compiler.query import QueryRequest
+from semantic_layer.compiler.sql_compiler import SqlCompiler
+from semantic_layer.connectors.duckdb import DuckDBAdapter
+from semantic_layer.optimization.cost_estimator import CostEstimator
+from semantic_layer.optimization.explain import *
+from semantic_layer.optimization.index_advisor import INDEX, PARTITION, SORT_KEY, IndexAdvisor
+from semantic_layer.optimization.plan_analyzer import QueryPlanAnalyzer
+from semantic_layer.optimization.profiler import LatencyHistogram, QueryProfiler
+from semantic_layer.optimization.statistics import HyperLogLog, StatisticsCatalog
+
+@pytest.fixture
+def adapter():
+    adapter = DuckDBAdapter()
+    adapter.connect({"database": ":memory:"})
+    adapter.execute_query(
+        "CREATE TABLE orders AS SELECT range AS id, "
+        "CASE WHEN range % 4 = 0 THEN 'US' WHEN range % 4 = 1 THEN 'DE' "
+        "WHEN range % 4 = 2 THEN 'FR' ELSE NULL END AS country, "
+        "range % 50 AS customer_id, "
+        "TIMESTAMP '2024-01-01' + to_hours(range) AS updated_at FROM range(2000)"
+    )
+    return adapter
+
+@pytest.fixture
+def model():
+    table = Table(
+        name="orders",
+        sql_table_name="orders",
+        dimensions=[Dimension(name="country", type=DataType.STRING, sql="country")],
+        metrics=[Metric(name="orders", type=DataType.INTEGER, aggregation=AggregationType.COUNT, sql="id")]
+    )
+    return SemanticModel(name="test", tables=[table])
+
+def test_hyperloglog_estimates_and_merges():
+    left, right = HyperLogLog(), HyperLogLog()
+    left.add(range(0, 30000))
+    right.add(range(20000, 50000))
+    assert abs(left.count() - 30000) / 30000 < 0.05
+    left.merge(right)
+    assert abs(left.count() - 50000) / 50000 < 0.05
+    restored = HyperLogLog.from_dict(left.to_dict())
+    assert restored.count() == left.count()
+
+def test_statistics_catalog_profiles_and_refreshes_incrementally(adapter, model, tmp_path):
+    path = str(tmp_path / "stats.json")
+    catalog = StatisticsCatalog(adapter, path=path)
+    stats = catalog.collect_model(model, updated_at_columns={"orders": "updated_at"})[0]
+    assert stats.row_count == 2000 and not stats.sampled and stats.size_bytes > 0
+    assert stats.columns["country"].ndv == 3
+    assert stats.columns["country"].null_fraction == pytest.approx(0.25)
+    assert stats.columns["customer_id"].ndv == 50
+    assert (stats.columns["id"].min, stats.columns["id"].max) == (0, 1999)
+
+    # Unchanged watermark: nothing is read again
+    catalog.collect("orders", "updated_at")
+    assert catalog.get_stats()["skipped_collections"] == 1
+
+    adapter.execute_query(
+        "INSERT INTO orders SELECT range, 'JP', 99, TIMESTAMP '2025-01-01' + to_hours(range) "
+        "FROM range(2000, 2100)"
+    )
+    # Touched rows come back in the delta too, but are not new rows
+    adapter.execute_query("UPDATE orders SET updated_at = TIMESTAMP '2025-06-01' WHERE id < 1000")
+    stats = catalog.collect("orders", "updated_at")
+    assert catalog.get_stats()["incremental_collections"] == 1
+    assert stats.row_count == 2100
+    assert stats.columns["country"].null_fraction == pytest.approx(500 / 2100)
+    assert stats.columns["country"].ndv == 4
+    assert stats.columns["customer_id"].ndv == 51
+    assert stats.columns["id"].max == 2099
+
+    reloaded = StatisticsCatalog(adapter, path=path)
+    assert reloaded.get("orders").columns["country"].ndv == 4
+    reloaded.collect("orders", "updated_at")
+    assert reloaded.get_stats()["skipped_collections"] == 1
+
+def test_sampled_statistics_extrapolate_distinct_counts(adapter):
+    catalog = StatisticsCatalog(adapter, sample_rows=500)
+    stats = catalog.collect("orders")
+    assert stats.sampled and stats.row_count == 2000
+    assert stats.columns["country"].ndv == 3
+    assert 1000 < stats.columns["id"].ndv <= 2000
+
+def test_cost_estimator_uses_catalog_for_selectivity_and_cardinality(adapter):
+    catalog = StatisticsCatalog(adapter)
+    catalog.collect("orders")
+    estimator = CostEstimator(statistics=catalog)
+
+    assert estimator.selectivity("orders", {"country": "US"}) == pytest.approx(0.25)
+    assert estimator.selectivity("orders", {"country": ["US", "DE"]}) == pytest.approx(0.5)
+    assert estimator.selectivity("orders", {"customer_id": 500}) == 0
+    assert estimator.estimate_cardinality("orders", {"country": "US"}) == 500
+    assert estimator.estimate_cardinality("orders", group_by=["customer_id"]) == 50
+    assert estimator.estimate_cardinality("orders", {"customer_id": 7}, group_by=["country"]) == 3
+    assert estimator.estimate_cardinality("orders", group_by=[]) == 1
+    assert estimator.estimate_cardinality("missing") is None
+
+def test_cost_estimates_come_from_plans_and_are_memoized(adapter, model):
+    catalog = StatisticsCatalog(adapter)
+    catalog.collect("orders")
+    estimator = CostEstimator(statistics=catalog)
+    compiler = SqlCompiler(model)
+    request = QueryRequest(metrics=["orders"], dimensions=["country"], filters={"customer_id": [1, 2]})
+
+    cost = estimator.estimate_cost(compiler.plan(request))
+    # Only id, country and customer_id of the four columns are read
+    assert cost["estimated_bytes_scanned"] == pytest.approx(catalog.get("orders").size_bytes * 3 / 4 * 1.2, rel=0.01)
+    assert cost["estimated_rows"] == 3
+    assert cost["tables_accessed"] == ["orders"]
+
+    estimator.estimate_cost(compiler.plan(request))
+    assert estimator.get_stats()["memo_hits"] == 1
+    adapter.execute_query("INSERT INTO orders VALUES (5000, 'JP', 1, TIMESTAMP '2025-01-01')")
+    catalog.collect("orders")  # New statistics invalidate memoized estimates
+    estimator.estimate_cost(compiler.plan(request))
+    assert estimator.get_stats()["memo_misses"] == 2
+
+    analysis = QueryPlanAnalyzer(estimator).analyze(compiler.plan(request))
+    assert analysis["filters"] == [{"table": "orders", "column": "customer_id", "values": [1, 2]}]
+    assert analysis["group_by"] == ["orders.country"]
+    assert analysis["cost"]["estimated_rows"] == 4  # JP is now a fourth country
+
+def test_index_advisor_recommends_from_workload_and_confirms_what_if():
+    adapter = DuckDBAdapter()
+    adapter.connect({"database": ":memory:"})
+    adapter.execute_query(
+        "CREATE TABLE events AS SELECT range AS id, (hash(range) % 20000)::INTEGER AS user_id, "
+        "['click', 'view', 'buy', 'share'][(hash(range * 7) % 4)::INTEGER + 1] AS kind, "
+        "range * 0.5 AS value FROM range(400000)"
+    )
+    table = Table(
+        name="events",
+        sql_table_name="events",
+        dimensions=[Dimension(name="kind", type=DataType.STRING, sql="kind")],
+        metrics=[Metric(name="value", type=DataType.FLOAT, aggregation=AggregationType.SUM, sql="value")]
+    )
+    compiler = SqlCompiler(SemanticModel(name="test", tables=[table]))
+    catalog = StatisticsCatalog(adapter)
+    catalog.collect("events")
+    advisor = IndexAdvisor(CostEstimator(statistics=catalog))
+    for user in range(5):
+        advisor.record(compiler.compile_with_plan(QueryRequest(metrics=["value"], filters={"user_id": user})),
+                       seconds=2.0)
+    advisor.record(compiler.compile_with_plan(QueryRequest(metrics=["value"], dimensions=["kind"])), seconds=6.0)
+    advisor.record(compiler.compile_with_plan(QueryRequest(metrics=["value"], filters={"kind": "buy"})),
+                   seconds=1.0)
+    advisor.record(compiler.compile_with_plan(QueryRequest(metrics=["value"], filters={"kind": "view"})),
+                   seconds=1.0)
+
+    workload = advisor.analyze_workload()
+    assert workload["filter_columns"] == {"events.user_id": 5, "events.kind": 2}
+    assert workload["group_by_sets"] == [{"columns": ["events.kind"], "queries": 1}]
+
+    recommendations = {(r.kind, tuple(r.columns)): r for r in advisor.recommend_indexes()}
+    index = recommendations[(INDEX, ("user_id",))]
+    assert index.queries == 5
+    # Five 2s queries of an 18s workload each skip nearly the whole table
+    assert index.estimated_benefit == pytest.approx(10 / 18, rel=0.01)
+    assert index.estimated_seconds_saved == pytest.approx(10, rel=0.01)
+    assert recommendations[(PARTITION, ("kind",))].estimated_benefit == pytest.approx(1.5 / 18, rel=0.05)
+    assert (SORT_KEY, ("user_id",)) in recommendations
+    assert (INDEX, ("kind",)) not in recommendations  # A quarter of the table is not selective
+
+    for recommendation in (index, recommendations[(SORT_KEY, ("user_id",))]):
+        result = advisor.what_if(recommendation, adapter)
+        assert result["queries"] == 5 and result["confirmed"]
+        assert result["rows_scanned_after"] < result["rows_scanned_before"] / 2
+    # The source table is untouched
+    assert adapter.execute_query("SELECT count(*) FROM duckdb_indexes()").iloc[0, 0] == 0
+
+    # Every filter value is its own plan, so the workload is capped, least recently recorded first
+    bounded = IndexAdvisor(max_plans=2)
+    plans = [compiler.compile_with_plan(QueryRequest(metrics=["value"], filters={"user_id": u})).plan
+             for u in range(3)]
+    for plan in [plans[0], plans[1], plans[0], plans[2]]:
+        bounded.record(plan)
+    assert list(bounded.workload) == [plans[0], plans[2]]
+    assert bounded.analyze_workload()["evicted_plans"] == 1
+
+def test_explain_analyze_flags_full_scans_and_exploding_joins(adapter):
+    adapter.execute_query("CREATE TABLE customers AS SELECT range % 50 AS id, range AS seq FROM range(1000)")
+    explain = QueryExplain(adapter)
+    sql = "SELECT count(*) FROM orders o JOIN customers c ON o.customer_id = c.id WHERE o.id > $1"
+    result = explain.explain(sql, [10], analyze=True)
+
+    operators = {node.operator: node for node in result.root.walk()}
+    join = operators["HASH_JOIN"]
+    assert join.actual_rows == 1989 * 20 and EXPLODING_JOIN in join.flags
+    scans = {node.table.rsplit(".", 1)[-1]: node for node in result.root.walk() if node.kind == "scan"}
+    assert scans["orders"].filter and FULL_SCAN not in scans["orders"].flags
+    assert result.total_ms > 0
+
+    estimated = explain.explain("SELECT * FROM orders", analyze=False)
+    assert not estimated.analyzed and estimated.root.actual_rows is None
+    assert fingerprint(sql.replace("$1", "10")) == fingerprint(sql.replace("$1", "99"))
+    assert explain.get_hotspots(result.fingerprint)[result.fingerprint][EXPLODING_JOIN] == 1
+
+def test_duckdb_spills_are_attributed_to_blocking_operators():
+    adapter = DuckDBAdapter()
+    adapter.connect({"database": ":memory:"})
+    adapter.execute_query("SET threads = 1")
+    adapter.execute_query("CREATE TABLE wide AS SELECT range AS id, md5(range::varchar) AS s FROM range(500000)")
+    explain = QueryExplain(adapter)
+    in_memory = explain.explain("SELECT * FROM wide ORDER BY s", analyze=True)
+    assert not any(node.spilled for node in in_memory.root.walk())
+
+    adapter.execute_query("SET memory_limit = '32MB'")
+    result = explain.explain("SELECT * FROM wide ORDER BY s", analyze=True)
+    spilled = [node for node in result.root.walk() if node.spilled]
+    assert [node.kind for node in spilled] == ["sort"]
+    assert SPILLING in spilled[0].flags
+
+def test_postgres_plans_parse_into_common_tree():
+    plan = [{"Plan": {
+        "Node Type": "Sort", "Plan Rows": 100, "Actual Rows": 90000, "Actual Loops": 1,
+        "Actual Total Time": 120.0, "Sort Space Type": "Disk",
+        "Plans": [{
+            "Node Type": "Seq Scan", "Relation Name": "orders", "Plan Rows": 90000,
+            "Actual Rows": 90000, "Actual Loops": 1, "Actual Total Time": 30.0,
+        }],
+    }}]
+    root = parse_plan(plan)
+    scan = root.children[0]
+    assert (root.operator, root.time_ms, root.spilled) == ("Sort", 90.0, True)
+    assert (scan.table, scan.kind, scan.time_ms) == ("orders", "scan", 30.0)
+
+    explain = QueryExplain(adapter=None)
+    result = ExplainResult(sql="SELECT ...", fingerprint="f", analyzed=True, root=root)
+    explain._flag(result)
+    assert set(root.flags) == {SPILLING, MISESTIMATE, HOT}
+    assert scan.flags == [FULL_SCAN]
+
+def test_latency_histogram_percentiles_in_fixed_memory():
+    histogram = LatencyHistogram()
+    size = histogram.counts.nbytes
+    for ms in range(1, 10001):
+        histogram.record(ms / 10)  # 0.1ms .. 1000ms, uniformly
+    assert histogram.counts.nbytes == size
+    assert histogram.percentile(50) == pytest.approx(500, rel=0.02)
+    assert histogram.percentile(99) == pytest.approx(990, rel=0.02)
+    assert histogram.percentile(100) == histogram.max_ms == 1000
+    histogram.record(10 ** 9)  # Beyond the tracked range: clamped, but the max stays exact
+    assert histogram.max_ms == 10 ** 9
+
+    profiler = QueryProfiler(slow_threshold_ms=5, slow_samples=2, max_fingerprints=2)
+    for i in range(4):
+        profiler.record(f"q{i}", 10.0 * i, {"execute": 5.0 * i})
+    assert list(profiler.fingerprints) == ["q2", "q3"]
+    assert [q["fingerprint"] for q in profiler.get_slow_queries()] == ["q2", "q3"]
+    assert profiler.get_stats()["evicted_fingerprints"] == 2
+    # Per-fingerprint histograms are compact; only the overall one keeps full precision
+    assert all(h.counts.nbytes < 2048 for h in profiler.fingerprints["q3"].values())
+    assert profiler.get_stats()["stages"]["execute"]["count"] == 2
+    with pytest.raises(ValueError):
+        profiler.overall.merge(profiler.fingerprints["q3"]["total"])